@@ -0,0 +1,253 @@
+"""
+Calibrate the thresholds of the relevance pre-filter (src/graph/prefilter.py)
+on a labeled set, and write them where the graph reads them.
+
+The labeled set is a JSONL file, one line per question and chunk:
+
+    {"question": "...", "document": "chunk text", "relevant": true}
+
+A line with only a question retrieves its chunks from the vector store and
+labels them with the LLM retrieval grader, so a list of real questions is
+enough to calibrate against the grader the pre-filter stands in for.
+
+For each side the thresholds kept are the ones deciding the most chunks while
+auto-accepted chunks stay at least --accept-precision relevant and
+auto-rejected chunks at least --reject-precision irrelevant.
+
+--offline calibrates against the stub servers and fixture docs of
+benchmarks/stubs.py with the query set of benchmarks.e2e instead, to try the
+script or measure the grader calls saved; it only writes thresholds with an
+explicit --output, since they don't carry over to real embeddings.
+
+Usage:
+    python -m benchmarks.calibrate_prefilter --labels labels.jsonl
+        [--accept-precision 0.95] [--reject-precision 0.98] [--min-support 5]
+        [--output .cache/prefilter_thresholds.json]
+    python -m benchmarks.calibrate_prefilter --offline [--docs 3]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.e2e import QUERIES, configure, ingest
+from benchmarks.stubs import StubClickUp, StubOllama
+
+GRID_SIZE = 200
+
+
+def read_labels(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def label_with_grader(question):
+    """Retrieve the chunks of a question and label them with the LLM grader."""
+    from src.constants.constants import GRADER_CONCURRENCY
+    from src.graph.state import is_yes
+    from src.index.hybrid import search_workspaces
+    from src.index.store import get_retrievers
+    from src.llms.retrieval_grader import retrieval_grader
+
+    documents = search_workspaces(get_retrievers(), question)
+    scores = retrieval_grader.batch(
+        [{"question": question, "document": doc.page_content} for doc in documents],
+        config={"max_concurrency": GRADER_CONCURRENCY},
+    )
+    return [
+        {"question": question, "document": doc.page_content, "relevant": is_yes(score)}
+        for doc, score in zip(documents, scores)
+    ]
+
+
+def relevance_scores(question, texts):
+    """The relevance scores the vector store would give the texts for a question."""
+    from src.index.store import get_vector_store, relevance_score, workspace_ids
+
+    # Workspace stores score alike, but for numpy ones each fitting its own PCA
+    workspaces = workspace_ids()
+    if not workspaces:
+        raise SystemExit("nothing is ingested, ingest docs first")
+    db = get_vector_store(workspaces[0])
+    if hasattr(db, "score_texts"):
+        # The numpy backend scores exactly as it searches
+        return db.score_texts(question, texts)
+    # Chroma's L2 distances are squared
+    query = db.embeddings.embed_query(question)
+    return [
+        relevance_score(sum((a - b) ** 2 for a, b in zip(query, vector)))
+        for vector in db.embeddings.embed_documents(texts)
+    ]
+
+
+def build_samples(records):
+    """Score every labeled chunk, grouped by question to embed it once."""
+    from src.graph.prefilter import lexical_overlap
+
+    by_question = {}
+    for record in records:
+        if "document" in record:
+            by_question.setdefault(record["question"], []).append(record)
+        else:
+            by_question.setdefault(record["question"], []).extend(
+                label_with_grader(record["question"])
+            )
+    samples = []
+    for question, labeled in by_question.items():
+        texts = [record["document"] for record in labeled]
+        for record, score in zip(labeled, relevance_scores(question, texts)):
+            samples.append(
+                (
+                    score,
+                    lexical_overlap(question, record["document"]),
+                    record["relevant"],
+                )
+            )
+    return samples
+
+
+def grid(values):
+    """At most GRID_SIZE candidate thresholds spread over the observed values."""
+    values = sorted(set(values))
+    step = max(1, len(values) // GRID_SIZE)
+    return values[::step] + values[-1:]
+
+
+def best_thresholds(samples, precision, min_support, accept):
+    """
+    Thresholds deciding the most samples at the required precision.
+
+    Accepting keeps samples at or above both thresholds, rejecting drops
+    samples at or below both. Returns None if no thresholds qualify.
+    """
+    best = None
+    for score_threshold in grid(sample[0] for sample in samples):
+        for overlap_threshold in grid(sample[1] for sample in samples):
+            if accept:
+                selected = [
+                    relevant
+                    for score, overlap, relevant in samples
+                    if score >= score_threshold and overlap >= overlap_threshold
+                ]
+                correct = sum(selected)
+            else:
+                selected = [
+                    relevant
+                    for score, overlap, relevant in samples
+                    if score <= score_threshold and overlap <= overlap_threshold
+                ]
+                correct = len(selected) - sum(selected)
+            if len(selected) < min_support or correct / len(selected) < precision:
+                continue
+            candidate = (len(selected), correct / len(selected))
+            if best is None or candidate > best[0]:
+                best = (
+                    candidate,
+                    {
+                        "relevance_score": score_threshold,
+                        "lexical_overlap": overlap_threshold,
+                        "precision": round(correct / len(selected), 4),
+                        "coverage": round(len(selected) / len(samples), 4),
+                    },
+                )
+    return best[1] if best else None
+
+
+def calibrate(samples, accept_precision, reject_precision, min_support):
+    accept = best_thresholds(samples, accept_precision, min_support, accept=True)
+    reject = best_thresholds(samples, reject_precision, min_support, accept=False)
+    return {
+        "accept": accept,
+        "reject": reject,
+        "samples": len(samples),
+        "relevant": sum(relevant for _, _, relevant in samples),
+        "calibrated_at": datetime.now().isoformat(),
+    }
+
+
+def report(thresholds):
+    print(f"{thresholds['samples']} labeled chunks, {thresholds['relevant']} relevant")
+    for side in ("accept", "reject"):
+        found = thresholds[side]
+        if found is None:
+            print(f"{side}: no thresholds reach the required precision")
+            continue
+        print(
+            f"{side}: relevance score {'>=' if side == 'accept' else '<='} "
+            f"{found['relevance_score']:.4f} and lexical overlap "
+            f"{'>=' if side == 'accept' else '<='} {found['lexical_overlap']:.2f}, "
+            f"{found['coverage']:.0%} of chunks at {found['precision']:.1%} precision"
+        )
+    decided = sum(
+        (thresholds[side] or {}).get("coverage", 0) for side in ("accept", "reject")
+    )
+    print(f"grader calls saved: {min(decided, 1):.0%}")
+
+
+def offline_records(args):
+    """Question-only records over the fixture docs, served by the stubs."""
+    ollama = StubOllama(latency=0).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    configure(ollama, clickup, args.workdir)
+    os.environ["PREFILTER_THRESHOLDS_PATH"] = ""
+    ingest([f"doc-{index}" for index in range(args.docs)], clickup)
+    return [{"question": question} for question in QUERIES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--labels", help="JSONL labeled set")
+    source.add_argument("--offline", action="store_true", help="use the stubs")
+    parser.add_argument("--accept-precision", type=float, default=0.95)
+    parser.add_argument("--reject-precision", type=float, default=0.98)
+    parser.add_argument("--min-support", type=int, default=5)
+    parser.add_argument("--output", help="thresholds file to write")
+    parser.add_argument("--docs", type=int, default=3, help="offline fixture docs")
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    if not args.offline and output is None:
+        from src.constants.constants import PREFILTER_THRESHOLDS_PATH
+
+        output = os.path.abspath(PREFILTER_THRESHOLDS_PATH)
+
+    stdout = sys.stdout
+    if not args.verbose:
+        # Ingestion and retrieval print every intermediate result
+        sys.stdout = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-calibrate-") as workdir:
+        args.workdir = workdir
+        cwd = os.getcwd()
+        try:
+            if args.offline:
+                records = offline_records(args)
+            else:
+                records = read_labels(args.labels)
+            samples = build_samples(records)
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+
+    if not samples:
+        raise SystemExit("no labeled chunks, is anything ingested?")
+    thresholds = calibrate(
+        samples, args.accept_precision, args.reject_precision, args.min_support
+    )
+    report(thresholds)
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, indent=2)
+        print(f"thresholds written to {output}")
+
+
+if __name__ == "__main__":
+    main()
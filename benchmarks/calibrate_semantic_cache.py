@@ -0,0 +1,198 @@
+"""
+Calibrate the similarity thresholds of the semantic cache
+(src/graph/semantic_cache.py) on labeled question pairs, and write them where
+the app reads them.
+
+The labeled set is a JSONL file, one line per pair of questions:
+
+    {"question": "...", "other": "...", "reuse": "answer"}
+
+"reuse" says what of the first question's run the other can reuse: "answer"
+if the same answer answers it, "documents" if only the same chunks cover it,
+"none" otherwise. Unrelated questions about the same docs are the pairs the
+thresholds have to keep apart, so label plenty of them.
+
+For each reuse the threshold kept is the lowest cosine similarity above which
+at least --answer-precision of the pairs are labeled "answer", or at least
+--documents-precision "answer" or "documents". A reuse no threshold qualifies
+for stays off.
+
+--offline calibrates on the stub embeddings of benchmarks/stubs.py with the
+questions and paraphrases of benchmarks.semantic_cache instead, to try the
+script; it only writes thresholds with an explicit --output, since they don't
+carry over to real embeddings.
+
+Usage:
+    python -m benchmarks.calibrate_semantic_cache --labels pairs.jsonl
+        [--answer-precision 0.99] [--documents-precision 0.95] [--min-support 5]
+        [--output .cache/semantic_cache_thresholds.json]
+    python -m benchmarks.calibrate_semantic_cache --offline
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks.calibrate_prefilter import grid, read_labels
+from benchmarks.e2e import QUERIES, configure
+from benchmarks.semantic_cache import PARAPHRASES
+from benchmarks.stubs import StubClickUp, StubOllama
+
+REUSES = {"answer": ("answer",), "documents": ("answer", "documents")}
+
+
+def build_samples(records):
+    """(similarity, reuse) of every labeled pair, each question embedded once."""
+    from src.graph.semantic_cache import SemanticCache
+
+    vectors = {}
+    for record in records:
+        for question in (record["question"], record["other"]):
+            if question not in vectors:
+                vectors[question] = SemanticCache.embed(question)
+    return [
+        (
+            float(vectors[record["question"]] @ vectors[record["other"]]),
+            record["reuse"],
+        )
+        for record in records
+    ]
+
+
+def best_threshold(samples, reusable, precision, min_support):
+    """
+    Lowest similarity from which enough pairs can reuse at the required
+    precision. Returns None if no threshold qualifies.
+    """
+    best = None
+    for threshold in grid(similarity for similarity, _ in samples):
+        selected = [
+            reuse in reusable
+            for similarity, reuse in samples
+            if similarity >= threshold
+        ]
+        correct = sum(selected)
+        if len(selected) < min_support or correct / len(selected) < precision:
+            continue
+        candidate = (len(selected), correct / len(selected))
+        if best is None or candidate > best[0]:
+            best = (
+                candidate,
+                {
+                    "similarity": threshold,
+                    "precision": round(correct / len(selected), 4),
+                    "recall": round(
+                        correct / sum(reuse in reusable for _, reuse in samples), 4
+                    ),
+                },
+            )
+    return best[1] if best else None
+
+
+def calibrate(samples, answer_precision, documents_precision, min_support):
+    precisions = {"answer": answer_precision, "documents": documents_precision}
+    return {
+        **{
+            reuse: best_threshold(samples, reusable, precisions[reuse], min_support)
+            for reuse, reusable in REUSES.items()
+        },
+        "samples": len(samples),
+        **{
+            f"{reuse}_pairs": sum(label == reuse for _, label in samples)
+            for reuse in ("answer", "documents")
+        },
+        "calibrated_at": datetime.now().isoformat(),
+    }
+
+
+def report(thresholds):
+    print(
+        f"{thresholds['samples']} labeled pairs, {thresholds['answer_pairs']} "
+        f"sharing an answer, {thresholds['documents_pairs']} only documents"
+    )
+    for reuse in REUSES:
+        found = thresholds[reuse]
+        if found is None:
+            print(f"{reuse} reuse: no threshold reaches the required precision, off")
+            continue
+        print(
+            f"{reuse} reuse: similarity >= {found['similarity']:.4f}, "
+            f"{found['recall']:.0%} of reusable pairs at {found['precision']:.1%} "
+            f"precision"
+        )
+
+
+def offline_records():
+    """Each e2e question paired with its paraphrase and the other questions."""
+    questions = QUERIES[: len(PARAPHRASES)]
+    records = [
+        {"question": question, "other": paraphrase, "reuse": "answer"}
+        for question, paraphrase in zip(questions, PARAPHRASES)
+    ]
+    for index, question in enumerate(questions):
+        for other_index, other in enumerate(questions + PARAPHRASES):
+            if other_index % len(questions) != index:
+                records.append({"question": question, "other": other, "reuse": "none"})
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--labels", help="JSONL labeled pairs")
+    source.add_argument("--offline", action="store_true", help="use the stubs")
+    parser.add_argument("--answer-precision", type=float, default=0.99)
+    parser.add_argument("--documents-precision", type=float, default=0.95)
+    parser.add_argument("--min-support", type=int, default=5)
+    parser.add_argument("--output", help="thresholds file to write")
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    if not args.offline and output is None:
+        from src.constants.constants import SEMANTIC_CACHE_THRESHOLDS_PATH
+
+        output = os.path.abspath(SEMANTIC_CACHE_THRESHOLDS_PATH)
+
+    stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-calibrate-") as workdir:
+        cwd = os.getcwd()
+        ollama = clickup = None
+        try:
+            if args.offline:
+                ollama = StubOllama(latency=0).start()
+                clickup = StubClickUp().start()
+                configure(ollama, clickup, workdir)
+                records = offline_records()
+            else:
+                records = read_labels(args.labels)
+            samples = build_samples(records)
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+            if ollama:
+                ollama.stop()
+                clickup.stop()
+
+    if not samples:
+        raise SystemExit("no labeled pairs")
+    thresholds = calibrate(
+        samples, args.answer_precision, args.documents_precision, args.min_support
+    )
+    report(thresholds)
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(thresholds, f, indent=2)
+        print(f"thresholds written to {output}")
+
+
+if __name__ == "__main__":
+    main()
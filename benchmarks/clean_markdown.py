@@ -0,0 +1,154 @@
+"""
+Check clean_markdown against the previous regex implementation on a golden
+corpus and measure how its run time scales with page size.
+
+Usage:
+    python -m benchmarks.clean_markdown [--pages 500]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from src.index.clickup import clean_markdown
+
+SIZES_KB = [10, 100, 1000, 5000]
+
+GOLDEN_PAGES = [
+    "",
+    "plain text",
+    "See [the docs](https://example.com/docs_(v2)) for more.",
+    "((nested (deeply) (twice)) groups) stay out",
+    "unbalanced (open and (closed) text",
+    "unbalanced close) and (balanced) text)",
+    "[a [b] c] and [unterminated\nline] two",
+    "| a | b |\n| --- | :-: |\n| 1 | 2 |\n| 3 | 4 |\nafter",
+    "intro | a | b |\n|---|---|\n| 1 | 2 |\n",
+    "| a | b |\n|---|---|\n| 1 | 2 |",
+    "| h |\n| x |\n|---|\n| r |\n",
+    "||\n|-|\n|||\n",
+    "----, ---- ---,--- rule",
+    "escaped\\_underscore and \\\\_ double",
+    "  \n\n padded \n\n  ",
+    "line\r\n| a |\r\n|---|\r\n| b |\r\n",
+]
+
+
+def legacy_clean_markdown(text: str) -> str:
+    pattern = r"\([^()]*(\([^()]*\)[^()]*)*\)"
+    while re.search(pattern, text):
+        text = re.sub(pattern, "", text)
+    text = re.sub(r"\[.*?\]", "", text)
+    text = re.sub(r"[\(\)]", "", text)
+
+    def table_to_csv(match):
+        rows = match.group().strip().split("\n")
+        csv_lines = []
+        for row in rows:
+            csv_line = ", ".join(cell.strip() for cell in row.split("|")[1:-1])
+            csv_lines.append(csv_line)
+        return "\n".join(csv_lines)
+
+    text = re.sub(r"(\|.+?\|\n\|[-:| ]+\|\n(\|.+?\|\n)+)", table_to_csv, text)
+    text = re.sub(r"---[,]{0,1}", "", text)
+    text = text.replace("\\_", "_")
+    return text.strip()
+
+
+def random_fragment(rng: random.Random) -> str:
+    return rng.choice(
+        [
+            "word ",
+            "(",
+            ")",
+            "[",
+            "]",
+            "|",
+            "\n",
+            "---",
+            ",",
+            "\\_",
+            " ",
+            ":",
+            "-",
+            "\r",
+            "[link](https://example.com/a_(b))",
+            "| a | b |\n| --- | --- |\n| 1 | 2 |\n",
+            "| x |\n",
+        ]
+    )
+
+
+def random_page(rng: random.Random, fragments: int) -> str:
+    return "".join(random_fragment(rng) for _ in range(fragments))
+
+
+def typical_page(size_kb: int) -> str:
+    block = (
+        "# Heading\n\n"
+        "Some text with a [link](https://example.com/path_(1)) and "
+        "(a (nested) aside) plus an escaped\\_name.\n\n"
+        "| Name | Value |\n| --- | :---: |\n| alpha | 1 |\n| beta | 2 |\n\n"
+        "---\n\n"
+    )
+    return block * (size_kb * 1024 // len(block) + 1)
+
+
+def adversarial_page(size_kb: int) -> str:
+    # Long lines full of "|" without a closing bar, unterminated brackets and
+    # deeply nested parentheses make the regex implementation rescan the page
+    size = size_kb * 1024
+    return (
+        "| cell [" * (size // 16) + "\n" + "(" * (size // 4) + "x" + ")" * (size // 4)
+    )
+
+
+# Largest page the legacy implementation is timed on, it is quadratic on the
+# adversarial pages
+PAGE_KINDS = {"typical": (typical_page, 1000), "adversarial": (adversarial_page, 10)}
+
+
+def check_golden(pages: int) -> None:
+    rng = random.Random(0)
+    corpus = GOLDEN_PAGES + [
+        random_page(rng, rng.randint(1, 200)) for _ in range(pages)
+    ]
+    for page in corpus:
+        expected = legacy_clean_markdown(page)
+        actual = clean_markdown(page)
+        assert actual == expected, f"mismatch for {page!r}: {actual!r} != {expected!r}"
+    print(f"golden corpus: {len(corpus)} pages match the legacy implementation")
+
+
+def measure(function, text: str) -> float:
+    start = time.perf_counter()
+    function(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+
+    check_golden(args.pages)
+
+    print(f"{'page':>12} {'size':>8} {'linear':>10} {'MB/s':>8} {'legacy':>10}")
+    for kind, (make_page, legacy_max_kb) in PAGE_KINDS.items():
+        for size_kb in SIZES_KB:
+            page = make_page(size_kb)
+            elapsed = measure(clean_markdown, page)
+            throughput = len(page) / elapsed / 1e6
+            legacy = (
+                f"{measure(legacy_clean_markdown, page):9.3f}s"
+                if size_kb <= legacy_max_kb
+                else f"{'-':>10}"
+            )
+            print(
+                f"{kind:>12} {size_kb:>6}KB {elapsed:9.3f}s {throughput:8.1f} {legacy}"
+            )
+
+
+if __name__ == "__main__":
+    main()
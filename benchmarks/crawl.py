@@ -0,0 +1,118 @@
+"""
+Crawl benchmark: crawl a stub workspace, interrupt the crawl halfway, resume
+it, then crawl again with nothing changed and with a few docs edited.
+
+Reports docs ingested, time and pages per second for each run, which shows
+that a resumed crawl only ingests the docs left and that a recrawl only
+ingests the docs that changed. Each crawl runs `main.py --crawl` in a
+subprocess against the stub servers of benchmarks/stubs.py.
+
+Usage:
+    python -m benchmarks.crawl [--spaces 2] [--docs-per-space 10] [--pages 10]
+        [--workers 4] [--edited 2]
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.e2e import ROOT, WORKSPACE_ID
+from benchmarks.stubs import StubClickUp, StubOllama
+
+
+def read_checkpoint(workdir):
+    path = os.path.join(workdir, ".cache", "crawl", f"{WORKSPACE_ID}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"docs": {}}
+
+
+def done_docs(workdir, since=""):
+    """Docs ingested since the `since` ISO timestamp."""
+    docs = read_checkpoint(workdir)["docs"].values()
+    return sum(
+        doc["status"] == "done" and doc.get("ingested_at", "") >= since for doc in docs
+    )
+
+
+def crawl(env, workdir, verbose, interrupt_after=None):
+    """Run one crawl, optionally interrupted once `interrupt_after` docs are done."""
+    since = datetime.now().isoformat()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py"), "--crawl", WORKSPACE_ID],
+        cwd=workdir,
+        env=env,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.DEVNULL,
+    )
+    start = time.perf_counter()
+    while process.poll() is None:
+        if interrupt_after is not None and done_docs(workdir, since) >= interrupt_after:
+            process.send_signal(signal.SIGINT)
+            break
+        time.sleep(0.05)
+    process.wait()
+    return time.perf_counter() - start, done_docs(workdir, since)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spaces", type=int, default=2)
+    parser.add_argument("--docs-per-space", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=10, help="pages per doc")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--edited", type=int, default=2, help="docs edited")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true", help="show crawl output")
+    args = parser.parse_args()
+
+    ollama = StubOllama().start()
+    clickup = StubClickUp(
+        pages_per_doc=args.pages,
+        latency=args.latency,
+        spaces=args.spaces,
+        docs_per_space=args.docs_per_space,
+    ).start()
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": ollama.url,
+        "CLICKUP_API_URL": clickup.url,
+        "CLICKUP_TOKEN": "benchmark",
+        "CRAWL_WORKERS": str(args.workers),
+        "ANONYMIZED_TELEMETRY": "False",
+    }
+    docs = args.spaces * args.docs_per_space
+    try:
+        with tempfile.TemporaryDirectory(prefix="clickup-llama-crawl-") as workdir:
+            print(f"{'run':<12}{'docs':>6}{'seconds':>9}{'pages/s':>9}")
+            runs = [("interrupted", docs // 2), ("resumed", None)]
+            runs += [("unchanged", None), ("edited", None)]
+            for name, interrupt_after in runs:
+                if name == "edited":
+                    for index in range(args.edited):
+                        clickup.revisions[f"space-0-doc-{index}"] += 1
+                seconds, ingested = crawl(env, workdir, args.verbose, interrupt_after)
+                print(
+                    f"{name:<12}{ingested:>6}{seconds:>9.2f}"
+                    f"{ingested * args.pages / seconds:>9.1f}"
+                )
+            if done_docs(workdir) != docs:
+                raise SystemExit(
+                    f"only {done_docs(workdir)} of {docs} docs were crawled, "
+                    "rerun with --verbose"
+                )
+    finally:
+        ollama.stop()
+        clickup.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Offline end-to-end benchmark: ingest fixture ClickUp docs and answer a fixed
+query set through the graph, against local stub Ollama and ClickUp servers.
+
+Reports ingest throughput, p50/p95 query latency and LLM calls per query. Runs
+in a fresh temporary directory with the LLM cache disabled so results are
+comparable across commits, use --output to save them as JSON.
+
+The tiktoken encoding used to split pages must be in the local tiktoken cache
+(run once with network access, or point TIKTOKEN_CACHE_DIR at a copy).
+
+Usage:
+    python -m benchmarks.e2e [--docs 3] [--pages 20] [--latency 0.05]
+        [--tokens-per-second 400] [--rounds 1] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import StubClickUp, StubOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKSPACE_ID = "9000"
+
+QUERIES = [
+    "How do we roll back a production deploy?",
+    "What is on the onboarding checklist for the first week?",
+    "How are refunds handled for a subscription invoice?",
+    "What severity levels trigger a pager escalation?",
+    "What is the API rate limit for webhook endpoints?",
+    "How often is VPN access reviewed?",
+    "How does the referral interview loop work?",
+    "Which dashboard tracks retention by cohort?",
+    # Matches no fixture page, exercises the rewrite loop and its budget
+    "What is the parental leave policy?",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure(ollama: StubOllama, clickup: StubClickUp, workdir: str):
+    """Point the app at the stubs, must run before any src module is imported."""
+    os.environ.update(
+        {
+            "OLLAMA_BASE_URL": ollama.url,
+            "CLICKUP_API_URL": clickup.url,
+            "CLICKUP_TOKEN": "benchmark",
+            "LLM_CACHE_MAX_ENTRIES": "0",
+            "TRACE_PATH": "",
+            "METRICS_PORT": "0",
+            "ANONYMIZED_TELEMETRY": "False",
+        }
+    )
+    # Every on-disk store uses a path relative to the working directory
+    os.chdir(workdir)
+
+
+def ingest(doc_ids, clickup: StubClickUp):
+    from src.index.indexer import ingest_document
+    from src.index.store import get_vector_store
+
+    start = time.perf_counter()
+    for doc_id in doc_ids:
+        ingest_document(f"https://app.clickup.com/{WORKSPACE_ID}/v/dc/{doc_id}")
+    seconds = time.perf_counter() - start
+
+    pages = len(doc_ids) * clickup.pages_per_doc
+    chunks = len(get_vector_store(WORKSPACE_ID).get(include=[])["ids"])
+    if not chunks:
+        # ingest_document reports errors without raising
+        raise SystemExit("ingest produced no chunks, rerun with --verbose")
+    return {
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "chunks": chunks,
+        "pages_per_second": round(pages / seconds, 2),
+        "chunks_per_second": round(chunks / seconds, 2),
+    }
+
+
+def run_queries(rounds: int):
+    from src.graph.graph import app
+    from src.graph.recovery import query_config
+    from src.graph.tracing import QueryTracer
+
+    latencies, llm_calls, tokens, unverified = [], [], [], 0
+    for _ in range(rounds):
+        for query in QUERIES:
+            tracer = QueryTracer(query)
+            final_state = app.invoke(
+                {"question": query, "original_question": query},
+                query_config(tracer.query_id, {"callbacks": [tracer]}),
+            )
+            trace = tracer.finish(final_state)
+            latencies.append(trace["seconds"])
+            llm_calls.append(trace["llm_calls"])
+            tokens.append(trace["prompt_tokens"] + trace["completion_tokens"])
+            unverified += trace["unverified"]
+    return {
+        "queries": len(latencies),
+        "p50_seconds": round(percentile(latencies, 0.5), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "mean_seconds": round(statistics.mean(latencies), 3),
+        "llm_calls_per_query": round(statistics.mean(llm_calls), 2),
+        "tokens_per_query": round(statistics.mean(tokens), 1),
+        "unverified_answers": unverified,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--page-words", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    ollama = StubOllama(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        parallel=args.parallel,
+        embed_latency=args.embed_latency,
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages, page_words=args.page_words)
+    clickup.start()
+
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-bench-") as workdir:
+        configure(ollama, clickup, workdir)
+        stdout = sys.stdout
+        if not args.verbose:
+            # The nodes print every intermediate result
+            sys.stdout = open(os.devnull, "w")
+        try:
+            doc_ids = [f"doc-{index}" for index in range(args.docs)]
+            ingest_results = ingest(doc_ids, clickup)
+            query_results = run_queries(args.rounds)
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(ROOT)
+
+    results = {
+        "commit": git_commit(),
+        "params": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "verbose")
+        },
+        "ingest": ingest_results,
+        "query": query_results,
+        "ollama_calls": dict(ollama.calls),
+        "clickup_calls": dict(clickup.calls),
+    }
+    ollama.stop()
+    clickup.stop()
+
+    print(
+        f"ingest: {ingest_results['pages']} pages, {ingest_results['chunks']} chunks "
+        f"in {ingest_results['seconds']:.2f}s "
+        f"({ingest_results['pages_per_second']:.1f} pages/s, "
+        f"{ingest_results['chunks_per_second']:.1f} chunks/s)"
+    )
+    print(
+        f"queries: {query_results['queries']}, "
+        f"p50 {query_results['p50_seconds']:.2f}s, "
+        f"p95 {query_results['p95_seconds']:.2f}s, "
+        f"{query_results['llm_calls_per_query']:.1f} LLM calls/query, "
+        f"{query_results['tokens_per_query']:.0f} tokens/query, "
+        f"{query_results['unverified_answers']} unverified"
+    )
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark sequential vs concurrent document grading against a fake local LLM.
+
+Usage:
+    python -m benchmarks.grade_documents [--docs 4] [--latency 0.5]
+"""
+
+import argparse
+import json
+import time
+from typing import Any, List, Optional
+
+from langchain.schema.document import Document
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+
+import src.graph.state as state
+import src.llms.retrieval_grader as retrieval_grader
+
+
+class SlowFakeChatModel(SimpleChatModel):
+    """Chat model that answers every grading prompt with 'yes' after a fixed delay."""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake-chat-model"
+
+    def _call(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> str:
+        time.sleep(self.latency)
+        return json.dumps({"score": "yes", "confidence": 0.9, "key_matches": []})
+
+
+def run(concurrency: int, documents: List[Document]) -> float:
+    state.GRADER_CONCURRENCY = concurrency
+    start = time.perf_counter()
+    result = state.grade_documents({"question": "benchmark", "documents": documents})
+    elapsed = time.perf_counter() - start
+    assert [d.page_content for d in result["documents"]] == [
+        d.page_content for d in documents
+    ], "document order was not preserved"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    retrieval_grader.retrieval_grader = (
+        retrieval_grader.prompt
+        | SlowFakeChatModel(latency=args.latency)
+        | JsonOutputParser()
+    )
+    documents = [Document(page_content=f"chunk {i}") for i in range(args.docs)]
+
+    sequential = run(1, documents)
+    concurrent = run(args.docs, documents)
+    print(f"sequential: {sequential:.2f}s")
+    print(f"concurrent: {concurrent:.2f}s")
+    print(f"speedup:    {sequential / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
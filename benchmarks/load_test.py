@@ -0,0 +1,183 @@
+"""
+Load test the query server with 1, 4 and 16 concurrent clients and report
+throughput and latency at each level.
+
+By default the server runs offline (`main.py --serve`) against the stub Ollama
+and ClickUp servers of benchmarks/stubs.py, with the fixture docs ingested. Use
+--url to load test a server that is already running instead.
+
+Usage:
+    python -m benchmarks.load_test [--clients 1 4 16] [--queries 32]
+        [--latency 0.2] [--tokens-per-second 100] [--parallel 4]
+        [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from benchmarks.e2e import QUERIES, ROOT, WORKSPACE_ID, percentile
+from benchmarks.stubs import StubClickUp, StubOllama
+
+
+async def query(session, url, question):
+    """Send one streamed query, return (latency, time to first node, status)."""
+    start = time.perf_counter()
+    first_node = None
+    async with session.post(f"{url}/query", json={"question": question}) as response:
+        if response.status != 200:
+            await response.read()
+            return time.perf_counter() - start, None, response.status
+        async for line in response.content:
+            event = json.loads(line).get("event")
+            if event == "node" and first_node is None:
+                first_node = time.perf_counter() - start
+            if event == "error":
+                return time.perf_counter() - start, first_node, 500
+    return time.perf_counter() - start, first_node, 200
+
+
+async def run_level(url, clients, total):
+    """Run `total` queries split across `clients` concurrent clients."""
+    questions = [QUERIES[index % len(QUERIES)] for index in range(total)]
+    results = []
+
+    async def client(session):
+        while questions:
+            results.append(await query(session, url, questions.pop()))
+
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    ok = [latency for latency, _, status in results if status == 200]
+    first_nodes = [first for _, first, status in results if status == 200]
+    return {
+        "clients": clients,
+        "queries": len(results),
+        "ok": len(ok),
+        "rejected": sum(status == 503 for _, _, status in results),
+        "errors": sum(status not in (200, 503) for _, _, status in results),
+        "throughput": len(ok) / elapsed,
+        "p50": percentile(ok, 0.5) if ok else float("nan"),
+        "p95": percentile(ok, 0.95) if ok else float("nan"),
+        "first_node_p50": (
+            percentile(first_nodes, 0.5) if first_nodes else float("nan")
+        ),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir):
+    """Start `main.py --serve` against the stubs, return (url, process, stubs)."""
+    ollama = StubOllama(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        parallel=args.parallel,
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    port = free_port()
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": ollama.url,
+        "CLICKUP_API_URL": clickup.url,
+        "CLICKUP_TOKEN": "benchmark",
+        "LLM_CACHE_MAX_ENTRIES": "0",
+        "TRACE_PATH": "",
+        "ANONYMIZED_TELEMETRY": "False",
+    }
+    command = [sys.executable, os.path.join(ROOT, "main.py"), "--serve"]
+    command += ["--port", str(port)]
+    for index in range(args.docs):
+        command += [
+            "--ingest",
+            f"https://app.clickup.com/{WORKSPACE_ID}/v/dc/doc-{index}",
+        ]
+    process = subprocess.Popen(
+        command,
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    return f"http://127.0.0.1:{port}", process, (ollama, clickup)
+
+
+async def wait_until_ready(url, process, timeout=300):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if process is not None and process.poll() is not None:
+                raise SystemExit("the server exited, rerun with --verbose")
+            try:
+                async with session.get(f"{url}/health") as response:
+                    if response.status == 200:
+                        return await response.json()
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"the server at {url} did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--queries", type=int, default=32, help="queries per level")
+    parser.add_argument("--url", help="load test a running server instead")
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--verbose", action="store_true", help="show server errors")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-load-") as workdir:
+        process = stubs = None
+        url = args.url
+        if url is None:
+            url, process, stubs = start_server(args, workdir)
+        try:
+            health = asyncio.run(wait_until_ready(url, process))
+            print(
+                f"server: {health['max_concurrent_queries']} concurrent queries, "
+                f"queue limit {health['query_queue_limit']}, "
+                f"{health['ollama_num_parallel']} Ollama requests at once"
+            )
+            print(
+                f"{'clients':>8}{'queries':>9}{'rejected':>10}{'errors':>8}"
+                f"{'q/s':>8}{'p50 s':>8}{'p95 s':>8}{'first node p50 s':>18}"
+            )
+            for clients in args.clients:
+                result = asyncio.run(run_level(url, clients, args.queries))
+                print(
+                    f"{result['clients']:>8}{result['queries']:>9}"
+                    f"{result['rejected']:>10}{result['errors']:>8}"
+                    f"{result['throughput']:>8.2f}{result['p50']:>8.2f}"
+                    f"{result['p95']:>8.2f}{result['first_node_p50']:>18.2f}"
+                )
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+                for stub in stubs:
+                    stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Inject failures into the stub Ollama of benchmarks/stubs.py while answering
+the e2e query set: an HTTP 500 on the first LLM call of every query, which
+the node retry policy absorbs, then a malformed hallucination grader response,
+which fails the query. Each failed query is resumed from its checkpoint and,
+for comparison, asked again from scratch as before checkpoints.
+
+Usage:
+    python -m benchmarks.recovery [--docs 3] [--latency 0.05]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.e2e import QUERIES, configure, ingest
+from benchmarks.stubs import StubClickUp, StubOllama
+
+# Answerable queries, the last one of QUERIES exercises the rewrite budget
+ANSWERABLE = QUERIES[:-1]
+
+
+def run(question, thread_id=None):
+    """Run or, given its thread ID, resume a query. Returns its trace and error."""
+    from src.graph.graph import app
+    from src.graph.recovery import query_config
+    from src.graph.tracing import QueryTracer
+
+    tracer = QueryTracer(question)
+    config = query_config(thread_id or tracer.query_id, {"callbacks": [tracer]})
+    inputs = (
+        None if thread_id else {"question": question, "original_question": question}
+    )
+    final_state, error = {}, None
+    try:
+        final_state = app.invoke(inputs, config)
+    except Exception as e:
+        error = e
+    trace = tracer.finish(final_state)
+    trace["thread_id"] = config["configurable"]["thread_id"]
+    trace["answered"] = bool(final_state.get("generation"))
+    return trace, error
+
+
+def totals(traces):
+    return {
+        "answered": sum(trace["answered"] for trace in traces),
+        "llm_calls": sum(trace["llm_calls"] for trace in traces),
+        "seconds": sum(trace["seconds"] for trace in traces),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    ollama = StubOllama(
+        latency=args.latency, tokens_per_second=args.tokens_per_second
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-recovery-") as workdir:
+        cwd = os.getcwd()
+        configure(ollama, clickup, workdir)
+        if not args.verbose:
+            # Every node prints its intermediate results
+            sys.stdout = open(os.devnull, "w")
+        try:
+            ingest([f"doc-{index}" for index in range(args.docs)], clickup)
+
+            transient = []
+            for question in ANSWERABLE:
+                ollama.inject("error")
+                transient.append(run(question))
+
+            failed, resumed, rerun = [], [], []
+            for question in ANSWERABLE:
+                ollama.inject("malformed", "fact-checker")
+                trace, error = run(question)
+                failed.append(trace)
+                if error is not None:
+                    resumed.append(run(question, trace["thread_id"])[0])
+                    rerun.append(run(question)[0])
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+            ollama.stop()
+            clickup.stop()
+
+    answered = sum(error is None for _, error in transient)
+    print(
+        f"HTTP 500 on the first LLM call of {len(ANSWERABLE)} queries: "
+        f"{answered} answered after {ollama.calls['fault:error']} retried nodes"
+    )
+    print(
+        f"malformed grader response in {len(ANSWERABLE)} queries: "
+        f"{len(resumed)} failed after {totals(failed)['llm_calls']} LLM calls"
+    )
+    for name, result in (
+        ("resumed", totals(resumed)),
+        ("asked again", totals(rerun)),
+    ):
+        print(
+            f"{name:<13}{result['answered']:>3} answered {result['llm_calls']:>5} "
+            f"LLM calls {result['seconds']:>7.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Answer the e2e query set while docs are ingested in the background, with the
+Ollama scheduler admitting requests by priority class and in arrival order,
+then compare the first query after a model load with and without a warm-up.
+
+The stub Ollama of benchmarks/stubs.py processes `--parallel` chat and
+embedding requests at once, like a real server with OLLAMA_NUM_PARALLEL, and
+makes the first request after a load wait `--load-seconds`.
+
+Usage:
+    python -m benchmarks.scheduler [--clients 4] [--ingest-workers 4]
+        [--embed-latency 0.05] [--load-seconds 2]
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.e2e import QUERIES, WORKSPACE_ID, configure, ingest, percentile
+from benchmarks.stubs import StubClickUp, StubOllama
+
+
+def ask(question):
+    from src.graph.graph import app
+    from src.graph.recovery import query_config
+    from src.graph.tracing import QueryTracer
+
+    tracer = QueryTracer(question)
+    final_state = app.invoke(
+        {"question": question, "original_question": question},
+        query_config(tracer.query_id, {"callbacks": [tracer]}),
+    )
+    return tracer.finish(final_state)["seconds"]
+
+
+def ingest_until(stop, doc_ids):
+    from src.index.indexer import ingest_document
+
+    for doc_id in doc_ids:
+        if stop.is_set():
+            return
+        ingest_document(f"https://app.clickup.com/{WORKSPACE_ID}/v/dc/{doc_id}")
+
+
+def wait_totals():
+    from src.llms.scheduler import scheduler
+
+    return {
+        priority: (waits["count"], waits["sum"])
+        for priority, waits in scheduler.stats()["queue_wait"].items()
+    }
+
+
+def contended(mode, clients, ingest_workers):
+    """Answer every query while `ingest_workers` docs are ingested at once."""
+    from src.llms.scheduler import scheduler
+
+    scheduler.prioritize = mode == "priority"
+    before = wait_totals()
+    stop = threading.Event()
+    workers = [
+        threading.Thread(
+            target=ingest_until,
+            args=(stop, (f"{mode}-{worker}-{i}" for i in itertools.count())),
+        )
+        for worker in range(ingest_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    # Let ingestion fill the Ollama queue first
+    time.sleep(0.5)
+    with ThreadPoolExecutor(clients) as executor:
+        latencies = list(executor.map(ask, QUERIES))
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    waits = {}
+    for priority, (count, total) in wait_totals().items():
+        count -= before[priority][0]
+        total -= before[priority][1]
+        waits[priority] = total / count if count else 0.0
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "mean": statistics.mean(latencies),
+        "waits": waits,
+    }
+
+
+def first_query(ollama, warm):
+    """Latency of a query right after Ollama (re)loads the model."""
+    from src.llms.llm import warm_up_models
+
+    ollama.loaded = False
+    warm_up_seconds = sum(warm_up_models().values()) if warm else 0.0
+    return warm_up_seconds, ask(QUERIES[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--ingest-workers", type=int, default=4)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    ollama = StubOllama(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        parallel=args.parallel,
+        embed_latency=args.embed_latency,
+        load_seconds=args.load_seconds,
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-scheduler-") as workdir:
+        cwd = os.getcwd()
+        configure(ollama, clickup, workdir)
+        os.environ["OLLAMA_NUM_PARALLEL"] = str(args.parallel)
+        if not args.verbose:
+            # Every node and ingestion stage prints its progress
+            sys.stdout = open(os.devnull, "w")
+        try:
+            ingest([f"doc-{index}" for index in range(args.docs)], clickup)
+            # Arrival order runs first, so it searches the smaller index
+            results = {
+                mode: contended(mode, args.clients, args.ingest_workers)
+                for mode in ("arrival order", "priority")
+            }
+            warm = first_query(ollama, warm=True)
+            cold = first_query(ollama, warm=False)
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+            ollama.stop()
+            clickup.stop()
+
+    print(
+        f"{len(QUERIES)} queries from {args.clients} clients while "
+        f"{args.ingest_workers} docs are ingested at once, "
+        f"{args.parallel} Ollama slots"
+    )
+    print(
+        f"{'admission':<15}{'p50':>8}{'p95':>8}{'mean':>8}"
+        f"{'wait: generation':>18}{'query':>8}{'ingestion':>11}"
+    )
+    for mode, result in results.items():
+        waits = result["waits"]
+        print(
+            f"{mode:<15}{result['p50']:>7.2f}s{result['p95']:>7.2f}s"
+            f"{result['mean']:>7.2f}s{waits['generation'] * 1000:>16.0f}ms"
+            f"{waits['query'] * 1000:>6.0f}ms{waits['ingestion'] * 1000:>9.0f}ms"
+        )
+    print(
+        f"first query after a {args.load_seconds:g}s model load: "
+        f"{cold[1]:.2f}s cold, {warm[1]:.2f}s after a {warm[0]:.2f}s warm-up"
+    )
+    print(f"Ollama connections opened: {ollama.calls['connections']}")
+
+
+if __name__ == "__main__":
+    main()
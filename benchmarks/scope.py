@@ -0,0 +1,170 @@
+"""
+Grow the corpus with docs of the same and of other workspaces, and answer
+the e2e query set at each size scoped to one doc, to its workspace and to
+every workspace. Reports the time spent retrieving, the query latency and
+the LLM calls per query of each scope.
+
+At each growth factor the corpus holds that many times `--docs` docs: half of
+the docs added go to the benchmark workspace, the other half to new
+workspaces of `--docs` docs each.
+
+Usage:
+    python -m benchmarks.scope [--docs 3] [--pages 10] [--growth 1 4 16]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+from benchmarks.e2e import QUERIES, WORKSPACE_ID, configure, percentile
+from benchmarks.stubs import StubClickUp, StubOllama
+
+# Answerable queries, the last one of QUERIES exercises the rewrite budget
+ANSWERABLE = QUERIES[:-1]
+
+
+def corpus(docs, growth):
+    """(workspace ID, doc ID) of every doc in the corpus at a growth factor."""
+    added = (growth - 1) * docs
+    same_workspace = (added + 1) // 2
+    return (
+        [(WORKSPACE_ID, f"doc-{index}") for index in range(docs)]
+        + [(WORKSPACE_ID, f"extra-{index}") for index in range(same_workspace)]
+        + [
+            (str(int(WORKSPACE_ID) + 1 + index // docs), f"doc-{index % docs}")
+            for index in range(added - same_workspace)
+        ]
+    )
+
+
+def ingest_missing(docs, ingested):
+    from src.index.indexer import ingest_document
+
+    for workspace_id, doc_id in docs:
+        if (workspace_id, doc_id) not in ingested:
+            ingest_document(f"https://app.clickup.com/{workspace_id}/v/dc/{doc_id}")
+            ingested.add((workspace_id, doc_id))
+
+
+def chunk_counts():
+    """Chunks stored in the benchmark workspace and in all workspaces."""
+    from src.index.store import get_vector_store, workspace_ids
+
+    counts = {
+        workspace_id: len(get_vector_store(workspace_id).get(include=[])["ids"])
+        for workspace_id in workspace_ids()
+    }
+    return counts.get(WORKSPACE_ID, 0), sum(counts.values())
+
+
+def ask(query, scope):
+    from src.graph.graph import app
+    from src.graph.recovery import query_config
+    from src.graph.tracing import QueryTracer
+
+    tracer = QueryTracer(query)
+    final_state = app.invoke(
+        {"question": query, "original_question": query, **scope.inputs()},
+        query_config(tracer.query_id, {"callbacks": [tracer]}),
+    )
+    return tracer.finish(final_state), final_state
+
+
+def run_queries(scope):
+    # Opens the stores of the scope and leaves the first query out of the timings
+    ask(ANSWERABLE[0], scope)
+    latencies, retrieve_seconds, llm_calls, off_scope = [], [], [], 0
+    for query in ANSWERABLE:
+        trace, final_state = ask(query, scope)
+        latencies.append(trace["seconds"])
+        retrieve_seconds.append(
+            sum(
+                span["seconds"] or 0.0
+                for span in trace["nodes"]
+                if span["node"] == "retrieve"
+            )
+        )
+        llm_calls.append(trace["llm_calls"])
+        # Chunks graded relevant that belong to another doc than the one asked
+        off_scope += sum(
+            document.metadata.get("doc_id") != "doc-0"
+            or document.metadata.get("workspace_id") != WORKSPACE_ID
+            for document in final_state.get("documents") or []
+        )
+    return {
+        "p50": percentile(latencies, 0.5),
+        "retrieve_ms": statistics.mean(retrieve_seconds) * 1000,
+        "llm_calls": statistics.mean(llm_calls),
+        "off_scope": off_scope / len(ANSWERABLE),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=10, help="pages per doc")
+    parser.add_argument("--growth", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    ollama = StubOllama(
+        latency=args.latency, tokens_per_second=args.tokens_per_second
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-scope-") as workdir:
+        cwd = os.getcwd()
+        configure(ollama, clickup, workdir)
+        if not args.verbose:
+            # Every node and ingestion stage prints its progress
+            sys.stdout = open(os.devnull, "w")
+        try:
+            from src.index.scope import Scope
+
+            scopes = {
+                "doc": Scope(WORKSPACE_ID, ("doc-0",)),
+                "workspace": Scope(WORKSPACE_ID),
+                "every workspace": Scope(),
+            }
+            ingested = set()
+            for growth in sorted(args.growth):
+                ingest_missing(corpus(args.docs, growth), ingested)
+                results.append(
+                    (
+                        growth,
+                        *chunk_counts(),
+                        {name: run_queries(scope) for name, scope in scopes.items()},
+                    )
+                )
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+            ollama.stop()
+            clickup.stop()
+
+    print(
+        f"{len(ANSWERABLE)} queries about doc-0 of workspace {WORKSPACE_ID} "
+        f"at each corpus size"
+    )
+    print(
+        f"{'growth':<8}{'chunks':>8}{'in ws':>7}  {'scope':<17}{'retrieve':>10}"
+        f"{'p50':>8}{'LLM calls':>11}{'other docs':>12}"
+    )
+    for growth, workspace_chunks, total_chunks, by_scope in results:
+        for name, result in by_scope.items():
+            print(
+                f"{growth:<8}{total_chunks:>8}{workspace_chunks:>7}  {name:<17}"
+                f"{result['retrieve_ms']:>8.1f}ms{result['p50']:>7.2f}s"
+                f"{result['llm_calls']:>11.1f}{result['off_scope']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Replay an interactive session of near-duplicate questions with and without the
+semantic cache, against the stub servers and fixture docs of
+benchmarks/stubs.py, then edit the pages the first half of the paraphrases
+were answered from, re-ingest them and ask the paraphrases again to check
+that only the stale entries are dropped.
+
+The stub embeddings are hashed bags of words, so the thresholds here don't
+carry over to the app, whose thresholds benchmarks.calibrate_semantic_cache
+calibrates on real embeddings.
+
+Usage:
+    python -m benchmarks.semantic_cache [--docs 3] [--threshold 0.8]
+        [--answer-threshold 0.9] [--latency 0.05]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.e2e import QUERIES, configure, ingest
+from benchmarks.stubs import StubClickUp, StubOllama
+
+# A rephrasing of each answerable question of the e2e query set
+PARAPHRASES = [
+    "How can we roll back a deploy to production?",
+    "What is on the first week onboarding checklist?",
+    "How are subscription invoice refunds handled?",
+    "Which severity levels trigger pager escalation?",
+    "What is the rate limit of the API for webhook endpoints?",
+    "How often is access to the VPN reviewed?",
+    "How does the interview loop for referrals work?",
+    "Which dashboard tracks cohort retention?",
+]
+
+
+def ask(app, cache, question):
+    """Answer a question the way main.py's loop does."""
+    from src.graph.recovery import query_config
+    from src.graph.tracing import QueryTracer
+
+    tracer = QueryTracer(question)
+    hit = cache.lookup(question) if cache else None
+    if hit and hit.reuse_answer:
+        final_state = {"generation": hit.entry.answer}
+    else:
+        inputs = {"question": question, **(hit.inputs() if hit else {})}
+        final_state = app.invoke(
+            inputs, query_config(tracer.query_id, {"callbacks": [tracer]})
+        )
+    trace = tracer.finish(final_state)
+    if cache:
+        cache.record(question, final_state, trace, hit)
+    return trace
+
+
+def replay(app, cache, questions):
+    start = time.perf_counter()
+    llm_calls = sum(ask(app, cache, question)["llm_calls"] for question in questions)
+    return {"seconds": time.perf_counter() - start, "llm_calls": llm_calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="pages per doc")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--answer-threshold", type=float, default=0.9)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--verbose", action="store_true", help="show app output")
+    args = parser.parse_args()
+
+    ollama = StubOllama(
+        latency=args.latency, tokens_per_second=args.tokens_per_second
+    ).start()
+    clickup = StubClickUp(pages_per_doc=args.pages).start()
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-semantic-") as workdir:
+        cwd = os.getcwd()
+        configure(ollama, clickup, workdir)
+        if not args.verbose:
+            # Every node prints its intermediate results
+            sys.stdout = open(os.devnull, "w")
+        try:
+            from src.graph.graph import app
+            from src.graph.semantic_cache import SemanticCache
+
+            doc_ids = [f"doc-{index}" for index in range(args.docs)]
+            ingest(doc_ids, clickup)
+            session = []
+            for question, paraphrase in zip(QUERIES, PARAPHRASES):
+                session += [question, paraphrase]
+
+            uncached = replay(app, None, session)
+            cache = SemanticCache(args.threshold, args.answer_threshold, 256)
+            cached = replay(app, cache, session)
+            before_edit = cache.summary()
+
+            # A paraphrase reusing an answer has no entry of its own
+            edited = PARAPHRASES[: len(PARAPHRASES) // 2]
+            for entry in cache.entries:
+                if entry.question in edited + QUERIES[: len(edited)]:
+                    for _, file_path in entry.page_versions:
+                        clickup.revisions[file_path.rsplit("/", 1)[-1]] += 1
+            ingest(doc_ids, clickup)
+            replay(app, cache, PARAPHRASES)
+            after_edit = cache.summary()
+        finally:
+            if not args.verbose:
+                sys.stdout.close()
+                sys.stdout = stdout
+            os.chdir(cwd)
+            ollama.stop()
+            clickup.stop()
+
+    print(f"{len(session)} questions, {len(PARAPHRASES)} of them paraphrases")
+    for name, result in (("no cache", uncached), ("semantic cache", cached)):
+        print(
+            f"{name:<16}{result['seconds']:>7.2f}s {result['llm_calls']:>5} LLM calls"
+        )
+    print(
+        f"hits: {before_edit['answer_hits']} answers, "
+        f"{before_edit['document_hits']} document sets "
+        f"({before_edit['hit_rate']:.0%} hit rate), "
+        f"{before_edit['saved_llm_calls']} LLM calls saved"
+    )
+    print(
+        f"after editing the pages of {len(edited)} paraphrases: "
+        f"{after_edit['invalidated']} entries invalidated, "
+        f"{after_edit['answer_hits'] - before_edit['answer_hits']} answers and "
+        f"{after_edit['document_hits'] - before_edit['document_hits']} document "
+        f"sets reused for {len(PARAPHRASES)} paraphrases"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure CLI startup: time until the first prompt appears and the import cost of
+the graph, based on `python -X importtime`.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROMPT = "Enter ClickUp Docs URL".encode("utf-8")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_to_first_prompt() -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=ROOT,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError("main.py exited before showing the prompt")
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_times(module: str):
+    """Return (cumulative microseconds, module) pairs reported by -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times.append((int(cumulative), name.strip()))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    prompt_times = [time_to_first_prompt() for _ in range(args.runs)]
+    print(
+        f"time to first prompt: median {statistics.median(prompt_times):.3f}s "
+        f"over {args.runs} runs"
+    )
+
+    times = import_times("src.graph.graph")
+    total = next(cumulative for cumulative, name in times if name == "src.graph.graph")
+    print(f"import src.graph.graph: {total / 1e6:.3f}s cumulative")
+    print("slowest top-level imports:")
+    top_level = {}
+    for cumulative, name in times:
+        root = name.split(".")[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative)
+    for root, cumulative in sorted(
+        top_level.items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"  {cumulative / 1e6:8.3f}s  {root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+Local stand-ins for Ollama and the ClickUp API, so benchmarks run with no
+network and no GPU.
+
+The Ollama stub answers every prompt of the graph with deterministic JSON and
+simulates model speed with a time to first token and a token rate. The ClickUp
+stub serves a deterministic corpus of fixture docs.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+WORD = re.compile(r"[a-z0-9]+")
+TOKEN = re.compile(r"\S+\s*")
+
+# Topics of the fixture docs, with the terms the fixed query set asks about
+TOPICS = {
+    "deployment": "deploy release pipeline staging production rollback canary",
+    "onboarding": "onboarding laptop accounts mentor first week checklist",
+    "billing": "billing invoice payment refund subscription plan tax",
+    "incidents": "incident outage pager severity postmortem escalation on-call",
+    "api": "api rate limit token authentication endpoint pagination webhook",
+    "security": "security password vpn encryption access review audit",
+    "hiring": "hiring interview candidate offer referral loop feedback",
+    "analytics": "analytics dashboard metric retention funnel cohort event",
+}
+FILLER = (
+    "team process document update owner review weekly goal project status "
+    "meeting note decision context example detail section summary"
+).split()
+
+
+def words(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+def fixture_pages(
+    workspace_id: str, doc_id: str, pages: int, page_words: int
+) -> List[Dict[str, Any]]:
+    """Deterministic pages of one fixture doc, the same for the same arguments."""
+    rng = random.Random(f"{workspace_id}/{doc_id}")
+    topics = list(TOPICS)
+    result = []
+    for index in range(pages):
+        topic = topics[(index + int(hashlib.md5(doc_id.encode()).hexdigest(), 16)) % 8]
+        vocabulary = TOPICS[topic].split()
+        paragraphs = []
+        remaining = page_words
+        while remaining > 0:
+            length = min(remaining, rng.randint(40, 80))
+            sentence = " ".join(
+                rng.choice(vocabulary) if rng.random() < 0.3 else rng.choice(FILLER)
+                for _ in range(length)
+            )
+            paragraphs.append(sentence.capitalize() + ".")
+            remaining -= length
+        table = (
+            "| Owner | Topic | Status |\n| --- | --- | --- |\n"
+            f"| team-{index} | {topic} | [done](https://example.com/{index}) |"
+        )
+        content = f"## {topic.title()} guide\n\n" + "\n\n".join(paragraphs)
+        content += f"\n\n{table}\n\nSee [the {topic} handbook](https://example.com)."
+        result.append(
+            {
+                "id": f"{doc_id}-page-{index}",
+                "doc_id": doc_id,
+                "workspace_id": workspace_id,
+                "name": f"{topic.title()} {index}",
+                "content": content,
+            }
+        )
+    return result
+
+
+def embed(text: str, dimensions: int = 256) -> List[float]:
+    """Hashed bag-of-words vector, so similar texts get similar embeddings."""
+    vector = [0.0] * dimensions
+    for word in words(text):
+        bucket = int(hashlib.md5(word.encode()).hexdigest(), 16)
+        vector[bucket % dimensions] += 1.0 if bucket & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def section(prompt: str, start: str, end: str) -> str:
+    _, _, rest = prompt.partition(start)
+    return rest.partition(end)[0] if end else rest
+
+
+def overlap(question: str, document: str) -> bool:
+    stop_words = {"the", "a", "an", "is", "what", "how", "do", "we", "our", "for"}
+    terms = set(words(question)) - stop_words
+    return bool(terms & set(words(document)))
+
+
+def reply_to(prompt: str, answer_words: int) -> str:
+    """Deterministic response of the stub model to a prompt of the graph."""
+    if "alternative search queries" in prompt:
+        question = section(prompt, "Original question:", "\n\n")
+        count = int(section(prompt, "write ", " alternative"))
+        tried = section(prompt, "Queries already tried:", "\n\n")
+        terms = " ".join(words(question))
+        queries = [
+            f"{terms} {suffix}"
+            for suffix in ("guide", "process", "handbook", "checklist", "policy")
+            if f"{terms} {suffix}" not in tried
+        ]
+        return json.dumps({"queries": queries[:count]})
+    if "question optimizer" in prompt:
+        question = section(prompt, "Original question:", "Rewritten question:")
+        return json.dumps({"question": question.strip()})
+    if "fact-checker" in prompt:
+        return json.dumps(
+            {
+                "score": "yes",
+                "confidence": 0.9,
+                "unsupported_claims": [],
+                "explanation": "Every claim is supported by the documents.",
+            }
+        )
+    if "quality and usefulness of an answer" in prompt:
+        return json.dumps(
+            {
+                "score": "yes",
+                "confidence": 0.9,
+                "strengths": ["Addresses the question"],
+                "weaknesses": [],
+                "suggestion": "",
+            }
+        )
+    if "relevance of retrieved documents" in prompt:
+        question = section(prompt, "User's Question:", "\n\n")
+        if "<document index=" in prompt:
+            documents = re.findall(
+                r"<document index=(\d+)>(.*?)</document>", prompt, re.DOTALL
+            )
+            verdicts = [
+                {
+                    "index": int(index),
+                    "score": "yes" if overlap(question, text) else "no",
+                }
+                for index, text in documents
+            ]
+            return json.dumps({"verdicts": verdicts})
+        document = section(prompt, "Retrieved Document:", "Evaluation Guidelines:")
+        return json.dumps(
+            {
+                "score": "yes" if overlap(question, document) else "no",
+                "confidence": 0.8,
+                "key_matches": [],
+            }
+        )
+    # Answer generation, built from the words of the context
+    context = words(section(prompt, "Context:", "\nAnswer:")) or ["no", "context"]
+    answer = " ".join(context[i % len(context)] for i in range(answer_words))
+    return json.dumps({"answer": answer.capitalize() + ".", "needs_followup": False})
+
+
+class StubServer:
+    """Threaded HTTP server on a free localhost port, run from a daemon thread."""
+
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+
+    def start(self) -> "StubServer":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Like Go's servers, so a reused connection doesn't wait for a delayed ACK
+    # between the headers and the body
+    disable_nagle_algorithm = True
+
+    def send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OllamaHandler(JSONHandler):
+    def setup(self):
+        super().setup()
+        self.server.stub.count("connections")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": "llama3.1:latest"}]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        stub = self.server.stub
+        request = self.read_json()
+        if self.path == "/api/embeddings":
+            stub.count("embeddings")
+            stub.load()
+            with stub.slots:
+                time.sleep(stub.embed_latency)
+            self.send_json({"embedding": embed(request.get("prompt", ""))})
+        elif self.path == "/api/chat":
+            stub.count("chat")
+            stub.load()
+            with stub.slots:
+                self.chat(stub, request)
+        elif self.path == "/api/generate" and not request.get("prompt"):
+            # A request without a prompt only loads the model
+            stub.count("warmup")
+            stub.load()
+            self.send_json(
+                {"model": request.get("model"), "response": "", "done": True}
+            )
+        else:
+            self.send_error(404)
+
+    def chat(self, stub: "StubOllama", request: Dict[str, Any]) -> None:
+        messages = request.get("messages") or [{}]
+        prompt = messages[-1].get("content", "")
+        fault = stub.take_fault(prompt)
+        if fault == "error":
+            self.send_json({"error": "injected failure"}, status=500)
+            return
+        reply = reply_to(prompt, stub.answer_words)
+        if fault == "malformed":
+            reply = "Sorry, I can't answer in JSON."
+        tokens = TOKEN.findall(reply)
+        final = {
+            "model": request.get("model"),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(tokens),
+        }
+
+        time.sleep(stub.latency)
+        if request.get("stream") is False:
+            time.sleep(len(tokens) / stub.tokens_per_second)
+            final["message"]["content"] = "".join(tokens)
+            self.send_json(final)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(1 / stub.tokens_per_second)
+                self.write_chunk(
+                    {
+                        "model": request.get("model"),
+                        "message": {"role": "assistant", "content": token},
+                        "done": False,
+                    }
+                )
+            self.write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the call and closed the stream
+            stub.count("cancelled")
+            self.close_connection = True
+
+    def write_chunk(self, payload: Dict[str, Any]) -> None:
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOllama(StubServer):
+    """
+    Stub Ollama server.
+
+    Args:
+        latency: Seconds before the first token of every chat response
+        tokens_per_second: Completion speed of the simulated model
+        parallel: Requests processed at once, like OLLAMA_NUM_PARALLEL
+        embed_latency: Seconds per embedding request
+        answer_words: Length of generated answers
+        load_seconds: Seconds the first request waits for the model to load
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        tokens_per_second: float = 400,
+        parallel: int = 4,
+        embed_latency: float = 0.0,
+        answer_words: int = 60,
+        load_seconds: float = 0.0,
+    ):
+        super().__init__(OllamaHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.slots = threading.Semaphore(parallel)
+        self.embed_latency = embed_latency
+        self.answer_words = answer_words
+        self.load_seconds = load_seconds
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        self._faults: List[List[Any]] = []
+
+    def inject(self, fault: str, marker: str = "", times: int = 1) -> None:
+        """
+        Answer the next `times` chat requests whose prompt contains `marker`
+        with a fault: "error" for an HTTP 500, "malformed" for a reply that
+        isn't JSON.
+        """
+        with self._lock:
+            self._faults.append([fault, marker, times])
+
+    def take_fault(self, prompt: str) -> Optional[str]:
+        with self._lock:
+            for fault in self._faults:
+                if fault[1] in prompt:
+                    fault[2] -= 1
+                    if not fault[2]:
+                        self._faults.remove(fault)
+                    self.calls[f"fault:{fault[0]}"] += 1
+                    return fault[0]
+        return None
+
+    def load(self) -> None:
+        """Block until the model is loaded, loading it on the first request."""
+        with self._load_lock:
+            if not self.loaded:
+                time.sleep(self.load_seconds)
+                self.loaded = True
+
+
+class ClickUpHandler(JSONHandler):
+    DOCS = re.compile(r"^/workspaces/([^/]+)/docs$")
+    PAGES = re.compile(r"^/workspaces/([^/]+)/docs/([^/]+)/pages$")
+    PAGE = re.compile(r"^/workspaces/([^/]+)/docs/([^/]+)/pages/([^/]+)$")
+
+    def do_GET(self):
+        stub = self.server.stub
+        # parse_clickup_url used to keep the slash before the workspace ID,
+        # which the real API tolerates
+        path, _, query = self.path.partition("?")
+        path = re.sub("/+", "/", path)
+        params = dict(parse_qsl(query))
+        time.sleep(stub.latency)
+        if match := self.DOCS.match(path):
+            stub.count("docs")
+            self.send_json(stub.list_docs(match.group(1), params))
+        elif match := self.PAGES.match(path):
+            stub.count("pages")
+            workspace_id, doc_id = match.groups()
+            self.send_json(stub.doc_pages(workspace_id, doc_id))
+        elif match := self.PAGE.match(path):
+            stub.count("page")
+            workspace_id, doc_id, page_id = match.groups()
+            pages = stub.doc_pages(workspace_id, doc_id)
+            page = next((page for page in pages if page["id"] == page_id), None)
+            if page is None:
+                self.send_error(404)
+                return
+            self.send_json(page)
+        else:
+            self.send_error(404)
+
+
+class StubClickUp(StubServer):
+    """
+    Stub ClickUp API serving fixture docs for any workspace and doc ID.
+
+    Every workspace lists `docs_per_space` docs in each of `spaces` spaces, a
+    page of `limit` docs at a time. Bump a doc in `revisions` to change its
+    `date_updated` and content, as if it was edited, or a page ID to only edit
+    that page.
+
+    Args:
+        pages_per_doc: Pages returned for every doc
+        page_words: Approximate number of words per page
+        latency: Seconds per request
+        spaces: Spaces listed per workspace
+        docs_per_space: Docs listed per space
+    """
+
+    def __init__(
+        self,
+        pages_per_doc: int = 20,
+        page_words: int = 600,
+        latency=0.0,
+        spaces: int = 2,
+        docs_per_space: int = 10,
+    ):
+        super().__init__(ClickUpHandler)
+        self.pages_per_doc = pages_per_doc
+        self.page_words = page_words
+        self.latency = latency
+        self.spaces = spaces
+        self.docs_per_space = docs_per_space
+        self.revisions: Counter = Counter()
+
+    def list_docs(self, workspace_id: str, params: Dict[str, str]) -> Dict[str, Any]:
+        space_ids = [f"space-{index}" for index in range(self.spaces)]
+        if params.get("parent_id"):
+            space_ids = (
+                [params["parent_id"]] if params["parent_id"] in space_ids else []
+            )
+        docs = [
+            {
+                "id": f"{space_id}-doc-{index}",
+                "name": f"Doc {index} of {space_id}",
+                "workspace_id": workspace_id,
+                "parent": {"id": space_id, "type": 4},
+                "date_updated": str(
+                    1700000000000 + self.revisions[f"{space_id}-doc-{index}"]
+                ),
+            }
+            for space_id in space_ids
+            for index in range(self.docs_per_space)
+        ]
+        start = int(params.get("cursor") or 0)
+        end = start + int(params.get("limit", 50))
+        return {
+            "docs": docs[start:end],
+            "next_cursor": str(end) if end < len(docs) else None,
+        }
+
+    def doc_pages(self, workspace_id: str, doc_id: str) -> List[Dict[str, Any]]:
+        pages = fixture_pages(workspace_id, doc_id, self.pages_per_doc, self.page_words)
+        if self.revisions[doc_id]:
+            pages[0]["content"] += f"\n\nRevision {self.revisions[doc_id]}."
+        for page in pages:
+            if self.revisions[page["id"]]:
+                page["content"] += f"\n\nRevision {self.revisions[page['id']]}."
+        return pages
@@ -0,0 +1,225 @@
+"""
+Compare the Chroma and memory-mapped NumPy vector stores on synthetic
+embeddings shaped like llama3.1's (4096 dimensions by default).
+
+Each store is built once, then opened by a fresh subprocess that reports the
+time to open it and answer a first query, its peak RSS (Linux only) and the latency of the
+remaining queries. Recall@k is measured against an exact float32 search.
+
+Usage:
+    python -m benchmarks.vector_store [--chunks 10000] [--dimensions 4096]
+        [--rank 256] [--queries 200] [--k 4]
+        [--backends chroma numpy-float16 numpy-int8 numpy-int8-pca512]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = [
+    "chroma",
+    "numpy-float16",
+    "numpy-int8",
+    "numpy-int8-pca512",
+    "numpy-int8-random512",
+]
+BATCH = 2000
+
+
+class VectorEmbeddings:
+    """Stores are only queried by vector, no text is ever embedded."""
+
+    def embed_documents(self, texts):
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        raise NotImplementedError
+
+
+def synthetic(args):
+    """
+    Clustered unit vectors and noisy copies of some of them as queries.
+
+    Like real embeddings, the vectors vary along far fewer directions than
+    they have dimensions (--rank), which is what dimension reduction relies on.
+    """
+    rng = np.random.default_rng(0)
+    basis = rng.standard_normal((args.rank, args.dimensions))
+    centers = rng.standard_normal((args.chunks // 50 + 1, args.rank))
+    latent = centers[rng.integers(0, len(centers), args.chunks)]
+    latent = latent + 0.8 * rng.standard_normal(latent.shape)
+    picks = rng.integers(0, args.chunks, args.queries)
+    queries = latent[picks] + 0.8 * rng.standard_normal((args.queries, args.rank))
+
+    def embed(latent):
+        vectors = latent @ basis
+        vectors += 0.1 * rng.standard_normal(vectors.shape) * vectors.std()
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.astype(np.float32)
+
+    return embed(latent), embed(queries)
+
+
+def open_store(backend, path):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(persist_directory=path, embedding_function=VectorEmbeddings())
+
+    from src.index.numpy_store import NumpyVectorStore
+
+    _, dtype, *reduction = backend.split("-")
+    method, dimensions = "none", 512
+    if reduction:
+        method = reduction[0].rstrip("0123456789")
+        dimensions = int(reduction[0][len(method) :])
+    return NumpyVectorStore(
+        path, VectorEmbeddings(), dtype=dtype, reduction=method, dimensions=dimensions
+    )
+
+
+def build(backend, path, vectors):
+    store = open_store(backend, path)
+    for start in range(0, len(vectors), BATCH):
+        part = vectors[start : start + BATCH]
+        ids = [str(index) for index in range(start, start + len(part))]
+        texts = [f"chunk {index}" for index in ids]
+        metadatas = [{"id": index} for index in ids]
+        if backend == "chroma":
+            store._collection.upsert(
+                ids=ids, embeddings=part.tolist(), documents=texts, metadatas=metadatas
+            )
+        else:
+            store.upsert(ids, part.tolist(), texts, metadatas)
+
+
+def search(store, backend, vector, k):
+    if backend == "chroma":
+        results = store.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+    else:
+        results = store.similarity_search_by_vector_with_score(vector, k)
+    return [document.metadata["id"] for document, _ in results]
+
+
+def peak_rss_mb():
+    # ru_maxrss would include the parent's peak, which it keeps across exec
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(args):
+    """Subprocess side: open the store, query it, print the results as JSON."""
+    queries = np.load(args.queries_file)
+    start = time.perf_counter()
+    store = open_store(args.measure, args.path)
+    found = [search(store, args.measure, queries[0].tolist(), args.k)]
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries[1:]:
+        start = time.perf_counter()
+        found.append(search(store, args.measure, query.tolist(), args.k))
+        latencies.append(time.perf_counter() - start)
+    print(
+        json.dumps(
+            {
+                "load_seconds": load_seconds,
+                "rss_mb": peak_rss_mb(),
+                "p50_ms": np.percentile(latencies, 50) * 1000,
+                "p95_ms": np.percentile(latencies, 95) * 1000,
+                "found": found,
+            }
+        )
+    )
+
+
+def directory_mb(path):
+    return (
+        sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+        / 2**20
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=4096)
+    parser.add_argument("--rank", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=BACKENDS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args)
+        return
+
+    vectors, queries = synthetic(args)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, : args.k]
+    print(
+        f"{args.chunks} chunks of {args.dimensions} dimensions, "
+        f"{args.queries} queries, recall@{args.k} against exact float32 search"
+    )
+    print(
+        f"{'backend':<22}{'build s':>9}{'disk MB':>9}{'load s':>8}{'RSS MB':>8}"
+        f"{'p50 ms':>8}{'p95 ms':>8}{'recall':>8}"
+    )
+    with tempfile.TemporaryDirectory(prefix="clickup-llama-vectors-") as workdir:
+        queries_file = os.path.join(workdir, "queries.npy")
+        np.save(queries_file, queries)
+        for backend in args.backends:
+            path = os.path.join(workdir, backend)
+            start = time.perf_counter()
+            build(backend, path, vectors)
+            build_seconds = time.perf_counter() - start
+
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.vector_store",
+                    "--measure",
+                    backend,
+                    "--path",
+                    path,
+                    "--queries-file",
+                    queries_file,
+                    "--k",
+                    str(args.k),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+                env={**os.environ, "ANONYMIZED_TELEMETRY": "False"},
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            recall = np.mean(
+                [
+                    len(set(map(int, found)) & set(expected.tolist())) / args.k
+                    for found, expected in zip(result["found"], exact)
+                ]
+            )
+            print(
+                f"{backend:<22}{build_seconds:>9.1f}{directory_mb(path):>9.1f}"
+                f"{result['load_seconds']:>8.2f}{result['rss_mb']:>8.0f}"
+                f"{result['p50_ms']:>8.2f}{result['p95_ms']:>8.2f}{recall:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,123 @@
-from src.graph.graph import app
-from src.index.indexer import ingest_document
+import argparse
+import asyncio
+import threading
+import time
 
-click_up_url = input("📝 Enter ClickUp Docs URL: ")
-ingest_document(click_up_url)
+from src.constants.constants import OLLAMA_WARM_UP, SERVER_HOST, SERVER_PORT
+
+
+def preload():
+    # Import the graph, open the vector stores and load the model into Ollama
+    # while the user is typing
+    from src.graph.graph import app  # noqa: F401
+    from src.index.store import get_retrievers
+    from src.llms.llm import warm_up_models
+
+    get_retrievers()
+    if OLLAMA_WARM_UP:
+        warm_up_models()
+
+
+parser = argparse.ArgumentParser(description="Chat with your ClickUp Docs")
+parser.add_argument(
+    "--stream",
+    action="store_true",
+    help="stream the answer token by token while the graders run",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="print the time, LLM calls and tokens of each node after every query",
+)
+parser.add_argument(
+    "--serve",
+    action="store_true",
+    help="serve queries over HTTP instead of the interactive prompt",
+)
+parser.add_argument(
+    "--ingest",
+    action="append",
+    default=[],
+    metavar="URL",
+    help="ClickUp Docs URL to ingest before serving, can be repeated",
+)
+parser.add_argument(
+    "--crawl",
+    metavar="WORKSPACE_ID",
+    help="ingest every doc of a workspace, resuming an interrupted crawl, then exit "
+    "or serve",
+)
+parser.add_argument(
+    "--space",
+    action="append",
+    default=[],
+    metavar="SPACE_ID",
+    help="only crawl the docs of this space, can be repeated",
+)
+parser.add_argument(
+    "--restart-crawl",
+    action="store_true",
+    help="ignore the checkpoint of a previous crawl and start over",
+)
+parser.add_argument("--host", default=SERVER_HOST)
+parser.add_argument("--port", type=int, default=SERVER_PORT)
+args = parser.parse_args()
+
+if args.crawl:
+    from src.index.crawl import crawl_workspace
+
+    crawl_workspace(args.crawl, args.space, restart=args.restart_crawl)
+    if not args.serve:
+        raise SystemExit()
+
+if args.serve:
+    from src.graph.server import serve
+    from src.index.indexer import ingest_document
+
+    for url in args.ingest:
+        ingest_document(url)
+    serve(args.host, args.port)
+    raise SystemExit()
+
+threading.Thread(target=preload, daemon=True).start()
+
+click_up_url = input("📝 Enter ClickUp Docs URL (empty to skip): ").strip()
+
+# Heavy imports wait here for the preload thread if it is still running
+from src.constants.constants import METRICS_PORT, QUERY_DEADLINE_SECONDS  # noqa: E402
+from src.graph.graph import app  # noqa: E402
+from src.graph.metrics import metrics, start_metrics_server  # noqa: E402
+from src.graph.prefilter import prefilter_decisions  # noqa: E402
+from src.graph.recovery import (  # noqa: E402
+    failed_queries,
+    forget,
+    prune,
+    query_config,
+    resumable,
+)
+from src.graph.semantic_cache import semantic_cache  # noqa: E402
+from src.graph.state import budget_exits  # noqa: E402
+from src.graph.streaming import stream_answer  # noqa: E402
+from src.graph.tracing import QueryTracer, format_profile, write_trace  # noqa: E402
+from src.index.indexer import ingest_document  # noqa: E402
+from src.index.scope import Scope, parse_scope, unindexed  # noqa: E402
+from src.llms.llm import llm_cache  # noqa: E402
+
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+    print(f"📈 Metrics served on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+# Queries search every workspace until a doc is loaded or /scope is entered
+scope = Scope()
+if click_up_url:
+    ingest_document(click_up_url)
+    try:
+        doc_scope = parse_scope(click_up_url)
+        if not unindexed(doc_scope):
+            scope = doc_scope
+    except ValueError:
+        pass
+print(f"🔭 Searching {scope}, enter /scope <doc URLs | workspace ID | all> to change")
 
 while True:
     print(
@@ -11,22 +126,119 @@ while True:
     query = input("🤔 User: Enter your query: ")
     if len(query.strip()) == 0:
         continue
-    inputs = {"question": query, "original_question": query}
+    if query.split()[0] == "/scope":
+        argument = query.strip()[len("/scope") :].strip()
+        try:
+            new_scope = parse_scope(argument) if argument else scope
+        except ValueError as e:
+            print(f"❌ {e}")
+            continue
+        missing = unindexed(new_scope)
+        if missing:
+            print(f"❌ Nothing ingested for {', '.join(missing)}")
+        else:
+            scope = new_scope
+        print(f"🔭 Searching {scope}")
+        continue
+    query_scope = scope
+    inputs = {"question": query, "original_question": query, **scope.inputs()}
+    tracer = QueryTracer(query)
+    thread_id = tracer.query_id
+    if query.strip() == "/resume":
+        unfinished = failed_queries(app)
+        if not unfinished:
+            print("💾 No failed query to resume")
+            continue
+        # Resume from the last completed node, with the state saved there
+        thread_id, query = unfinished[0]
+        print(f"🔁 Resuming: {query}")
+        inputs = None
+        tracer = QueryTracer(query)
+    config = query_config(thread_id, {"callbacks": [tracer]})
+    final_state = {}
+    if inputs is None:
+        # The resumed query gets a new deadline
+        app.update_state(config, {"deadline": time.time() + QUERY_DEADLINE_SECONDS})
+        final_state = dict(app.get_state(config).values)
+        query_scope = Scope.of(final_state)
+    hit = None
+    failed = False
 
     try:
-        for output in app.stream(inputs):
-            for key, value in output.items():
-                # Node
-                print(f"Node '{key}':")
-                # Optional: print full state at each node
-                # pprint.pprint(value["keys"], indent=2, width=80, depth=None)
-            print("\n---\n")
-
-        # Final generation
-        print("🎯 LLM:", value["generation"])
+        if semantic_cache and inputs is not None:
+            hit = semantic_cache.lookup(query, query_scope)
+        if hit:
+            print(
+                f"♻️ Similar to an earlier question ({hit.similarity:.2f}): "
+                f"{hit.entry.question}"
+            )
+        if hit and not hit.reuse_answer:
+            inputs.update(hit.inputs())
+        if hit and hit.reuse_answer:
+            final_state = {"generation": hit.entry.answer}
+            print("🎯 LLM (verified earlier):", final_state["generation"])
+        elif args.stream:
+            final_state = asyncio.run(stream_answer(app, inputs, config)) or {}
+        else:
+            for output in app.stream(inputs, config):
+                for key, value in output.items():
+                    # Node
+                    print(f"Node '{key}':")
+                    # Optional: print full state at each node
+                    # pprint.pprint(value["keys"], indent=2, width=80, depth=None)
+                    final_state.update(value or {})
+                print("\n---\n")
+
+            # Final generation
+            print("🎯 LLM:", final_state["generation"])
+
+        if final_state.get("unverified"):
+            print(
+                f"⚠️ Unverified answer: the {final_state.get('budget_exit')} budget "
+                "ran out before it passed the graders"
+            )
     except Exception as e:
+        failed = True
         print(f"❌ An error occurred while processing your query: {e}")
 
+    if failed and resumable(app, config):
+        print("💾 Enter /resume to resume the query from its last completed step")
+        prune(app)
+    else:
+        forget(thread_id)
+
+    trace = tracer.finish(final_state)
+    write_trace(trace)
+    metrics.record(trace)
+    if args.profile:
+        print(format_profile(trace))
+    if semantic_cache:
+        semantic_cache.record(query, final_state, trace, hit, query_scope)
+
+    if llm_cache:
+        stats = llm_cache.stats()
+        print(
+            f"🗃️ LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate)"
+        )
+    if semantic_cache and semantic_cache.stats["lookups"]:
+        stats = semantic_cache.summary()
+        print(
+            f"♻️ Semantic cache: {stats['answer_hits']} answers and "
+            f"{stats['document_hits']} document sets reused in {stats['lookups']} "
+            f"questions ({stats['hit_rate']:.0%} hit rate), "
+            f"{stats['saved_llm_calls']} LLM calls saved"
+        )
+    if prefilter_decisions:
+        print(
+            f"🔍 Relevance pre-filter this session: {prefilter_decisions['accepted']} "
+            f"accepted, {prefilter_decisions['rejected']} rejected, "
+            f"{prefilter_decisions['graded']} sent to the grader"
+        )
+    if budget_exits:
+        exits = ", ".join(f"{name}: {count}" for name, count in budget_exits.items())
+        print(f"⏳ Budget exits this session: {exits}")
+
     print(
         "-------------------------------------------------------------------------------"
     )
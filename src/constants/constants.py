@@ -0,0 +1,124 @@
+import os
+
+# Ollama server used for chat and embeddings
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+# Requests sent to Ollama at once, match the server's OLLAMA_NUM_PARALLEL
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 4))
+# How long Ollama keeps the model loaded after a request, as a duration ("30m")
+# or a number of seconds ("-1" keeps it loaded until Ollama stops)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+# Load the model with a warm-up request at startup, "0" to disable
+OLLAMA_WARM_UP = os.environ.get("OLLAMA_WARM_UP", "1") == "1"
+# Seconds an Ollama request may wait for the server to respond or send more of
+# a response before failing, so a hung server doesn't hold a slot forever
+OLLAMA_TIMEOUT_SECONDS = int(os.environ.get("OLLAMA_TIMEOUT_SECONDS", 300))
+
+# Context window Ollama allocates per chat and embedding request, longer
+# prompts are silently truncated (Ollama's own default is 2048 tokens)
+OLLAMA_NUM_CTX = int(os.environ.get("OLLAMA_NUM_CTX", 8192))
+# Tokens of retrieved context packed into the generation and hallucination
+# grading prompts, leaving room in OLLAMA_NUM_CTX for instructions and answer
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 4096))
+
+# Maximum number of retrieval grader calls sent to Ollama at the same time
+GRADER_CONCURRENCY = int(os.environ.get("GRADER_CONCURRENCY", 4))
+
+# How retrieved documents are graded: "per_document" sends one grading call per
+# chunk, "batched" grades every chunk of a query in a single call
+GRADING_MODE = os.environ.get("GRADING_MODE", "per_document")
+
+# How a failed retrieval is retried: "single" rewrites the question and loops,
+# "fanout" asks for FANOUT_QUERIES alternative queries in one call, searches
+# them concurrently and grades the merged results in one pass
+REWRITE_MODE = os.environ.get("REWRITE_MODE", "single")
+FANOUT_QUERIES = int(os.environ.get("FANOUT_QUERIES", 3))
+
+# Tag of the generator's runs, used to pick its tokens out of the event stream
+GENERATION_TAG = "answer_generation"
+
+# Persistent embedding cache, set the size to 0 to disable it
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3"
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 20000))
+
+# ClickUp API access
+CLICKUP_API_URL = os.environ.get("CLICKUP_API_URL", "https://api.clickup.com/api/v3")
+CLICKUP_CACHE_DIR = os.environ.get("CLICKUP_CACHE_DIR", ".cache/clickup")
+CLICKUP_MAX_WORKERS = int(os.environ.get("CLICKUP_MAX_WORKERS", 8))
+CLICKUP_MAX_RETRIES = int(os.environ.get("CLICKUP_MAX_RETRIES", 5))
+CLICKUP_TIMEOUT = float(os.environ.get("CLICKUP_TIMEOUT", 30))
+
+# Persistent cache of LLM responses, set the size to 0 to disable it
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", ".cache/llm.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 10000))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Retrieval: number of chunks returned, candidates fetched from each retriever
+# and reciprocal rank fusion constant when fusing BM25 with vector search
+RETRIEVER_K = int(os.environ.get("RETRIEVER_K", 4))
+RETRIEVER_FETCH_K = int(os.environ.get("RETRIEVER_FETCH_K", 20))
+RRF_K = int(os.environ.get("RRF_K", 60))
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") == "1"
+
+# Per-query budgets of the self-correcting graph. Once one is exhausted the best
+# graded answer so far is returned, flagged as unverified
+MAX_REGENERATIONS = int(os.environ.get("MAX_REGENERATIONS", 2))
+MAX_REWRITES = int(os.environ.get("MAX_REWRITES", 2))
+QUERY_DEADLINE_SECONDS = float(os.environ.get("QUERY_DEADLINE_SECONDS", 180))
+QUERY_TOKEN_BUDGET = int(os.environ.get("QUERY_TOKEN_BUDGET", 60000))
+
+# Graph state saved to SQLite after every node, so a failed query can be resumed
+# from its last completed node; set the path to "" to disable checkpoints. The
+# checkpoints of the latest failed queries are kept, and a node failing on a
+# transient Ollama error is retried up to NODE_MAX_ATTEMPTS times in all
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", ".cache/checkpoints.sqlite3")
+CHECKPOINT_MAX_FAILED = int(os.environ.get("CHECKPOINT_MAX_FAILED", 20))
+NODE_MAX_ATTEMPTS = int(os.environ.get("NODE_MAX_ATTEMPTS", 3))
+
+# Per-query traces appended as JSON lines, set the path to "" to disable them.
+# Aggregated metrics are served in the Prometheus text format when a port is set
+TRACE_PATH = os.environ.get("TRACE_PATH", ".cache/traces.jsonl")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+
+# Query server: queries answered at once and queries allowed to wait for a slot
+# before new ones are rejected
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", 8000))
+MAX_CONCURRENT_QUERIES = int(os.environ.get("MAX_CONCURRENT_QUERIES", 8))
+QUERY_QUEUE_LIMIT = int(os.environ.get("QUERY_QUEUE_LIMIT", 32))
+
+# Ingestion pipeline: chunks embedded and upserted per batch, and items each
+# stage may run ahead of the next one
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 8))
+
+# Workspace crawl: docs ingested at once and directory of the resumable
+# per-workspace checkpoints
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS", 4))
+CRAWL_CHECKPOINT_DIR = os.environ.get("CRAWL_CHECKPOINT_DIR", ".cache/crawl")
+
+# Session cache of answered questions: questions kept, 0 disables it, and the
+# cosine similarity thresholds from which a question reuses the graded
+# documents or verified answer of an earlier one, written by
+# benchmarks.calibrate_semantic_cache. Until the file exists, or if the path
+# is empty, the cache is off
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 256))
+SEMANTIC_CACHE_THRESHOLDS_PATH = os.environ.get(
+    "SEMANTIC_CACHE_THRESHOLDS_PATH", ".cache/semantic_cache_thresholds.json"
+)
+
+# Retrieval score and lexical overlap thresholds above which chunks skip the
+# LLM relevance grader, written by benchmarks.calibrate_prefilter. Until the
+# file exists, or if the path is empty, every chunk is graded by the LLM
+PREFILTER_THRESHOLDS_PATH = os.environ.get(
+    "PREFILTER_THRESHOLDS_PATH", ".cache/prefilter_thresholds.json"
+)
+
+# Vector store: "chroma", or "numpy" for a memory-mapped matrix stored as
+# VECTOR_DTYPE ("int8" or "float16"), optionally reduced to VECTOR_DIMENSIONS
+# dimensions by VECTOR_REDUCTION ("none", "pca" or "random")
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_DTYPE = os.environ.get("VECTOR_DTYPE", "int8")
+VECTOR_REDUCTION = os.environ.get("VECTOR_REDUCTION", "none")
+VECTOR_DIMENSIONS = int(os.environ.get("VECTOR_DIMENSIONS", 512))
@@ -1,25 +1,40 @@
 from langgraph.graph import END, START, StateGraph
 
+from .recovery import checkpointer, retry_policy
 from .state import (
     GraphState,
+    decide_after_grading,
+    decide_entry,
     decide_to_generate,
     generate,
     grade_documents,
     grade_generation_v_documents_and_question,
     retrieve,
+    return_best_answer,
     transform_query,
 )
 
 workflow = StateGraph(GraphState)
 
 # Define the nodes
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("grade_documents", grade_documents)
-workflow.add_node("generate", generate)
-workflow.add_node("transform_query", transform_query)
+workflow.add_node("retrieve", retrieve, retry=retry_policy)
+workflow.add_node("grade_documents", grade_documents, retry=retry_policy)
+workflow.add_node("generate", generate, retry=retry_policy)
+workflow.add_node(
+    "grade_generation", grade_generation_v_documents_and_question, retry=retry_policy
+)
+workflow.add_node("transform_query", transform_query, retry=retry_policy)
+workflow.add_node("return_best_answer", return_best_answer)
 
 # Build graph
-workflow.add_edge(START, "retrieve")
+workflow.add_conditional_edges(
+    START,
+    decide_entry,
+    {
+        "retrieve": "retrieve",
+        "cached documents": "generate",
+    },
+)
 workflow.add_edge("retrieve", "grade_documents")
 workflow.add_conditional_edges(
     "grade_documents",
@@ -27,18 +42,22 @@ workflow.add_conditional_edges(
     {
         "transform_query": "transform_query",
         "generate": "generate",
+        "budget exhausted": "return_best_answer",
     },
 )
 workflow.add_edge("transform_query", "retrieve")
+workflow.add_edge("generate", "grade_generation")
 workflow.add_conditional_edges(
-    "generate",
-    grade_generation_v_documents_and_question,
+    "grade_generation",
+    decide_after_grading,
     {
         "not supported": "generate",
         "useful": END,
         "not useful": "transform_query",
+        "budget exhausted": "return_best_answer",
     },
 )
+workflow.add_edge("return_best_answer", END)
 
-# Compile
-app = workflow.compile()
+# Compile, saving the state after every node so failed queries can be resumed
+app = workflow.compile(checkpointer=checkpointer)
@@ -0,0 +1,160 @@
+"""
+Metrics aggregated over query traces, exposed in the Prometheus text format.
+"""
+
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+
+from src.llms.scheduler import WAIT_BUCKETS, scheduler
+
+PREFIX = "clickup_llama"
+
+# Upper bounds of the query latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 180, 300)
+
+COUNTERS = {
+    "queries_total": "Queries answered",
+    "unverified_answers_total": "Answers returned without passing the graders",
+    "budget_exits_total": "Queries stopped by a budget, by budget",
+    "node_runs_total": "Node runs, by node",
+    "node_seconds_total": "Wall time spent in each node",
+    "llm_calls_total": "LLM calls, by node and chain",
+    "llm_seconds_total": "Wall time spent in LLM calls, by node and chain",
+    "llm_tokens_total": "Prompt and completion tokens, by node and chain",
+    "llm_cache_hits_total": "LLM calls answered from the cache, by node and chain",
+}
+
+
+class Metrics:
+    """Thread-safe counters and a query latency histogram fed by `record`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._buckets = [0] * len(LATENCY_BUCKETS)
+        self._latency_count = 0
+        self._latency_sum = 0.0
+
+    def record(self, trace: Dict[str, Any]) -> None:
+        with self._lock:
+            self._inc("queries_total")
+            if trace["unverified"]:
+                self._inc("unverified_answers_total")
+            if trace["budget_exit"]:
+                self._inc("budget_exits_total", budget=trace["budget_exit"])
+
+            seconds = trace["seconds"]
+            self._latency_count += 1
+            self._latency_sum += seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self._buckets[index] += 1
+
+            for span in trace["nodes"]:
+                node = span["node"]
+                self._inc("node_runs_total", node=node)
+                self._inc("node_seconds_total", span["seconds"] or 0.0, node=node)
+                for chain, usage in span["chains"].items():
+                    labels = {"node": node, "chain": chain}
+                    self._inc("llm_calls_total", usage["llm_calls"], **labels)
+                    self._inc("llm_seconds_total", usage["llm_seconds"], **labels)
+                    self._inc(
+                        "llm_tokens_total",
+                        usage["prompt_tokens"],
+                        kind="prompt",
+                        **labels,
+                    )
+                    self._inc(
+                        "llm_tokens_total",
+                        usage["completion_tokens"],
+                        kind="completion",
+                        **labels,
+                    )
+                    self._inc("llm_cache_hits_total", usage["cache_hits"], **labels)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text in COUNTERS.items():
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{PREFIX}_{name}{format_labels(labels)} {value:g}")
+
+            name = f"{PREFIX}_query_seconds"
+            lines.append(f"# HELP {name} Query latency")
+            lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(LATENCY_BUCKETS, self._buckets):
+                lines.append(f'{name}_bucket{{le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {self._latency_count}')
+            lines.append(f"{name}_sum {self._latency_sum:g}")
+            lines.append(f"{name}_count {self._latency_count}")
+
+        ollama = scheduler.stats()
+        name = f"{PREFIX}_ollama_queue_wait_seconds"
+        lines.append(f"# HELP {name} Time Ollama requests waited for a slot, by class")
+        lines.append(f"# TYPE {name} histogram")
+        for priority, waits in ollama["queue_wait"].items():
+            for bound, count in zip(WAIT_BUCKETS, waits["buckets"]):
+                lines.append(
+                    f'{name}_bucket{{le="{bound:g}",priority="{priority}"}} {count}'
+                )
+            lines.append(
+                f'{name}_bucket{{le="+Inf",priority="{priority}"}} {waits["count"]}'
+            )
+            lines.append(f'{name}_sum{{priority="{priority}"}} {waits["sum"]:g}')
+            lines.append(f'{name}_count{{priority="{priority}"}} {waits["count"]}')
+        name = f"{PREFIX}_ollama_requests_running"
+        lines.append(f"# HELP {name} Requests holding an Ollama slot")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {ollama['running']}")
+        name = f"{PREFIX}_ollama_requests_waiting"
+        lines.append(f"# HELP {name} Requests waiting for an Ollama slot, by class")
+        lines.append(f"# TYPE {name} gauge")
+        for priority, count in ollama["waiting"].items():
+            lines.append(f'{name}{{priority="{priority}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def _inc(self, name: str, value: float = 1, **labels: str) -> None:
+        self._counters[name][tuple(sorted(labels.items()))] += value
+
+
+def format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve `/metrics` on localhost from a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,115 @@
+"""
+Cheap relevance checks run before the LLM retrieval grader.
+
+A chunk whose retrieval score and lexical overlap with the question are both
+above the calibrated accept thresholds is kept without asking the grader, one
+with both below the reject thresholds is dropped, and only the chunks in
+between are graded by the LLM. The thresholds are written by
+`python -m benchmarks.calibrate_prefilter` from a labeled set, and every chunk
+goes to the grader until they exist.
+"""
+
+import json
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from src.constants.constants import PREFILTER_THRESHOLDS_PATH
+from src.index.bm25 import tokenize
+
+# Words too common to say anything about relevance
+STOP_WORDS = set(
+    "a about an and are as at be by can do does for from how i in is it of on or "
+    "our the this to we what when where which who why with you".split()
+)
+
+# Number of chunks kept, dropped or sent to the grader, since startup
+prefilter_decisions = Counter()
+
+
+def question_terms(question: str) -> set:
+    return set(tokenize(question)) - STOP_WORDS
+
+
+def lexical_overlap(question: str, text: str) -> float:
+    """Fraction of the question's terms found in the text."""
+    terms = question_terms(question)
+    if not terms:
+        return 0.0
+    return len(terms & set(tokenize(text))) / len(terms)
+
+
+@lru_cache(maxsize=None)
+def load_thresholds(path: str = PREFILTER_THRESHOLDS_PATH) -> Optional[Dict[str, Any]]:
+    """The calibrated thresholds, or None if calibration never ran."""
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def decide(
+    relevance_score: Optional[float], overlap: float, thresholds: Dict[str, Any]
+) -> Optional[bool]:
+    """
+    Decide on a chunk from its scores, None when the grader has to decide.
+
+    Args:
+        relevance_score (float): The retrieval relevance score, None for chunks
+            found by keyword search only
+        overlap (float): The lexical overlap of the chunk with the question
+        thresholds (dict): The calibrated `accept` and `reject` thresholds
+
+    Returns:
+        bool: True to keep the chunk, False to drop it, None if ambiguous
+    """
+    if relevance_score is None:
+        return None
+    accept = thresholds.get("accept")
+    if (
+        accept
+        and relevance_score >= accept["relevance_score"]
+        and overlap >= accept["lexical_overlap"]
+    ):
+        return True
+    reject = thresholds.get("reject")
+    if (
+        reject
+        and relevance_score <= reject["relevance_score"]
+        and overlap <= reject["lexical_overlap"]
+    ):
+        return False
+    return None
+
+
+def prefilter_documents(question: str, documents: List[Any]) -> List[Optional[bool]]:
+    """
+    Keep or drop the clear-cut documents, leaving the others to the grader.
+
+    Args:
+        question (str): The question being asked
+        documents (list): The retrieved documents
+
+    Returns:
+        list: One verdict per document in document order, None for the
+            documents the grader has to decide on
+    """
+    thresholds = load_thresholds()
+    if thresholds is None:
+        return [None] * len(documents)
+    verdicts = [
+        decide(
+            doc.metadata.get("relevance_score"),
+            lexical_overlap(question, doc.page_content),
+            thresholds,
+        )
+        for doc in documents
+    ]
+    prefilter_decisions.update(
+        {True: "accepted", False: "rejected", None: "graded"}[verdict]
+        for verdict in verdicts
+    )
+    return verdicts
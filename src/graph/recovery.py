@@ -0,0 +1,141 @@
+"""
+Recovery of queries whose nodes fail.
+
+Nodes failing on a transient Ollama error (connection lost, timeout, 5xx) are
+retried with exponential backoff. Every query also runs in its own
+checkpointer thread, keyed by its trace's query ID: the graph state is saved
+to SQLite after every node, so a query that still fails, or whose process is
+interrupted, can be resumed from its last completed node without redoing its
+retrieval, grading and generation. Malformed LLM output is not retried, at
+temperature 0 and with the LLM cache the same prompt returns the same response.
+
+Checkpoints of finished queries are deleted, those of the latest
+CHECKPOINT_MAX_FAILED failed queries are kept to be resumed.
+"""
+
+import asyncio
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from langchain_core.runnables.config import merge_configs
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.pregel.types import RetryPolicy
+
+from src.constants.constants import (
+    CHECKPOINT_MAX_FAILED,
+    CHECKPOINT_PATH,
+    NODE_MAX_ATTEMPTS,
+)
+from src.llms.ollama import OllamaRequestError
+
+
+class ExecutorSqliteSaver(SqliteSaver):
+    """SqliteSaver whose async methods run the sync ones in the default executor."""
+
+    async def aget_tuple(self, config):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.get_tuple, config
+        )
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoints = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)),
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.put_writes, config, writes, task_id
+        )
+
+
+def open_checkpointer(path: str = CHECKPOINT_PATH) -> Optional[ExecutorSqliteSaver]:
+    if not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return ExecutorSqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+
+checkpointer = open_checkpointer()
+
+
+def is_transient(exc: Exception) -> bool:
+    """Whether a node failed on an error worth retrying right away."""
+    if isinstance(exc, OllamaRequestError):
+        return exc.status_code is None or exc.status_code >= 500
+    return isinstance(exc, (requests.RequestException, ConnectionError, TimeoutError))
+
+
+retry_policy = RetryPolicy(
+    initial_interval=0.25, max_attempts=NODE_MAX_ATTEMPTS, retry_on=is_transient
+)
+
+
+def query_config(thread_id: str, config: Optional[Dict[str, Any]] = None) -> dict:
+    """Config running or resuming the query checkpointed as `thread_id`."""
+    return merge_configs(config, {"configurable": {"thread_id": thread_id}})
+
+
+def resumable(app, config: Dict[str, Any]) -> bool:
+    """Whether the query of `config` stopped before reaching the end."""
+    return checkpointer is not None and bool(app.get_state(config).next)
+
+
+def failed_queries(app) -> List[Tuple[str, str]]:
+    """
+    List the queries that can be resumed, most recent first.
+
+    Args:
+        app: The compiled graph
+
+    Returns:
+        list: (thread ID, question) pairs
+    """
+    if checkpointer is None:
+        return []
+    with checkpointer.cursor(transaction=False) as cursor:
+        thread_ids = [
+            row[0]
+            for row in cursor.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id "
+                "ORDER BY MAX(checkpoint_id) DESC"
+            )
+        ]
+    queries = []
+    for thread_id in thread_ids:
+        state = app.get_state(query_config(thread_id))
+        if state.next:
+            values = state.values
+            queries.append(
+                (thread_id, values.get("original_question") or values.get("question"))
+            )
+        else:
+            # Finished, but its process stopped before deleting it
+            forget(thread_id)
+    return queries
+
+
+def forget(thread_id: str) -> None:
+    """Delete the checkpoints of a query."""
+    if checkpointer is None:
+        return
+    with checkpointer.cursor() as cursor:
+        cursor.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        cursor.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+
+def prune(app, keep: int = CHECKPOINT_MAX_FAILED) -> None:
+    """Delete the checkpoints of all but the `keep` latest failed queries."""
+    for thread_id, _ in failed_queries(app)[keep:]:
+        forget(thread_id)
@@ -0,0 +1,281 @@
+"""
+Session cache of answered questions, looked up by embedding similarity.
+
+A question close enough to one answered before in the same scope reuses its
+verified answer, or at least its graded documents, skipping retrieval and
+grading. Entries record the content version of every page their documents
+came from and are dropped once one of these pages is edited or deleted.
+
+Unrelated questions about the same docs often embed close to each other, so
+the similarity thresholds are calibrated on labeled question pairs by
+`python -m benchmarks.calibrate_semantic_cache`, and the cache stays off until
+they exist.
+"""
+
+import hashlib
+import json
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema.document import Document
+
+from src.constants.constants import (
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLDS_PATH,
+)
+from src.index.scope import Scope
+from src.index.store import check_workspace_id, get_embeddings, get_vector_store
+
+# Nodes a reused set of graded documents skips
+RETRIEVAL_NODES = ("retrieve", "grade_documents", "transform_query")
+
+
+@dataclass(eq=False)
+class CacheEntry:
+    question: str
+    vector: np.ndarray
+    documents: List[Document]
+    # Content version by workspace ID and file path of every page used
+    page_versions: Dict[Tuple[str, str], Optional[str]]
+    scope: Scope = Scope()
+    answer: Optional[dict] = None
+    # LLM calls the original run made, in all and before generating
+    llm_calls: int = 0
+    retrieval_llm_calls: int = 0
+
+
+@dataclass
+class CacheHit:
+    entry: CacheEntry
+    similarity: float
+    # Whether the answer is reused, otherwise only the graded documents are
+    reuse_answer: bool
+    vector: np.ndarray = field(repr=False)
+
+    @property
+    def saved_llm_calls(self) -> int:
+        if self.reuse_answer:
+            return self.entry.llm_calls
+        return self.entry.retrieval_llm_calls
+
+    def inputs(self) -> Dict[str, Any]:
+        """Graph inputs starting at generation with the cached documents."""
+        return {"documents": copy_documents(self.entry.documents)}
+
+
+def copy_documents(documents: List[Document]) -> List[Document]:
+    return [
+        Document(page_content=document.page_content, metadata=dict(document.metadata))
+        for document in documents
+    ]
+
+
+def page_key(document: Document) -> Tuple[str, str]:
+    """The workspace ID and file path of the page a document comes from."""
+    return (
+        str(document.metadata.get("workspace_id") or "").strip("/"),
+        document.metadata.get("file_path") or "",
+    )
+
+
+def page_version(workspace_id: str, file_path: str) -> Optional[str]:
+    """
+    Hash of a page's chunk IDs, which are hashes of their content. A page of
+    no valid workspace has no version.
+    """
+    try:
+        check_workspace_id(workspace_id)
+    except ValueError:
+        return None
+    ids = get_vector_store(workspace_id).get(
+        where={"file_path": file_path}, include=[]
+    )["ids"]
+    return hashlib.sha256("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """
+    In-memory cache of graded documents and verified answers by question.
+
+    A lookup embeds the question, which the retriever's embedding cache then
+    serves again if the graph runs. Questions at least `answer_threshold`
+    similar to a verified one reuse its answer, at least `threshold` similar
+    reuse its graded documents. The least recently used entries are evicted
+    beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        answer_threshold: float = math.inf,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.answer_threshold = answer_threshold
+        self.max_entries = max_entries
+        self.entries: List[CacheEntry] = []
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def embed(question: str) -> np.ndarray:
+        vector = np.asarray(get_embeddings().embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question: str, scope: Scope = Scope()) -> Optional[CacheHit]:
+        """
+        Find the closest still valid entry for a question.
+
+        Args:
+            question (str): The user's question
+            scope (Scope): The scope of the question, only entries of the
+                same scope are reused
+
+        Returns:
+            CacheHit: The entry and what to reuse from it, or None on a miss
+        """
+        vector = self.embed(question)
+        with self._lock:
+            self.stats["lookups"] += 1
+            candidates = []
+            entries = [entry for entry in self.entries if entry.scope == scope]
+            if entries:
+                similarities = np.stack([entry.vector for entry in entries]) @ vector
+                candidates = [
+                    (float(similarities[index]), entries[index])
+                    for index in np.argsort(-similarities)
+                    if similarities[index] >= self.threshold
+                ]
+        for similarity, entry in candidates:
+            if not self._is_current(entry):
+                self._remove(entry)
+                self.stats["invalidated"] += 1
+                continue
+            reuse_answer = (
+                entry.answer is not None and similarity >= self.answer_threshold
+            )
+            hit = CacheHit(entry, similarity, reuse_answer, vector)
+            with self._lock:
+                # Most recently used entries are kept last
+                if entry in self.entries:
+                    self.entries.remove(entry)
+                    self.entries.append(entry)
+                self.stats["answer_hits" if reuse_answer else "document_hits"] += 1
+                self.stats["saved_llm_calls"] += hit.saved_llm_calls
+            return hit
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def record(
+        self,
+        question: str,
+        final_state: Dict[str, Any],
+        trace: Dict[str, Any],
+        hit: Optional[CacheHit] = None,
+        scope: Scope = Scope(),
+    ) -> None:
+        """
+        Cache the graded documents of a finished query, and its answer if verified.
+
+        Args:
+            question (str): The user's question
+            final_state (dict): The final graph state
+            trace (dict): The query trace, for the LLM calls it made
+            hit (CacheHit): The lookup result of the question, if any
+            scope (Scope): The scope the question was asked in
+        """
+        documents = final_state.get("documents") or []
+        if not documents or (hit and hit.reuse_answer):
+            return
+        verified = final_state.get("generation_grade") == "useful"
+        retrieval_llm_calls = sum(
+            node["llm_calls"]
+            for node in trace.get("nodes", [])
+            if node["node"] in RETRIEVAL_NODES
+        )
+        if hit:
+            # Reused documents were not retrieved again, their cost carries over
+            retrieval_llm_calls += hit.entry.retrieval_llm_calls
+        entry = CacheEntry(
+            question=question,
+            vector=hit.vector if hit else self.embed(question),
+            documents=copy_documents(documents),
+            page_versions={
+                key: page_version(*key)
+                for key in {page_key(document) for document in documents}
+                if key[1]
+            },
+            scope=scope,
+            answer=final_state.get("generation") if verified else None,
+            llm_calls=trace.get("llm_calls", 0)
+            + (hit.entry.retrieval_llm_calls if hit else 0),
+            retrieval_llm_calls=retrieval_llm_calls,
+        )
+        with self._lock:
+            self.entries.append(entry)
+            del self.entries[: max(0, len(self.entries) - self.max_entries)]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["lookups"]
+            hits = self.stats["answer_hits"] + self.stats["document_hits"]
+            return {
+                "lookups": lookups,
+                "answer_hits": self.stats["answer_hits"],
+                "document_hits": self.stats["document_hits"],
+                "misses": self.stats["misses"],
+                "invalidated": self.stats["invalidated"],
+                "saved_llm_calls": self.stats["saved_llm_calls"],
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+            }
+
+    def _is_current(self, entry: CacheEntry) -> bool:
+        return all(
+            page_version(*key) == version
+            for key, version in entry.page_versions.items()
+        )
+
+    def _remove(self, entry: CacheEntry) -> None:
+        with self._lock:
+            if entry in self.entries:
+                self.entries.remove(entry)
+
+
+def load_thresholds(
+    path: str = SEMANTIC_CACHE_THRESHOLDS_PATH,
+) -> Optional[Dict[str, Any]]:
+    """The calibrated thresholds, or None if calibration never ran."""
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def calibrated_cache() -> Optional[SemanticCache]:
+    """A cache at the calibrated thresholds, None if it is off."""
+    thresholds = load_thresholds()
+    if SEMANTIC_CACHE_MAX_ENTRIES <= 0 or thresholds is None:
+        return None
+    # A reuse no threshold reached the required precision for stays off
+    answer, documents = (
+        (thresholds.get(reuse) or {}).get("similarity")
+        for reuse in ("answer", "documents")
+    )
+    if answer is None and documents is None:
+        return None
+    return SemanticCache(
+        threshold=min(value for value in (answer, documents) if value is not None),
+        answer_threshold=math.inf if answer is None else answer,
+    )
+
+
+semantic_cache = calibrated_cache()
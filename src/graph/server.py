@@ -0,0 +1,254 @@
+"""
+Asyncio HTTP server answering queries from many users concurrently.
+
+POST /query with {"question": "..."} streams newline-delimited JSON events: one
+per node as the graph runs, then the result. Generations are streamed as soon
+as they are generated, flagged as speculative, and withdrawn by the grading
+event that follows if the graders reject them. Send {"stream": false} to get the
+result as a single JSON object. Add "workspace_id", and optionally
+"doc_ids", to only search a workspace or some of its docs. GET /health
+reports the load, GET /metrics serves the Prometheus metrics.
+
+Queries beyond MAX_CONCURRENT_QUERIES wait for a slot, and once
+QUERY_QUEUE_LIMIT queries are waiting new ones are rejected with a 503.
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+from src.constants.constants import (
+    MAX_CONCURRENT_QUERIES,
+    OLLAMA_NUM_PARALLEL,
+    OLLAMA_WARM_UP,
+    QUERY_QUEUE_LIMIT,
+)
+from src.index.scope import Scope
+from src.llms.scheduler import scheduler
+
+from .metrics import metrics
+from .recovery import forget, query_config
+from .tracing import QueryTracer, write_trace
+
+GRAPH = web.AppKey("graph", object)
+ADMISSION = web.AppKey("admission", object)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class AdmissionControl:
+    """Bound the number of running queries and of queries waiting to run."""
+
+    def __init__(self, max_concurrent: int, max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._slots.locked() and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise QueueFullError()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+
+def node_event(node, update):
+    """Summarize a node update as a JSON-serializable event."""
+    event = {"event": "node", "node": node}
+    for key in ("generation", "generation_grade", "question", "queries"):
+        if key in (update or {}):
+            event[key] = update[key]
+    if "documents" in (update or {}):
+        event["documents"] = len(update["documents"])
+    # A generation is streamed before the graders run, clients may show it
+    # right away and withdraw it if the grade that follows is not "useful"
+    if node == "generate":
+        event["speculative"] = True
+    if node == "grade_generation":
+        event["withdrawn"] = (update or {}).get("generation_grade") != "useful"
+    return event
+
+
+async def run_query(app, question, scope=Scope()):
+    """
+    Run the graph on a question, yielding an event per node then the result.
+
+    Args:
+        app: The compiled graph
+        question (str): The user's question
+        scope (Scope): The workspace and docs to search
+
+    Yields:
+        dict: The events of the run
+    """
+    tracer = QueryTracer(question)
+    inputs = {"question": question, "original_question": question, **scope.inputs()}
+    config = query_config(tracer.query_id, {"callbacks": [tracer]})
+    final_state = {}
+    try:
+        async for output in app.astream(inputs, config):
+            for node, update in output.items():
+                final_state.update(update or {})
+                yield node_event(node, update)
+    finally:
+        # Failed nodes were retried already, the client asks again instead of
+        # resuming
+        await asyncio.get_running_loop().run_in_executor(None, forget, tracer.query_id)
+        trace = tracer.finish(final_state)
+        write_trace(trace)
+        metrics.record(trace)
+
+    yield {
+        "event": "result",
+        "query_id": trace["query_id"],
+        "generation": final_state.get("generation"),
+        "unverified": trace["unverified"],
+        "budget_exit": trace["budget_exit"],
+        "seconds": trace["seconds"],
+        "llm_calls": trace["llm_calls"],
+    }
+
+
+async def handle_query(request):
+    try:
+        body = await request.json()
+        question = body["question"].strip()
+    except (ValueError, KeyError, AttributeError):
+        return web.json_response(
+            {"error": 'expected a JSON body like {"question": "..."}'}, status=400
+        )
+    if not question:
+        return web.json_response({"error": "the question is empty"}, status=400)
+    workspace_id = body.get("workspace_id")
+    doc_ids = body.get("doc_ids") or []
+    try:
+        if not isinstance(doc_ids, list):
+            raise ValueError("doc_ids must be a list of doc IDs")
+        scope = Scope(
+            None if workspace_id is None else str(workspace_id),
+            tuple(map(str, doc_ids)),
+        )
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    admission = request.app[ADMISSION]
+    app = request.app[GRAPH]
+    queued_at = time.perf_counter()
+    try:
+        async with admission.admit():
+            queue_seconds = round(time.perf_counter() - queued_at, 4)
+            if body.get("stream", True) is False:
+                async for event in run_query(app, question, scope):
+                    pass
+                return web.json_response({**event, "queue_seconds": queue_seconds})
+
+            response = web.StreamResponse(
+                headers={"Content-Type": "application/x-ndjson"}
+            )
+            await response.prepare(request)
+            await write_event(response, {"event": "start", "queue": queue_seconds})
+            try:
+                async for event in run_query(app, question, scope):
+                    await write_event(response, event)
+            except ConnectionResetError:
+                raise
+            except Exception as e:
+                print(f"❌ An error occurred while processing a query: {e}")
+                await write_event(response, {"event": "error", "error": str(e)})
+            await response.write_eof()
+            return response
+    except QueueFullError:
+        return web.json_response(
+            {"error": "too many queries in flight, retry later"},
+            status=503,
+            headers={"Retry-After": "1"},
+        )
+
+
+async def write_event(response, event):
+    await response.write(json.dumps(event, default=str).encode("utf-8") + b"\n")
+
+
+async def handle_health(request):
+    admission = request.app[ADMISSION]
+    ollama = scheduler.stats()
+    return web.json_response(
+        {
+            "status": "ok",
+            "running": admission.running,
+            "waiting": admission.waiting,
+            "rejected": admission.rejected,
+            "max_concurrent_queries": admission.max_concurrent,
+            "query_queue_limit": admission.max_queued,
+            "ollama_num_parallel": OLLAMA_NUM_PARALLEL,
+            "ollama_running": ollama["running"],
+            "ollama_waiting": ollama["waiting"],
+        }
+    )
+
+
+async def handle_metrics(request):
+    return web.Response(
+        text=metrics.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+def create_app(graph) -> web.Application:
+    """Build the aiohttp application serving `graph`."""
+    server = web.Application()
+    server[GRAPH] = graph
+    server[ADMISSION] = AdmissionControl(MAX_CONCURRENT_QUERIES, QUERY_QUEUE_LIMIT)
+    server.router.add_post("/query", handle_query)
+    server.router.add_get("/health", handle_health)
+    server.router.add_get("/metrics", handle_metrics)
+    return server
+
+
+def serve(host: str, port: int) -> None:
+    """Serve the graph until interrupted."""
+    from src.index.store import get_retrievers
+
+    from .graph import app
+
+    # Open the shared retrievers before the first query needs them
+    get_retrievers()
+
+    async def on_startup(server):
+        # Synchronous nodes run in the default executor, size it so every
+        # admitted query has a thread
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES + 4)
+        )
+        if OLLAMA_WARM_UP:
+            from src.llms.llm import warm_up_models
+
+            # Load the model before accepting the first query
+            loaded = await asyncio.get_running_loop().run_in_executor(
+                None, warm_up_models
+            )
+            for model, seconds in loaded.items():
+                print(f"🔥 Loaded {model} into Ollama in {seconds:.1f}s")
+
+    server = create_app(app)
+    server.on_startup.append(on_startup)
+    print(f"🚀 Serving queries on http://{host}:{port}/query")
+    web.run_app(server, host=host, port=port, print=None)
@@ -1,13 +1,34 @@
-from typing import List
+import operator
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
 
-from typing_extensions import TypedDict
+from typing_extensions import Annotated, TypedDict
 
-from src.index.indexer import retriever
-from src.llms.answer_grader import answer_grader
-from src.llms.generator import rag_chain
-from src.llms.hallucination_grader import hallucination_grader
-from src.llms.retrieval_grader import retrieval_grader
-from src.llms.rewriter import question_rewriter
+from src.constants.constants import (
+    FANOUT_QUERIES,
+    GRADER_CONCURRENCY,
+    GRADING_MODE,
+    MAX_REGENERATIONS,
+    MAX_REWRITES,
+    QUERY_DEADLINE_SECONDS,
+    QUERY_TOKEN_BUDGET,
+    REWRITE_MODE,
+)
+from src.index.scope import Scope
+from src.index.store import get_retrievers
+from src.llms.usage import get_usage_callback
+
+# Chains are imported inside the nodes, so importing the graph doesn't build
+# every chain and its langchain dependencies up front
+
+
+# Number of queries that ended because a budget ran out, by budget
+budget_exits = Counter()
+
+# Rank of a graded generation when picking the best answer so far
+GRADE_RANKS = {"not supported": 0, "not useful": 1, "useful": 2}
 
 
 class GraphState(TypedDict):
@@ -16,15 +37,41 @@ class GraphState(TypedDict):
 
     Attributes:
         question: The question being asked
+        original_question: The question as the user asked it, before rewrites
+        workspace_id: Workspace searched by retrieval, every workspace if None
+        doc_ids: Docs of the workspace retrieval is restricted to, if any
         generation: The generated answer from the LLM
         feedback: Feedback from the previous generation
         documents: List of retrieved documents
+        queries: Alternative search queries of the last fan-out rewrite
+        generation_grade: Grade of the last generation
+        best_generation: Best graded generation so far
+        best_generation_grade: Grade of the best generation so far
+        rewrites: Number of question rewrites
+        regenerations: Number of generations retried as not grounded
+        tokens_used: Prompt and completion tokens used by the query
+        deadline: Wall-clock time after which the query stops looping
+        unverified: Whether the answer was returned without passing the graders
+        budget_exit: The budget that ran out, if any
     """
 
     question: str
+    original_question: str
+    workspace_id: Optional[str]
+    doc_ids: List[str]
     generation: str
     feedback: str
     documents: List[str]
+    queries: List[str]
+    generation_grade: str
+    best_generation: dict
+    best_generation_grade: str
+    rewrites: Annotated[int, operator.add]
+    regenerations: Annotated[int, operator.add]
+    tokens_used: Annotated[int, operator.add]
+    deadline: float
+    unverified: bool
+    budget_exit: str
 
 
 def retrieve(state):
@@ -37,13 +84,27 @@ def retrieve(state):
     Returns:
         dict: Updated state with retrieved documents
     """
+    from src.index.hybrid import search_workspaces
+
     print("---RETRIEVE---")
     question = state["question"]
-
-    # Retrieve documents
-    documents = retriever.invoke(question)
+    queries = state.get("queries")
+    scope = Scope.of(state)
+    if scope.workspace_id:
+        print(f"---RETRIEVE: {str(scope).upper()}---")
+
+    # Retrieve documents, for every alternative query after a fan-out rewrite
+    if queries:
+        print(f"---RETRIEVE: {len(queries)} QUERIES---")
+    documents = search_workspaces(
+        get_retrievers(scope.workspace_id), question, queries, scope.doc_ids
+    )
     print(documents)
-    return {"documents": documents, "question": question}
+    return {
+        "documents": documents,
+        "question": question,
+        "deadline": state.get("deadline") or time.time() + QUERY_DEADLINE_SECONDS,
+    }
 
 
 def generate(state):
@@ -56,25 +117,38 @@ def generate(state):
     Returns:
         dict: Updated state with the generated answer
     """
+    from src.llms.context import build_context
+    from src.llms.generator import rag_chain
+    from src.llms.scheduler import ollama_priority
+
     print("---GENERATE---")
     question = state["question"]
     documents = state["documents"]
     feedback = state.get("feedback", "")
 
-    # Generate answer using RAG chain
-    generation = rag_chain.invoke(
-        {
-            "context": documents,
-            "question": question,
-            "feedback": (
-                f"Feedback from last LLM run: \n {feedback}, \ncan you now improve based on this response"
-                if feedback
-                else ""
-            ),
-        }
-    )
+    # Generate answer using RAG chain, ahead of grading and ingestion requests
+    with get_usage_callback() as usage, ollama_priority("generation"):
+        generation = rag_chain.invoke(
+            {
+                "context": build_context(documents),
+                "question": question,
+                "feedback": (
+                    f"Feedback from last LLM run: \n {feedback}, \ncan you now improve based on this response"
+                    if feedback
+                    else ""
+                ),
+            }
+        )
     print(generation)
-    return {"documents": documents, "question": question, "generation": generation}
+    return {
+        "documents": documents,
+        "question": question,
+        "generation": generation,
+        "regenerations": int(state.get("generation_grade") == "not supported"),
+        # Set here when cached documents skipped retrieval
+        "deadline": state.get("deadline") or time.time() + QUERY_DEADLINE_SECONDS,
+        "tokens_used": usage.total_tokens,
+    }
 
 
 def grade_documents(state):
@@ -85,74 +159,210 @@ def grade_documents(state):
         state (dict): The current graph state
 
     Returns:
-        dict: Updated state with only relevant documents
+        dict: Updated state with only relevant documents and the budget that
+            ran out, if any
     """
+    from .prefilter import prefilter_documents
+
     print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
     question = state["question"]
     documents = state["documents"]
 
+    # Clear-cut documents are decided from their scores, only the ambiguous
+    # ones are graded by the LLM
+    verdicts = prefilter_documents(question, documents)
+    ambiguous = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    print(
+        f"---PREFILTER: {verdicts.count(True)} ACCEPTED, {verdicts.count(False)} "
+        f"REJECTED, {len(ambiguous)} TO GRADE---"
+    )
+
+    graded = None
+    to_grade = [documents[index] for index in ambiguous]
+    with get_usage_callback() as usage:
+        if GRADING_MODE == "batched" and to_grade:
+            graded = grade_documents_batched(question, to_grade)
+        if graded is None:
+            graded = grade_documents_concurrently(question, to_grade)
+    for index, relevant in zip(ambiguous, graded):
+        verdicts[index] = relevant
+
     # Filter relevant documents
     filtered_docs = []
-    for doc in documents:
-        score = retrieval_grader.invoke(
-            {"question": question, "document": doc.page_content}
-        )
-        print(score)
-        if score["score"] == "yes" or score["score"][0] == "yes":
+    for doc, relevant in zip(documents, verdicts):
+        if relevant:
             print("---GRADE: DOCUMENT RELEVANT---")
             filtered_docs.append(doc)
         else:
             print("---GRADE: DOCUMENT NOT RELEVANT---")
-    return {"documents": filtered_docs, "question": question}
+    return {
+        "documents": filtered_docs,
+        "question": question,
+        "tokens_used": usage.total_tokens,
+        "budget_exit": exhausted_budget(
+            # A fresh generation is not a retry, only a re-write loops back
+            {**state, "generation_grade": None},
+            "generate" if filtered_docs else "transform_query",
+            usage.total_tokens,
+        ),
+    }
+
+
+def grade_documents_concurrently(question, documents):
+    """
+    Grade each document with its own grader call, running the calls concurrently.
+
+    Args:
+        question (str): The question being asked
+        documents (list): The retrieved documents
+
+    Returns:
+        list: One relevance verdict per document, in document order
+    """
+    from src.llms.retrieval_grader import retrieval_grader
+
+    # Results come back in document order
+    scores = retrieval_grader.batch(
+        [{"question": question, "document": doc.page_content} for doc in documents],
+        config={"max_concurrency": GRADER_CONCURRENCY},
+    )
+    verdicts = []
+    for score in scores:
+        print(score)
+        verdicts.append(is_yes(score))
+    return verdicts
+
+
+def grade_documents_batched(question, documents):
+    """
+    Grade all documents with a single grader call.
+
+    Args:
+        question (str): The question being asked
+        documents (list): The retrieved documents
+
+    Returns:
+        list: One relevance verdict per document in document order, or None if
+            the grader response was malformed
+    """
+    from src.llms.retrieval_grader import batch_retrieval_grader, format_documents
+
+    try:
+        response = batch_retrieval_grader.invoke(
+            {
+                "question": question,
+                "documents": format_documents(
+                    [doc.page_content for doc in documents]
+                ),
+            }
+        )
+        print(response)
+        verdicts = {
+            int(verdict["index"]): is_yes(verdict)
+            for verdict in response["verdicts"]
+        }
+        if sorted(verdicts) != list(range(len(documents))):
+            raise ValueError(
+                f"expected {len(documents)} verdicts, got indexes {sorted(verdicts)}"
+            )
+        return [verdicts[index] for index in range(len(documents))]
+    except Exception as e:
+        print(f"---BATCHED GRADING FAILED ({e}), FALLING BACK TO PER DOCUMENT---")
+        return None
+
+
+def is_yes(score):
+    """
+    Check whether a grader response scored "yes".
+
+    Args:
+        score (dict): The parsed grader response
+
+    Returns:
+        bool: True if the score is "yes"
+    """
+    return score["score"] == "yes" or score["score"][0] == "yes"
 
 
 def transform_query(state):
     """
-    Transform the query to produce a better question.
+    Transform the query to produce a better question, or alternative queries.
 
     Args:
         state (dict): The current graph state
 
     Returns:
-        dict: Updated state with a re-phrased question
+        dict: Updated state with a re-phrased question, or with the
+            alternative queries to search in fan-out mode
     """
+    from src.llms.rewriter import question_rewriter
+
     print("---TRANSFORM QUERY---")
     question = state["question"]
     documents = state["documents"]
 
-    # Re-write question
-    better_question = question_rewriter.invoke({"question": question})
+    with get_usage_callback() as usage:
+        queries = None
+        if REWRITE_MODE == "fanout":
+            queries = fan_out_queries(question, state.get("queries") or [])
+        if not queries:
+            # Re-write question
+            better_question = question_rewriter.invoke({"question": question})
+    if queries:
+        # The documents are still graded against the user's question
+        return {
+            "documents": documents,
+            "queries": queries,
+            "rewrites": 1,
+            "tokens_used": usage.total_tokens,
+        }
     print(better_question)
 
-    return {"documents": documents, "question": better_question}
-
-
-### Edges ###
+    return {
+        "documents": documents,
+        "question": better_question,
+        "queries": [],
+        "rewrites": 1,
+        "tokens_used": usage.total_tokens,
+    }
 
 
-def decide_to_generate(state):
+def fan_out_queries(question, tried):
     """
-    Determine whether to generate an answer or re-generate a question.
+    Ask for FANOUT_QUERIES alternative search queries in a single call.
 
     Args:
-        state (dict): The current graph state
+        question (str): The question being asked
+        tried (list): Queries of the previous fan-out, to avoid repeating them
 
     Returns:
-        str: Decision for the next node to call
+        list: The new distinct queries, or None if the rewriter response was
+            malformed
     """
-    print("---ASSESS GRADED DOCUMENTS---")
-    filtered_documents = state["documents"]
-
-    if not filtered_documents:
-        # All documents have been filtered out
-        print(
-            "---DECISION: ALL DOCUMENTS ARE NOT RELEVANT TO QUESTION, TRANSFORM QUERY---"
+    from src.llms.rewriter import multi_query_rewriter
+
+    try:
+        response = multi_query_rewriter.invoke(
+            {
+                "question": question,
+                "count": FANOUT_QUERIES,
+                "tried": "; ".join(tried) or "none",
+            }
         )
-        return "transform_query"
-    else:
-        # Relevant documents are available, generate answer
-        print("---DECISION: GENERATE---")
-        return "generate"
+        print(response)
+        queries = []
+        seen = {question.strip().lower(), *(query.lower() for query in tried)}
+        for query in response["queries"]:
+            query = query.strip()
+            if query and query.lower() not in seen:
+                seen.add(query.lower())
+                queries.append(query)
+        if not queries:
+            raise ValueError("no new queries")
+        return queries[:FANOUT_QUERIES]
+    except Exception as e:
+        print(f"---FAN-OUT REWRITE FAILED ({e}), FALLING BACK TO A SINGLE REWRITE---")
+        return None
 
 
 def grade_generation_v_documents_and_question(state):
@@ -163,42 +373,209 @@ def grade_generation_v_documents_and_question(state):
         state (dict): The current graph state
 
     Returns:
-        str: Decision for the next node to call
+        dict: Updated state with the grade, feedback, best generation so far
+            and the budget that ran out, if any
     """
-    print("---CHECK HALLUCINATIONS---")
+    from langchain_core.runnables.config import (
+        ContextThreadPoolExecutor,
+        ensure_config,
+        merge_configs,
+    )
+
+    from src.llms.answer_grader import answer_grader
+    from src.llms.cancellation import CancellationHandler, LLMCallCancelled
+    from src.llms.context import build_context
+    from src.llms.hallucination_grader import hallucination_grader
+
+    print("---CHECK HALLUCINATIONS AND GRADE GENERATION vs QUESTION---")
     question = state["question"]
     documents = state["documents"]
     generation = state["generation"]
 
-    score = hallucination_grader.invoke(
-        {"documents": documents, "generation": generation}
+    # Both graders only need the generation, so they run concurrently. The
+    # answer grade is moot for an ungrounded generation, its call is then
+    # cancelled instead of waiting for it
+    cancel_answer_grader = threading.Event()
+    answer_grader_config = merge_configs(
+        ensure_config(), {"callbacks": [CancellationHandler(cancel_answer_grader)]}
     )
-    print(score)
-    state["feedback"] = score["explanation"]
+    with get_usage_callback() as usage, ContextThreadPoolExecutor(1) as executor:
+        answer_future = executor.submit(
+            answer_grader.invoke,
+            {"question": question, "generation": generation},
+            answer_grader_config,
+        )
+        try:
+            score = hallucination_grader.invoke(
+                {"documents": build_context(documents), "generation": generation}
+            )
+        except Exception:
+            cancel_answer_grader.set()
+            raise
+        print(score)
+        feedback = score["explanation"]
+        grounded = is_yes(score)
+        if grounded:
+            score = answer_future.result()
+        else:
+            # The grade is discarded, so is whatever error ends its call
+            cancel_answer_grader.set()
+    if not grounded and isinstance(answer_future.exception(), LLMCallCancelled):
+        print("---ANSWER GRADING CANCELLED---")
 
-    if score["score"] == "yes" or score["score"][0] == "yes":
+    if grounded:
         print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
-        print("---GRADE GENERATION vs QUESTION---")
-        score = answer_grader.invoke({"question": question, "generation": generation})
         print(score)
+        # The grader may leave out the lists it has nothing to put in
         if (
             score["score"] == "yes"
             or score["score"][0] == "yes"
-            and not score["weakness"]
+            and not score.get("weaknesses")
         ):
             print("---DECISION: GENERATION ADDRESSES QUESTION---")
-            return "useful"
+            grade = "useful"
         else:
             print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
-            feedback = state["feedback"]
-            if score["strengths"]:
+            if score.get("strengths"):
                 feedback += "\n STRENGTH:\n" + "\n-".join(score["strengths"])
-            if score["weaknesses"]:
+            if score.get("weaknesses"):
                 feedback += "\n WEAKNESS:\n" + "\n-".join(score["weaknesses"])
-            if score["suggestion"]:
+            if score.get("suggestion"):
                 feedback += "\n SUGGESTION:\n" + score["suggestion"]
-            state["feedback"] = feedback
-            return "not useful"
+            grade = "not useful"
     else:
         print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
-        return "not supported"
+        grade = "not supported"
+
+    update = {
+        "feedback": feedback,
+        "generation_grade": grade,
+        "unverified": grade != "useful",
+        "tokens_used": usage.total_tokens,
+        "budget_exit": None,
+    }
+    if grade != "useful":
+        update["budget_exit"] = exhausted_budget(
+            state,
+            "generate" if grade == "not supported" else "transform_query",
+            usage.total_tokens,
+        )
+    best_grade = state.get("best_generation_grade")
+    if best_grade is None or GRADE_RANKS[grade] > GRADE_RANKS[best_grade]:
+        update["best_generation"] = generation
+        update["best_generation_grade"] = grade
+    return update
+
+
+def return_best_answer(state):
+    """
+    Return the best graded answer so far once a query budget has run out.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        dict: Updated state with the best answer, flagged as unverified
+    """
+    reason = state["budget_exit"]
+    budget_exits[reason] += 1
+    print(f"---BUDGET EXHAUSTED ({reason}), RETURNING BEST ANSWER SO FAR---")
+
+    generation = state.get("best_generation") or state.get("generation")
+    if not generation:
+        generation = {
+            "answer": "I couldn't find relevant information in the documents "
+            "to answer this question within the query budget.",
+            "needs_followup": False,
+        }
+    return {"generation": generation, "unverified": True}
+
+
+### Edges ###
+
+
+def decide_entry(state):
+    """
+    Determine whether to retrieve documents or reuse graded ones.
+
+    Args:
+        state (dict): The initial graph state
+
+    Returns:
+        str: Decision for the first node to call
+    """
+    if state.get("documents"):
+        # Graded documents of a similar question, from the semantic cache
+        print("---DECISION: REUSE CACHED DOCUMENTS, GENERATE---")
+        return "cached documents"
+    return "retrieve"
+
+
+def decide_to_generate(state):
+    """
+    Determine whether to generate an answer or re-generate a question.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        str: Decision for the next node to call
+    """
+    print("---ASSESS GRADED DOCUMENTS---")
+    filtered_documents = state["documents"]
+
+    if state.get("budget_exit"):
+        return "budget exhausted"
+    if not filtered_documents:
+        # All documents have been filtered out
+        print(
+            "---DECISION: ALL DOCUMENTS ARE NOT RELEVANT TO QUESTION, TRANSFORM QUERY---"
+        )
+        return "transform_query"
+    else:
+        # Relevant documents are available, generate answer
+        print("---DECISION: GENERATE---")
+        return "generate"
+
+
+def decide_after_grading(state):
+    """
+    Determine whether to finish, re-generate or re-write the question after grading.
+
+    Args:
+        state (dict): The current graph state
+
+    Returns:
+        str: Decision for the next node to call
+    """
+    if state["generation_grade"] != "useful" and state.get("budget_exit"):
+        return "budget exhausted"
+    return state["generation_grade"]
+
+
+def exhausted_budget(state, step, tokens_used=0):
+    """
+    Check the query budgets before looping back to `step`.
+
+    Args:
+        state (dict): The current graph state
+        step (str): The node the graph would loop back to, "generate" or
+            "transform_query"
+        tokens_used (int): Tokens used by the current node, not yet in the state
+
+    Returns:
+        str: The name of the exhausted budget, or None if within budget
+    """
+    if state.get("deadline") and time.time() > state["deadline"]:
+        return "deadline"
+    if state.get("tokens_used", 0) + tokens_used >= QUERY_TOKEN_BUDGET:
+        return "tokens"
+    if step == "transform_query" and state.get("rewrites", 0) >= MAX_REWRITES:
+        return "rewrites"
+    if (
+        step == "generate"
+        and state.get("generation_grade") == "not supported"
+        and state.get("regenerations", 0) >= MAX_REGENERATIONS
+    ):
+        return "regenerations"
+    return None
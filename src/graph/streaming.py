@@ -0,0 +1,85 @@
+import time
+
+from langchain_core.utils.json import parse_partial_json
+
+from src.constants.constants import GENERATION_TAG
+
+
+def partial_answer(text):
+    """
+    Extract the "answer" field from a possibly incomplete JSON generation.
+
+    Args:
+        text (str): The raw JSON streamed by the generator so far
+
+    Returns:
+        str: The answer streamed so far, or None if it can't be parsed yet
+    """
+    try:
+        parsed = parse_partial_json(text)
+    except Exception:
+        return None
+    if isinstance(parsed, dict) and isinstance(parsed.get("answer"), str):
+        return parsed["answer"]
+    return None
+
+
+async def stream_answer(app, inputs, config=None):
+    """
+    Run the graph and print the generated answer token by token.
+
+    Grading keeps running after the answer has been streamed. If the graders
+    reject it and the graph generates again, a retraction notice is printed
+    before the new answer is streamed.
+
+    Args:
+        app: The compiled graph
+        inputs (dict): The graph inputs
+        config (dict): Optional runnable config
+
+    Returns:
+        dict: The final graph state
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    raw = ""
+    streamed = ""
+    final_state = None
+
+    async for event in app.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        is_generation = GENERATION_TAG in event.get("tags", [])
+
+        if kind == "on_chat_model_start" and is_generation:
+            if streamed:
+                print(
+                    "\n⚠️ The previous answer was rejected by the graders and is "
+                    "withdrawn, generating a new one...\n"
+                )
+            raw = ""
+            streamed = ""
+        elif kind == "on_chat_model_stream" and is_generation:
+            raw += event["data"]["chunk"].content
+            answer = partial_answer(raw)
+            if answer and len(answer) > len(streamed) and answer.startswith(streamed):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if not streamed:
+                    print("🎯 LLM: ", end="", flush=True)
+                print(answer[len(streamed) :], end="", flush=True)
+                streamed = answer
+        elif kind == "on_chat_model_end" and is_generation and streamed:
+            print("\n")
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            final_state = event["data"].get("output")
+
+    if first_token_at is not None:
+        print(f"⏱️ Time to first token: {first_token_at - start:.2f}s")
+    print(f"⏱️ Total time: {time.perf_counter() - start:.2f}s")
+
+    final_answer = (final_state or {}).get("generation", {}).get("answer")
+    if final_answer is not None and final_answer != streamed:
+        if streamed:
+            print("⚠️ The streamed answer was replaced, final answer:")
+        print("🎯 LLM:", final_answer)
+    return final_state
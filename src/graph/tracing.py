@@ -0,0 +1,275 @@
+"""
+Structured per-query traces of the graph: wall time, LLM calls, tokens and
+cache hits of every node run, broken down by the chain that made the calls.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.constants.constants import TRACE_PATH
+from src.llms.usage import extract_usage
+
+# LangGraph tags the run of every node with its superstep
+NODE_TAG_PREFIX = "graph:step:"
+
+_write_lock = threading.Lock()
+
+
+def new_usage() -> Dict[str, Any]:
+    return {
+        "llm_calls": 0,
+        "llm_seconds": 0.0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cache_hits": 0,
+    }
+
+
+def add_usage(totals: Dict[str, Any], usage: Dict[str, Any]) -> None:
+    for key in new_usage():
+        totals[key] += usage[key]
+
+
+class QueryTracer(BaseCallbackHandler):
+    """
+    Callback handler recording a trace of one graph run.
+
+    Pass it in the callbacks of the run config, then call `finish` with the
+    final state once the run is over.
+    """
+
+    def __init__(self, question: Optional[str] = None):
+        super().__init__()
+        self.query_id = uuid.uuid4().hex
+        self.question = question
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._names: Dict[UUID, str] = {}
+        self._nodes: Dict[UUID, Dict[str, Any]] = {}
+        self._llm_starts: Dict[UUID, float] = {}
+        self._iterations: Counter = Counter()
+        self.nodes = []
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        tags: Optional[list] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "")
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            self._names[run_id] = name
+            is_node = any(tag.startswith(NODE_TAG_PREFIX) for tag in tags or [])
+            if not is_node or name.startswith("__"):
+                return
+            self._iterations[name] += 1
+            span = {
+                "node": name,
+                "iteration": self._iterations[name],
+                "step": (metadata or {}).get("langgraph_step"),
+                "start": round(time.perf_counter() - self._start, 4),
+                "seconds": None,
+                **new_usage(),
+                "chains": {},
+            }
+            self._nodes[run_id] = span
+            self.nodes.append(span)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_node(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end_node(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.on_chat_model_start(
+            serialized, prompts, run_id=run_id, parent_run_id=parent_run_id
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens, completion_tokens, cache_hits = extract_usage(response)
+        self._record_llm_call(run_id, prompt_tokens, completion_tokens, cache_hits)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._record_llm_call(run_id, 0, 0, 0)
+
+    def finish(self, final_state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the trace of the run.
+
+        Args:
+            final_state (dict): The final graph state, if the run completed
+
+        Returns:
+            dict: The trace, with totals over all nodes and one entry per node run
+        """
+        final_state = final_state or {}
+        totals = new_usage()
+        with self._lock:
+            for span in self.nodes:
+                add_usage(totals, span)
+            nodes = [dict(span) for span in self.nodes]
+        return {
+            "query_id": self.query_id,
+            "question": self.question,
+            "started_at": self.started_at,
+            "seconds": round(time.perf_counter() - self._start, 4),
+            **totals,
+            "llm_seconds": round(totals["llm_seconds"], 4),
+            "rewrites": final_state.get("rewrites", 0),
+            "regenerations": final_state.get("regenerations", 0),
+            "unverified": bool(final_state.get("unverified")),
+            "budget_exit": (
+                final_state.get("budget_exit")
+                if final_state.get("unverified")
+                else None
+            ),
+            "nodes": nodes,
+        }
+
+    def _end_node(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            span = self._nodes.get(run_id)
+            if span is None:
+                return
+            span["seconds"] = round(
+                time.perf_counter() - self._start - span["start"], 4
+            )
+            if error is not None:
+                span["error"] = repr(error)
+
+    def _record_llm_call(
+        self, run_id: UUID, prompt_tokens: int, completion_tokens: int, cache_hits: int
+    ) -> None:
+        with self._lock:
+            started = self._llm_starts.pop(run_id, None)
+            seconds = time.perf_counter() - started if started is not None else 0.0
+            usage = {
+                "llm_calls": 1,
+                "llm_seconds": seconds,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cache_hits": cache_hits,
+            }
+
+            # The chain making the call is the parent of the LLM run, the node
+            # is the closest ancestor that is a node run
+            chain = self._names.get(self._parents.get(run_id), "llm")
+            span = None
+            ancestor = self._parents.get(run_id)
+            while ancestor is not None and span is None:
+                span = self._nodes.get(ancestor)
+                ancestor = self._parents.get(ancestor)
+            if span is None:
+                return
+
+            add_usage(span, usage)
+            span["llm_seconds"] = round(span["llm_seconds"], 4)
+            chain_usage = span["chains"].setdefault(chain, new_usage())
+            add_usage(chain_usage, usage)
+            chain_usage["llm_seconds"] = round(chain_usage["llm_seconds"], 4)
+
+
+def write_trace(trace: Dict[str, Any], path: str = TRACE_PATH) -> None:
+    """Append a trace to the JSONL trace file, an empty path disables it."""
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(trace, default=str)
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+def format_profile(trace: Dict[str, Any]) -> str:
+    """
+    Format a per-node breakdown of a trace, slowest node first, with the LLM
+    usage of each chain called by the node below it.
+    """
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for span in trace["nodes"]:
+        node = nodes.setdefault(
+            span["node"], {"runs": 0, "seconds": 0.0, **new_usage(), "chains": {}}
+        )
+        node["runs"] += 1
+        node["seconds"] += span["seconds"] or 0.0
+        add_usage(node, span)
+        for chain, usage in span["chains"].items():
+            chain_usage = node["chains"].setdefault(
+                chain, {"runs": 0, "seconds": 0.0, **new_usage()}
+            )
+            add_usage(chain_usage, usage)
+
+    total = trace["seconds"] or 1e-9
+    header = (
+        f"{'node':<34}{'runs':>5}{'seconds':>9}{'share':>7}{'llm calls':>10}"
+        f"{'llm s':>8}{'prompt tok':>11}{'compl tok':>10}{'cache hits':>11}"
+    )
+    lines = [header, "-" * len(header)]
+
+    def row(name, stats, runs="", seconds=None):
+        share = f"{seconds / total:.0%}" if seconds is not None else ""
+        seconds = f"{seconds:.2f}" if seconds is not None else ""
+        return (
+            f"{name:<34}{runs:>5}{seconds:>9}{share:>7}{stats['llm_calls']:>10}"
+            f"{stats['llm_seconds']:>8.2f}{stats['prompt_tokens']:>11}"
+            f"{stats['completion_tokens']:>10}{stats['cache_hits']:>11}"
+        )
+
+    for name, node in sorted(
+        nodes.items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
+        lines.append(row(name, node, node["runs"], node["seconds"]))
+        for chain, usage in sorted(
+            node["chains"].items(),
+            key=lambda item: item[1]["llm_seconds"],
+            reverse=True,
+        ):
+            lines.append(row(f"  └ {chain}", usage))
+    lines.append("-" * len(header))
+    lines.append(row("total", trace, seconds=trace["seconds"]))
+    return "\n".join(lines)
@@ -0,0 +1,191 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema.document import Document
+
+# Keep identifiers such as ticket keys (ABC-123), snake_case names and versions
+# (v1.2) as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Local inverted index scoring chunks with Okapi BM25.
+
+    Chunk text and metadata are persisted in SQLite next to the vector store,
+    the inverted index itself is built in memory on the first search and kept
+    up to date by `add` and `delete`. Postings are grouped by doc, so a search
+    restricted to some docs only scores their chunks.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                doc_id TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )""")
+        self._conn.commit()
+
+        # Built lazily by _load: term -> doc ID -> chunk ID -> term frequency
+        self._postings: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None
+        # Number of chunks containing each term
+        self._chunk_counts: Counter = Counter()
+        self._docs: Dict[str, str] = {}
+        self._lengths: Dict[str, int] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def add(self, chunks: Iterable[Document]) -> None:
+        """Insert or replace chunks, keyed by their `id` metadata."""
+        rows = [
+            (
+                chunk.metadata["id"],
+                chunk.metadata.get("doc_id"),
+                chunk.page_content,
+                json.dumps(chunk.metadata),
+            )
+            for chunk in chunks
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, doc_id, text, metadata) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            if self._postings is not None:
+                for chunk_id, doc_id, text, _ in rows:
+                    self._unindex(chunk_id)
+                    self._index(chunk_id, doc_id, text)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids]
+            )
+            self._conn.commit()
+            if self._postings is not None:
+                for chunk_id in ids:
+                    self._unindex(chunk_id)
+
+    def search(
+        self, query: str, k: int, doc_ids: Optional[Iterable[str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top `k` chunks for a query, only among the chunks of `doc_ids` if given.
+
+        Term statistics are those of the whole index, so a chunk scores the
+        same whether or not the search is restricted.
+        """
+        doc_ids = None if doc_ids is None else list(doc_ids)
+        with self._lock:
+            self._load()
+            count = len(self._lengths)
+            if not count:
+                return []
+            average_length = self._total_length / count
+
+            scores: Counter = Counter()
+            for term in set(tokenize(query)):
+                by_doc = self._postings.get(term)
+                if not by_doc:
+                    continue
+                chunks = self._chunk_counts[term]
+                idf = math.log((count - chunks + 0.5) / (chunks + 0.5) + 1)
+                if doc_ids is None:
+                    postings = list(by_doc.values())
+                else:
+                    postings = [
+                        by_doc[doc_id] for doc_id in doc_ids if doc_id in by_doc
+                    ]
+                for doc_postings in postings:
+                    for chunk_id, frequency in doc_postings.items():
+                        length_norm = (
+                            1
+                            - self.b
+                            + self.b * self._lengths[chunk_id] / average_length
+                        )
+                        scores[chunk_id] += idf * (
+                            frequency
+                            * (self.k1 + 1)
+                            / (frequency + self.k1 * length_norm)
+                        )
+
+            top = scores.most_common(k)
+            results = []
+            for chunk_id, score in top:
+                text, metadata = self._conn.execute(
+                    "SELECT text, metadata FROM chunks WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                results.append(
+                    (Document(page_content=text, metadata=json.loads(metadata)), score)
+                )
+            return results
+
+    def _load(self) -> None:
+        if self._postings is not None:
+            return
+        self._postings = {}
+        self._chunk_counts = Counter()
+        self._docs = {}
+        self._lengths = {}
+        self._terms = {}
+        self._total_length = 0
+        for chunk_id, doc_id, text in self._conn.execute(
+            "SELECT id, doc_id, text FROM chunks"
+        ):
+            self._index(chunk_id, doc_id, text)
+
+    def _index(self, chunk_id: str, doc_id: Optional[str], text: str) -> None:
+        terms = Counter(tokenize(text))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {}).setdefault(doc_id, {})[
+                chunk_id
+            ] = frequency
+            self._chunk_counts[term] += 1
+        length = sum(terms.values())
+        self._docs[chunk_id] = doc_id
+        self._lengths[chunk_id] = length
+        self._terms[chunk_id] = list(terms)
+        self._total_length += length
+
+    def _unindex(self, chunk_id: str) -> None:
+        length = self._lengths.pop(chunk_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        doc_id = self._docs.pop(chunk_id)
+        for term in self._terms.pop(chunk_id):
+            by_doc = self._postings[term]
+            del by_doc[doc_id][chunk_id]
+            if not by_doc[doc_id]:
+                del by_doc[doc_id]
+            if not by_doc:
+                del self._postings[term]
+            self._chunk_counts[term] -= 1
+            if not self._chunk_counts[term]:
+                del self._chunk_counts[term]
@@ -1,109 +1,173 @@
-import os
 import re
 
-import requests
+from .clickup_client import get_clickup_client
 
-CLICKUP_TOKEN = os.environ.get("CLICKUP_TOKEN")
+PARENTHESES = re.compile(r"[()]")
+SQUARE_BRACKETS = re.compile(r"\[[^\]\n]*(\])?")
+TABLE_SEPARATOR = re.compile(r"^\|[-:| ]+\|\n", re.MULTILINE)
+TABLE_ROWS = re.compile(r"(?:\|[^\n]+\|\n)+")
+HORIZONTAL_RULE = re.compile(r"---[,]{0,1}")
 
 
 def clean_markdown(text: str) -> str:
-    # print("original:::", text)
-    # Pattern for the complex nested structure
-    pattern = r"\([^()]*(\([^()]*\)[^()]*)*\)"
+    """
+    Strip link targets, brackets and table markup from ClickUp markdown.
 
-    # Keep replacing the innermost parentheses until no more remain
-    while re.search(pattern, text):
-        text = re.sub(pattern, "", text)
+    Every step is a single linear scan, so cleaning time grows linearly with
+    the page size.
+    """
+    # Remove every balanced parenthesized group, including nested ones
+    text = remove_parenthesized(text)
 
     # Remove any remaining square brackets
-    text = re.sub(r"\[.*?\]", "", text)
+    text = remove_square_brackets(text)
 
     # Remove any remaining parentheses
-    text = re.sub(r"[\(\)]", "", text)
+    text = text.replace("(", "").replace(")", "")
 
     # Convert Markdown tables to CSV-like format
-    def table_to_csv(match):
-        # Extract table rows
-        rows = match.group().strip().split("\n")
+    text = tables_to_csv(text)
+    # Remove any occurrences of "---" followed by an optional comma
+    text = HORIZONTAL_RULE.sub("", text)
+    # Replace escaped underscores with regular underscores
+    text = text.replace("\\_", "_")
+
+    return text.strip()
+
+
+def remove_parenthesized(text: str) -> str:
+    # Match parentheses with a stack, keeping only the outermost removed spans
+    open_positions = []
+    removed_spans = []
+    for match in PARENTHESES.finditer(text):
+        position = match.start()
+        if text[position] == "(":
+            open_positions.append(position)
+        elif open_positions:
+            start = open_positions.pop()
+            while removed_spans and removed_spans[-1][0] > start:
+                removed_spans.pop()
+            removed_spans.append((start, position + 1))
+
+    if not removed_spans:
+        return text
+    pieces = []
+    last_end = 0
+    for start, end in removed_spans:
+        pieces.append(text[last_end:start])
+        last_end = end
+    pieces.append(text[last_end:])
+    return "".join(pieces)
+
+
+def remove_square_brackets(text: str) -> str:
+    # Drop "[...]" up to the nearest closing bracket on the same line. An
+    # unterminated bracket is kept together with the rest of its line, so no
+    # position is scanned twice.
+    return SQUARE_BRACKETS.sub(
+        lambda match: "" if match.group(1) else match.group(0), text
+    )
+
+
+def tables_to_csv(text: str) -> str:
+    # A table is a header line ending in "|", a separator line and at least one
+    # row, every line terminated by a newline. The header starts at its first
+    # "|" and the newline after the last row is dropped along with the table.
+    if "|" not in text:
+        return text
+
+    def table_to_csv(table):
         csv_lines = []
-        for row in rows:
+        for row in table.strip().split("\n"):
             # Split each row by "|" and strip whitespace
             csv_line = ", ".join(cell.strip() for cell in row.split("|")[1:-1])
             csv_lines.append(csv_line)
         return "\n".join(csv_lines)
 
-    # Find Markdown tables and convert to CSV-like format
-    text = re.sub(r"(\|.+?\|\n\|[-:| ]+\|\n(\|.+?\|\n)+)", table_to_csv, text)
-    # Remove any occurrences of "---" followed by an optional comma
-    text = re.sub(r"---[,]{0,1}", "", text)
-    # Replace escaped underscores with regular underscores
-    text = text.replace("\\_", "_")
-
-    # print("transformed:::", text)
-    return text.strip()
+    pieces = []
+    last_end = 0
+    for separator in TABLE_SEPARATOR.finditer(text):
+        header_end = separator.start() - 1
+        if header_end < 0:
+            continue
+        header_line_start = text.rfind("\n", 0, header_end) + 1
+        if header_line_start < last_end:
+            # The header line already belongs to the previous table
+            continue
+        header_start = text.find("|", header_line_start, header_end)
+        if (
+            header_start == -1
+            or header_end - header_start < 3
+            or text[header_end - 1] != "|"
+        ):
+            continue
+        rows = TABLE_ROWS.match(text, separator.end())
+        if not rows:
+            continue
+        pieces.append(text[last_end:header_start])
+        pieces.append(table_to_csv(text[header_start : rows.end()]))
+        last_end = rows.end()
+    pieces.append(text[last_end:])
+    return "".join(pieces)
 
 
 def parse_response(response):
-    if not isinstance(response, (list, dict)):
-        raise ValueError("The response is not a list or dict.")
+    return list(iter_pages(response))
 
-    parsed_data = []
 
-    def extract_info(item):
-        cleaned_content = clean_markdown(item.get("content"))
+def iter_pages(response):
+    """Yield the pages of a ClickUp response one by one, cleaning each lazily."""
+    if not isinstance(response, (list, dict)):
+        raise ValueError("The response is not a list or dict.")
 
-        data = {
+    # Depth-first in document order without recursion, so deeply nested pages
+    # don't hit the recursion limit
+    stack = list(reversed(response)) if isinstance(response, list) else [response]
+    while stack:
+        item = stack.pop()
+        yield {
             "id": item.get("id"),
             "doc_id": item.get("doc_id"),
             "workspace_id": item.get("workspace_id"),
             "name": item.get("name"),
-            "content": cleaned_content,
+            "content": clean_markdown(item.get("content")),
         }
 
-        parsed_data.append(data)
-
-        # Recursively extract pages if they exist
+        # Nested pages follow their parent
         if "pages" in item and isinstance(item["pages"], list):
-            for page in item["pages"]:
-                extract_info(page)
-
-        return data
+            stack.extend(reversed(item["pages"]))
 
-    if isinstance(response, list):
-        for item in response:
-            extract_info(item)
-    elif isinstance(response, dict):
-        extract_info(response)
 
-    return parsed_data
+def fetch_doc_pages(workspace_id, doc_id, page_id=""):
+    """Fetch every page of a doc, or a single page when `page_id` is given."""
+    client = get_clickup_client()
+    if page_id:
+        return client.get_doc_page(workspace_id, doc_id, page_id)
+    return client.get_doc_pages(workspace_id, doc_id)
 
 
 def get_clickup_docs(workspace_id, doc_id, page_id=""):
-    url = (
-        f"https://api.clickup.com/api/v3/workspaces/{workspace_id}/docs/{doc_id}/pages"
-    )
-
-    # if page_id:
-    #     url += "/" + page_id
-
-    headers = {"Authorization": CLICKUP_TOKEN}
-
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        data = response.json()
+        data = fetch_doc_pages(workspace_id, doc_id, page_id)
         documents = parse_response(data)
         print(f"📝 Got Documents from {len(documents)} ClickUp")
-
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err}")
-        documents = []
-    except requests.exceptions.RequestException as req_err:
-        print(f"Error during request: {req_err}")
-        documents = []
     except ValueError as val_err:
         print(f"Error processing response: {val_err}")
         documents = []
 
     return documents
+
+
+def iter_clickup_docs(workspace_id, doc_id, page_id=""):
+    """Like `get_clickup_docs`, but yield the pages as they are cleaned."""
+    data = fetch_doc_pages(workspace_id, doc_id, page_id)
+    try:
+        yield from iter_pages(data)
+    except ValueError as val_err:
+        print(f"Error processing response: {val_err}")
+
+
+def get_many_clickup_docs(workspace_id, doc_ids):
+    """Fetch the pages of several docs concurrently over the shared session."""
+    payloads = get_clickup_client().get_docs_pages(workspace_id, doc_ids)
+    return {doc_id: parse_response(data) for doc_id, data in payloads.items()}
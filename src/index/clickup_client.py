@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.constants.constants import (
+    CLICKUP_API_URL,
+    CLICKUP_CACHE_DIR,
+    CLICKUP_MAX_RETRIES,
+    CLICKUP_MAX_WORKERS,
+    CLICKUP_TIMEOUT,
+)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ClickUpAPIError(Exception):
+    """Raised when a ClickUp API request fails after all retries."""
+
+
+class ClickUpClient:
+    """
+    Pooled, retrying ClickUp API client with an on-disk conditional-request cache.
+
+    A single session with a connection pool is shared by every request. Failed
+    requests are retried with exponential backoff, waiting for the rate limit
+    window to reset on 429 responses. Payloads are cached on disk together with
+    their ETag/Last-Modified headers, so unchanged resources come back as a 304
+    and are never downloaded twice.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        base_url: str = CLICKUP_API_URL,
+        cache_dir: Optional[str] = CLICKUP_CACHE_DIR,
+        max_workers: int = CLICKUP_MAX_WORKERS,
+        max_retries: int = CLICKUP_MAX_RETRIES,
+        timeout: float = CLICKUP_TIMEOUT,
+        backoff_base: float = 0.5,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if token:
+            self.session.headers["Authorization"] = token
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        cached = self._read_cache(url, params)
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self._request(url, params, headers)
+        if response.status_code == 304 and cached:
+            return cached["payload"]
+
+        payload = response.json()
+        if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+            self._write_cache(
+                url,
+                params,
+                {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "payload": payload,
+                },
+            )
+        return payload
+
+    def get_many(self, paths: List[str]) -> List[Any]:
+        """Fetch several resources concurrently, returning payloads in input order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.get_json, paths))
+
+    def paginate(
+        self, path: str, key: str, params: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Any]:
+        """Yield every item under `key` of a cursor-paginated endpoint."""
+        for items, _ in self.paginate_pages(path, key, params):
+            yield from items
+
+    def paginate_pages(
+        self,
+        path: str,
+        key: str,
+        params: Optional[Dict[str, Any]] = None,
+        cursor: Optional[str] = None,
+    ) -> Iterator[Tuple[List[Any], Optional[str]]]:
+        """
+        Yield (items, next cursor) for each page of a cursor-paginated endpoint,
+        starting at `cursor`, so callers can resume from the last cursor seen.
+        """
+        params = dict(params or {})
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            payload = self.get_json(path, params)
+            cursor = payload.get("next_cursor") or None
+            yield payload.get(key, []), cursor
+            if not cursor:
+                return
+
+    def list_docs(
+        self,
+        workspace_id: str,
+        parent_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Yield the docs of a workspace, or of one space, a page at a time."""
+        params: Dict[str, Any] = {"limit": 100}
+        if parent_id:
+            params.update({"parent_id": parent_id, "parent_type": "SPACE"})
+        return self.paginate_pages(
+            f"workspaces/{workspace_id}/docs", "docs", params, cursor
+        )
+
+    def get_doc_pages(self, workspace_id: str, doc_id: str) -> Any:
+        return self.get_json(f"workspaces/{workspace_id}/docs/{doc_id}/pages")
+
+    def get_doc_page(self, workspace_id: str, doc_id: str, page_id: str) -> Any:
+        return self.get_json(f"workspaces/{workspace_id}/docs/{doc_id}/pages/{page_id}")
+
+    def get_docs_pages(self, workspace_id: str, doc_ids: List[str]) -> Dict[str, Any]:
+        payloads = self.get_many(
+            [f"workspaces/{workspace_id}/docs/{doc_id}/pages" for doc_id in doc_ids]
+        )
+        return dict(zip(doc_ids, payloads))
+
+    def _request(
+        self, url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str]
+    ) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == self.max_retries:
+                    raise ClickUpAPIError(f"Request to {url} failed: {err}") from err
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                if attempt == self.max_retries:
+                    break
+                time.sleep(self._retry_delay(response, attempt))
+                continue
+            if response.status_code >= 400:
+                raise ClickUpAPIError(
+                    f"ClickUp returned {response.status_code} for {url}: {response.text}"
+                )
+            return response
+
+        raise ClickUpAPIError(
+            f"ClickUp returned {response.status_code} for {url} "
+            f"after {self.max_retries} retries"
+        )
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset:
+                try:
+                    return max(float(reset) - time.time(), 0.0)
+                except ValueError:
+                    pass
+        return self._backoff(attempt)
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2**attempt) + random.uniform(0, self.backoff_base)
+
+    def _cache_path(self, url: str, params: Optional[Dict[str, Any]]) -> str:
+        key = json.dumps([url, params or {}], sort_keys=True)
+        return os.path.join(
+            self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def _read_cache(self, url: str, params: Optional[Dict[str, Any]]) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url, params), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(
+        self, url: str, params: Optional[Dict[str, Any]], entry: dict
+    ) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(url, params)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_clickup_client() -> ClickUpClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ClickUpClient(os.environ.get("CLICKUP_TOKEN"))
+        return _client
@@ -0,0 +1,233 @@
+"""
+Crawl every doc of a ClickUp workspace, or of some of its spaces, with a
+checkpoint file so an interrupted crawl resumes where it stopped.
+"""
+
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.constants.constants import CRAWL_CHECKPOINT_DIR, CRAWL_WORKERS
+
+from .clickup_client import get_clickup_client
+from .indexer import ingest_pages, iter_document_pages
+
+DONE = "done"
+FAILED = "failed"
+PENDING = "pending"
+
+
+class CrawlCheckpoint:
+    """
+    Progress of a workspace crawl, persisted as JSON after every change.
+
+    Records the listing cursor of each space and the status of every doc found
+    so far, with its `date_updated`, so a resumed crawl continues the listing
+    from the last cursor and only ingests docs that are not done yet or that
+    changed since they were ingested.
+    """
+
+    def __init__(self, path: str, workspace_id: str, space_ids: List[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        data = self._load()
+        if data.get("workspace_id") != workspace_id or data.get("space_ids") != sorted(
+            space_ids
+        ):
+            data = {}
+        self.data = {
+            "workspace_id": workspace_id,
+            "space_ids": sorted(space_ids),
+            "listing": data.get("listing", {}),
+            "docs": data.get("docs", {}),
+            "finished_at": data.get("finished_at"),
+        }
+        if self.data["finished_at"]:
+            # The previous crawl completed, list again to find new and
+            # updated docs but keep the statuses of unchanged ones
+            self.data["listing"] = {}
+            self.data["finished_at"] = None
+
+    def listing(self, parent: str) -> Dict[str, Any]:
+        return self.data["listing"].setdefault(
+            parent, {"cursor": None, "complete": False}
+        )
+
+    def add_docs(
+        self, parent: str, docs: List[Dict[str, Any]], next_cursor: Optional[str]
+    ) -> None:
+        with self._lock:
+            for doc in docs:
+                entry = self.data["docs"].get(doc["id"])
+                date_updated = doc.get("date_updated")
+                if (
+                    entry is None
+                    or entry["status"] != DONE
+                    or entry.get("date_updated") != date_updated
+                ):
+                    self.data["docs"][doc["id"]] = {
+                        "name": doc.get("name"),
+                        "date_updated": date_updated,
+                        "status": PENDING,
+                    }
+            listing = self.listing(parent)
+            listing["cursor"] = next_cursor
+            listing["complete"] = next_cursor is None
+            self._save()
+
+    def update_doc(self, doc_id: str, **fields: Any) -> None:
+        with self._lock:
+            self.data["docs"][doc_id].update(fields)
+            self._save()
+
+    def pending(self) -> List[str]:
+        return [
+            doc_id
+            for doc_id, entry in self.data["docs"].items()
+            if entry["status"] != DONE
+        ]
+
+    def finish(self) -> None:
+        with self._lock:
+            self.data["finished_at"] = datetime.now().isoformat()
+            self._save()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        # Write then rename, so an interruption never leaves a truncated file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(temporary_path, self.path)
+
+
+def checkpoint_path(workspace_id: str) -> str:
+    return os.path.join(CRAWL_CHECKPOINT_DIR, f"{workspace_id}.json")
+
+
+def list_workspace_docs(checkpoint: CrawlCheckpoint, space_ids: List[str]) -> None:
+    """List the docs of the workspace or spaces, resuming from saved cursors."""
+    client = get_clickup_client()
+    workspace_id = checkpoint.data["workspace_id"]
+    for parent in space_ids or [None]:
+        key = parent or "workspace"
+        listing = checkpoint.listing(key)
+        if listing["complete"]:
+            continue
+        for docs, next_cursor in client.list_docs(
+            workspace_id, parent, listing["cursor"]
+        ):
+            checkpoint.add_docs(key, docs, next_cursor)
+            print(f"🔎 Listed {len(checkpoint.data['docs'])} docs")
+
+
+def ingest_doc(checkpoint: CrawlCheckpoint, doc_id: str) -> Dict[str, int]:
+    workspace_id = checkpoint.data["workspace_id"]
+    start = time.perf_counter()
+    try:
+        stats = ingest_pages(
+            iter_document_pages(workspace_id, doc_id, None), workspace_id
+        )
+    except Exception as e:
+        traceback.print_exc()
+        checkpoint.update_doc(doc_id, status=FAILED, error=str(e))
+        raise
+    checkpoint.update_doc(
+        doc_id,
+        status=DONE,
+        pages=stats["pages"],
+        chunks=stats["chunks"],
+        seconds=round(time.perf_counter() - start, 2),
+        ingested_at=datetime.now().isoformat(),
+        error=None,
+    )
+    return stats
+
+
+def crawl_workspace(
+    workspace_id: str,
+    space_ids: Optional[List[str]] = None,
+    workers: int = CRAWL_WORKERS,
+    restart: bool = False,
+) -> Dict[str, int]:
+    """
+    Ingest every doc of a workspace, or of the given spaces, `workers` at a time.
+
+    Args:
+        workspace_id (str): The ClickUp workspace ID
+        space_ids (list): Only crawl the docs of these spaces
+        workers (int): Docs ingested concurrently
+        restart (bool): Ignore the checkpoint of a previous crawl
+
+    Returns:
+        dict: Number of docs ingested, failed and skipped, pages and chunks
+    """
+    space_ids = space_ids or []
+    path = checkpoint_path(workspace_id)
+    if restart and os.path.exists(path):
+        os.remove(path)
+    checkpoint = CrawlCheckpoint(path, workspace_id, space_ids)
+
+    start = time.perf_counter()
+    list_workspace_docs(checkpoint, space_ids)
+    pending = checkpoint.pending()
+    totals = {
+        "docs": len(checkpoint.data["docs"]),
+        "ingested": 0,
+        "failed": 0,
+        "skipped": len(checkpoint.data["docs"]) - len(pending),
+        "pages": 0,
+        "chunks": 0,
+    }
+    print(
+        f"🕷️ Crawling {len(pending)} docs of workspace {workspace_id}, "
+        f"{totals['skipped']} already ingested"
+    )
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(ingest_doc, checkpoint, doc_id): doc_id
+            for doc_id in pending
+        }
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"❌ Failed to ingest doc {futures[future]}: {e}")
+                continue
+            totals["ingested"] += 1
+            totals["pages"] += stats["pages"]
+            totals["chunks"] += stats["chunks"]
+            print(
+                f"📚 {totals['ingested'] + totals['failed']}/{len(pending)} docs, "
+                f"{totals['pages']} pages, {totals['chunks']} chunks"
+            )
+    finally:
+        # On Ctrl-C, docs not started stay pending in the checkpoint
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if not totals["failed"]:
+        checkpoint.finish()
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Crawl of workspace {workspace_id} done in {elapsed:.1f}s: "
+        f"{totals['ingested']} docs ingested, {totals['failed']} failed, "
+        f"{totals['skipped']} unchanged, {totals['pages'] / elapsed:.1f} pages/s"
+    )
+    return totals
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by a persistent, size-bounded SQLite cache.
+
+    Vectors are keyed by (model, kind, sha256 of text) so an unchanged chunk or a
+    repeated query is never embedded twice. Only cache misses are sent to the
+    wrapped embeddings, in a single batch, and the least recently used entries
+    are evicted once the cache holds more than `max_entries` vectors.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        path: str,
+        max_entries: int,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, kind, text_hash)
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "query")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        cached = self._lookup(kind, set(hashes))
+
+        # Embed each distinct missing text once, in a single batch
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            if kind == "query":
+                vectors = embed_queries(self.embeddings, list(missing.values()))
+            else:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            # Round-trip through float32 so hits and misses return identical vectors
+            computed = {
+                text_hash: _from_blob(_to_blob(vector))
+                for text_hash, vector in zip(missing, vectors)
+            }
+            self._store(kind, computed)
+            cached.update(computed)
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return [cached[text_hash] for text_hash in hashes]
+
+    def _lookup(self, kind: str, hashes: set) -> Dict[str, List[float]]:
+        found = {}
+        if not hashes:
+            return found
+        hash_list = list(hashes)
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(hash_list), 500):
+                batch = hash_list[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND kind = ? AND text_hash IN ({placeholders})",
+                    (self.model, kind, *batch),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = _from_blob(blob)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE model = ? AND kind = ? AND text_hash = ?",
+                    [(now, self.model, kind, text_hash) for text_hash in found],
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, kind: str, vectors: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(model, kind, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.model, kind, text_hash, _to_blob(vector), now)
+                    for text_hash, vector in vectors.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = entries - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """Embed several queries at once if the embeddings support it."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def _to_blob(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
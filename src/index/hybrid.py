@@ -0,0 +1,237 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.schema.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from .bm25 import BM25Index
+from .embedding_cache import embed_queries
+from .store import relevance_score
+
+# Searches run at once for the alternative queries of a fan-out rewrite, or
+# for a query spanning several workspaces
+MAX_CONCURRENT_SEARCHES = 8
+
+
+def doc_filter(doc_ids: Optional[Sequence[str]]) -> Optional[Dict[str, Any]]:
+    """Metadata filter restricting a vector search to some docs, if any."""
+    if not doc_ids:
+        return None
+    if len(doc_ids) == 1:
+        return {"doc_id": doc_ids[0]}
+    return {"doc_id": {"$in": list(doc_ids)}}
+
+
+def scored_similarity_search(
+    vectorstore: VectorStore,
+    query: str,
+    k: int,
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[Document]:
+    """Dense search keeping each chunk's relevance score in its metadata."""
+    documents = []
+    # Converted here rather than by similarity_search_with_relevance_scores,
+    # which warns on every query when scores fall outside [0, 1], as Chroma's
+    # default L2 scores do for unnormalized Ollama embeddings
+    for document, score in vectorstore.similarity_search_with_score(
+        query, k=k, filter=doc_filter(doc_ids)
+    ):
+        document.metadata["relevance_score"] = relevance_score(score)
+        documents.append(document)
+    return documents
+
+
+def scored_similarity_search_by_vector(
+    vectorstore: VectorStore,
+    embedding: List[float],
+    k: int,
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[Document]:
+    """Dense search by an embedded query, scored as by scored_similarity_search."""
+    documents = []
+    # Despite its name, Chroma returns distances here
+    for (
+        document,
+        score,
+    ) in vectorstore.similarity_search_by_vector_with_relevance_scores(
+        embedding, k=k, filter=doc_filter(doc_ids)
+    ):
+        document.metadata["relevance_score"] = relevance_score(score)
+        documents.append(document)
+    return documents
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]], k: int, rrf_k: int = 60
+) -> List[Document]:
+    """Merge ranked lists, scoring each chunk by the sum of 1 / (rrf_k + rank)."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document.metadata.get("id", document.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:k]]
+
+
+class VectorRetriever(BaseRetriever):
+    """
+    Dense vector search, with relevance scores in the chunks' metadata.
+
+    Pass `doc_ids` to `invoke` or `search_by_vector` to only search those docs.
+    """
+
+    vectorstore: VectorStore
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        return scored_similarity_search(self.vectorstore, query, self.k, doc_ids)
+
+    def search_by_vector(
+        self,
+        query: str,
+        embedding: List[float],
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        return scored_similarity_search_by_vector(
+            self.vectorstore, embedding, self.k, doc_ids
+        )
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense vector search fused with BM25 keyword search.
+
+    Chunks found by the dense search keep their relevance score in their
+    metadata, chunks only found by keyword search have none. Pass `doc_ids` to
+    `invoke` or `search_by_vector` to only search those docs.
+    """
+
+    vectorstore: VectorStore
+    bm25_index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        dense = scored_similarity_search(self.vectorstore, query, self.fetch_k, doc_ids)
+        return self._fuse(query, dense, doc_ids)
+
+    def search_by_vector(
+        self,
+        query: str,
+        embedding: List[float],
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        dense = scored_similarity_search_by_vector(
+            self.vectorstore, embedding, self.fetch_k, doc_ids
+        )
+        return self._fuse(query, dense, doc_ids)
+
+    def _fuse(
+        self,
+        query: str,
+        dense: List[Document],
+        doc_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        sparse = [
+            document
+            for document, _ in self.bm25_index.search(
+                query, self.fetch_k, doc_ids or None
+            )
+        ]
+        return reciprocal_rank_fusion([dense, sparse], k=self.k, rrf_k=self.rrf_k)
+
+
+def multi_query_search(
+    retriever: BaseRetriever,
+    queries: List[str],
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[Document]:
+    """
+    Search several queries at once and merge their results.
+
+    The queries are embedded in one batch and searched concurrently. Each
+    query's top chunks are kept, deduplicated by chunk ID and ranked by
+    reciprocal rank fusion; a chunk found by several queries keeps its best
+    relevance score.
+    """
+    if not queries:
+        return []
+    return search_workspaces([retriever], queries[0], queries, doc_ids)
+
+
+def search_workspaces(
+    retrievers: List[BaseRetriever],
+    question: str,
+    queries: Optional[List[str]] = None,
+    doc_ids: Optional[Sequence[str]] = None,
+) -> List[Document]:
+    """
+    Search the retrievers of one or more workspaces and merge their results.
+
+    Each workspace is searched for the question, or for every alternative
+    query after a fan-out rewrite, only among `doc_ids` if given. Beyond a
+    single search, each query is embedded once and every (workspace, query)
+    pair searched concurrently; their results are deduplicated by chunk ID and
+    ranked by reciprocal rank fusion, keeping as many chunks as one workspace's
+    searches return and each chunk's best relevance score.
+    """
+    if not retrievers:
+        return []
+    if len(retrievers) == 1 and not queries:
+        return retrievers[0].invoke(question, doc_ids=doc_ids or None)
+
+    queries = queries or [question]
+    # The retrievers of every workspace share the same embeddings
+    vectors = embed_queries(retrievers[0].vectorstore.embeddings, queries)
+    searches = [
+        (retriever, query, vector)
+        for retriever in retrievers
+        for query, vector in zip(queries, vectors)
+    ]
+    with ThreadPoolExecutor(min(len(searches), MAX_CONCURRENT_SEARCHES)) as executor:
+        rankings = list(
+            executor.map(
+                lambda search: search[0].search_by_vector(
+                    search[1], search[2], doc_ids or None
+                ),
+                searches,
+            )
+        )
+
+    best_scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for document in ranking:
+            score = document.metadata.get("relevance_score")
+            key = document.metadata.get("id", document.page_content)
+            if score is not None and score > best_scores.get(key, float("-inf")):
+                best_scores[key] = score
+    merged = reciprocal_rank_fusion(rankings, k=len(queries) * max(map(len, rankings)))
+    for document in merged:
+        key = document.metadata.get("id", document.page_content)
+        if key in best_scores:
+            document.metadata["relevance_score"] = best_scores[key]
+    return merged
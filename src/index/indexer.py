@@ -1,39 +1,36 @@
+import hashlib
+import time
 import traceback
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 
-from langchain.schema.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_community.embeddings.ollama import OllamaEmbeddings
+from langchain_core.documents import Document
 
-from .clickup import get_clickup_docs
+from src.constants.constants import INGEST_BATCH_SIZE, INGEST_QUEUE_SIZE
+from src.llms.scheduler import ollama_priority
+
+from .clickup import iter_clickup_docs
+from .pipeline import batched, threaded
+from .store import get_bm25_index, get_vector_store, upsert_embeddings
 
-CHROMA_PATH = "chroma"
 CHUNK_SIZE = 1024
 CHUNK_OVERLAP = 100
 
 
-def get_chroma_db():
-    return Chroma(
-        persist_directory=CHROMA_PATH,
-        embedding_function=OllamaEmbeddings(model="llama3.1"),
-    )
-
-
-db = get_chroma_db()
-retriever = db.as_retriever()
-
-
 def ingest_document(click_up_url: str) -> None:
     start_time = datetime.now()
     try:
         workspace_id, doc_ids = parse_clickup_url(click_up_url)
-        chunks = load_document(
+        pages = iter_document_pages(
             workspace_id, doc_ids["doc_id"], doc_ids.get("sub_doc_id")
         )
-        if chunks:
-            add_to_chroma(chunks)
+        # A page URL only syncs the chunks of that page
+        stats = ingest_pages(
+            pages,
+            workspace_id,
+            sync_by="sub_doc_id" if doc_ids.get("sub_doc_id") else "doc_id",
+        )
+        if stats["chunks"]:
             end_time = datetime.now()
             print(f"⏰ Time taken to load repo in Chroma: {end_time - start_time}")
         else:
@@ -46,7 +43,8 @@ def ingest_document(click_up_url: str) -> None:
 def parse_clickup_url(url: str) -> tuple[str, dict]:
     try:
         parts = url.split("app.clickup.com")[1].split("/v/dc/")
-        workspace_id = parts[0]
+        # The URL path starts with the workspace ID, e.g. /9012345/v/dc/abc-1
+        workspace_id = parts[0].strip("/")
         ids = parts[1].split("/")
         return workspace_id, {
             "doc_id": ids[0],
@@ -59,73 +57,179 @@ def parse_clickup_url(url: str) -> tuple[str, dict]:
 def load_document(
     workspace_id: str, doc_id: str, sub_doc_id: Optional[str]
 ) -> List[Document]:
-    documents = get_clickup_docs(workspace_id, doc_id, sub_doc_id or "")
-    if not documents:
+    return split_documents(list(iter_document_pages(workspace_id, doc_id, sub_doc_id)))
+
+
+def iter_document_pages(
+    workspace_id: str, doc_id: str, sub_doc_id: Optional[str]
+) -> Iterator[Document]:
+    """Yield each page of a ClickUp doc as a Document, cleaned as it is reached."""
+    count = 0
+    for doc in iter_clickup_docs(workspace_id, doc_id, sub_doc_id or ""):
+        count += 1
+        yield Document(
+            page_content=f"#{doc.get('name', '')}\n\n\n{doc.get('content', '')}",
+            metadata={
+                "file_path": f"{workspace_id}/{doc_id}/{doc.get('id', '')}",
+                "workspace_id": workspace_id,
+                "doc_id": doc_id,
+                "sub_doc_id": doc.get("id", ""),
+                "title": doc.get("name") or "",
+            },
+        )
+    if count:
+        print(f"📝 ClickUp Doc {workspace_id}/{doc_id}/{sub_doc_id or ''} loaded.")
+    else:
         print(f"❌ No documents found for {workspace_id}/{doc_id}/{sub_doc_id or ''}")
-        return []
-
-    print(f"📝 ClickUp Doc {workspace_id}/{doc_id}/{sub_doc_id or ''} loaded.")
-    return split_documents(
-        [
-            Document(
-                page_content=f"#{doc.get('name', '')}\n\n\n{doc.get('content', '')}",
-                metadata={
-                    "file_path": f"{workspace_id}/{doc_id}/{doc.get('id', '')}",
-                    "workspace_id": workspace_id,
-                    "doc_id": doc_id,
-                    "sub_doc_id": doc.get("id", ""),
-                },
-            )
-            for doc in documents
-        ]
-    )
 
 
-def split_documents(documents: List[Document]) -> List[Document]:
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+def get_text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
+        # Lets the context builder put a page's chunks back in order
+        add_start_index=True,
     )
-    return text_splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: List[Document]) -> None:
-    db = get_chroma_db()
-    chunks_with_ids = calculate_chunk_ids(chunks)
-    existing_items = db.get(include=[])
-    existing_ids = set(existing_items["ids"])
-    print(f"📄 Number of existing documents in DB: {len(existing_ids)}")
+def split_documents(documents: List[Document]) -> List[Document]:
+    return get_text_splitter().split_documents(documents)
+
+
+def split_pages(pages: Iterable[Document]) -> Iterator[Document]:
+    """Split pages one at a time and key their chunks."""
+    text_splitter = get_text_splitter()
+    for page in pages:
+        yield from calculate_chunk_ids(text_splitter.split_documents([page]))
+
+
+def ingest_pages(
+    pages: Iterable[Document], workspace_id: str, sync_by: str = "doc_id"
+) -> Dict[str, int]:
+    """Stream pages through cleaning, splitting, embedding and upserting.
+
+    Each stage runs in its own thread and hands its output to the next stage
+    through a bounded queue, so fetching, splitting, embedding and writing
+    overlap and memory stays flat however large the doc is. Only chunks whose
+    content-hash ID is not stored yet are embedded, and once every page has
+    been seen the stored chunks that disappeared are deleted, per value of the
+    `sync_by` metadata field: per doc by default, per page for a single page.
+    Chunks go to the vector store and keyword index of `workspace_id`.
+    """
+    from .embedding_cache import CachedEmbeddings
+
+    db = get_vector_store(workspace_id)
+    bm25_index = get_bm25_index(workspace_id)
+    start = time.perf_counter()
+    stats = {"pages": 0, "chunks": 0, "embedded": 0, "unchanged": 0, "deleted": 0}
+    existing_ids: Dict[str, Set[str]] = {}
+    current_ids: Dict[str, Set[str]] = {}
+
+    def counted_pages():
+        for page in pages:
+            stats["pages"] += 1
+            yield page
+
+    def embed_batches(batches):
+        # IDs already stored are looked up per doc the first time it is seen
+        for batch in batches:
+            for chunk in batch:
+                key = chunk.metadata[sync_by]
+                if key not in existing_ids:
+                    stored = db.get(where={sync_by: key}, include=[])
+                    existing_ids[key] = set(stored["ids"])
+                    print(
+                        f"📄 Number of existing chunks in DB for {key}: "
+                        f"{len(existing_ids[key])}"
+                    )
+            new_chunks = [
+                chunk
+                for chunk in batch
+                if chunk.metadata["id"] not in existing_ids[chunk.metadata[sync_by]]
+            ]
+            # Queries being answered meanwhile go first
+            with ollama_priority("ingestion"):
+                vectors = db.embeddings.embed_documents(
+                    [chunk.page_content for chunk in new_chunks]
+                )
+            yield batch, new_chunks, vectors
+
+    # fetch and clean -> split and key -> embed in batches -> upsert
+    fetched = threaded(counted_pages(), INGEST_QUEUE_SIZE)
+    chunks = threaded(split_pages(fetched), INGEST_QUEUE_SIZE * INGEST_BATCH_SIZE)
+    embedded = threaded(
+        embed_batches(batched(chunks, INGEST_BATCH_SIZE)), INGEST_QUEUE_SIZE
+    )
+    for batch, new_chunks, vectors in embedded:
+        if new_chunks:
+            upsert_embeddings(
+                db,
+                ids=[chunk.metadata["id"] for chunk in new_chunks],
+                embeddings=vectors,
+                documents=[chunk.page_content for chunk in new_chunks],
+                metadatas=[chunk.metadata for chunk in new_chunks],
+            )
+        # Upserting every current chunk keeps the keyword index complete even
+        # for chunks stored in the vector store before it existed
+        bm25_index.add(batch)
+        for chunk in batch:
+            current_ids.setdefault(chunk.metadata[sync_by], set()).add(
+                chunk.metadata["id"]
+            )
 
-    new_chunks = [
-        chunk for chunk in chunks_with_ids if chunk.metadata["id"] not in existing_ids
-    ]
+        stats["chunks"] += len(batch)
+        stats["embedded"] += len(new_chunks)
+        stats["unchanged"] += len(batch) - len(new_chunks)
+        elapsed = time.perf_counter() - start
+        print(
+            f"👉 {stats['pages']} pages, {stats['chunks']} chunks "
+            f"({stats['embedded']} new, {stats['unchanged']} unchanged), "
+            f"{stats['chunks'] / elapsed:.1f} chunks/s"
+        )
 
-    if new_chunks:
-        print(f"👉 Adding new documents: {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
-        print("✅ New documents added")
-    else:
-        print("✅ No new documents to add")
+    for key, ids in current_ids.items():
+        stale_ids = existing_ids[key] - ids
+        if stale_ids:
+            print(f"🗑️ Deleting stale chunks of {key}: {len(stale_ids)}")
+            db.delete(ids=list(stale_ids))
+            bm25_index.delete(stale_ids)
+            stats["deleted"] += len(stale_ids)
+
+    print(
+        f"✅ {stats['embedded']} new chunks added, {stats['unchanged']} unchanged, "
+        f"{stats['deleted']} deleted"
+    )
+    if isinstance(db.embeddings, CachedEmbeddings):
+        cache_stats = db.embeddings.stats()
+        print(
+            f"🗃️ Embedding cache: {cache_stats['hits']} hits, "
+            f"{cache_stats['misses']} misses, {cache_stats['entries']} entries"
+        )
+    return stats
 
 
 def calculate_chunk_ids(chunks: List[Document]) -> List[Document]:
-    last_page_id = None
-    current_chunk_index = 0
+    """Key every chunk by its page and a hash of its content.
+
+    IDs look like `workspace_id/doc_id/page_id:content_hash`, with an occurrence
+    suffix for identical chunks within the same page, so they stay stable when
+    other chunks or pages of the doc are edited.
+    """
+    seen = {}
 
     for chunk in chunks:
         source = chunk.metadata.get("file_path")
-        page = chunk.metadata.get("page", 0)
-        current_page_id = f"{source}:{page}"
-
-        if current_page_id == last_page_id:
-            current_chunk_index += 1
-        else:
-            current_chunk_index = 0
+        content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+        chunk_id = f"{source}:{content_hash[:32]}"
 
-        chunk_id = f"{current_page_id}:{current_chunk_index}"
-        last_page_id = current_page_id
+        occurrence = seen.get(chunk_id, 0)
+        seen[chunk_id] = occurrence + 1
+        if occurrence:
+            chunk_id = f"{chunk_id}:{occurrence}"
 
+        chunk.metadata["content_hash"] = content_hash
         chunk.metadata["id"] = chunk_id
 
     return chunks
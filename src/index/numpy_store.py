@@ -0,0 +1,621 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+DTYPES = ("float16", "int8")
+REDUCTIONS = ("none", "pca", "random")
+
+# PCA is fitted once this many vectors are stored, until then they are kept at
+# full dimension
+PCA_MIN_FIT_SAMPLES = 1024
+
+# Rows scored per matrix product; small blocks keep the float32 copy made of
+# the matrix in cache, which is faster than converting larger ones
+BLOCK_ROWS = 512
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store keeping embeddings in a memory-mapped NumPy matrix.
+
+    Vectors are normalized, optionally reduced to `dimensions` dimensions by
+    PCA or a random projection, and stored as float16 or as int8 with a scale
+    per row. Chunk text and metadata live in a SQLite sidecar. Search is an
+    exact top-k by matrix product over the mapped matrix, so opening the store
+    reads no vectors and memory grows with the pages the OS keeps cached. A
+    search filtered by metadata only scores the rows that match the filter.
+
+    A store keeps the storage type and reduction it was created with.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedding_function: Embeddings,
+        dtype: str = "int8",
+        reduction: str = "none",
+        dimensions: int = 512,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+        if reduction not in REDUCTIONS:
+            raise ValueError(
+                f"reduction must be one of {REDUCTIONS}, got {reduction!r}"
+            )
+        self.path = path
+        self._embedding_function = embedding_function
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._conn = sqlite3.connect(
+            os.path.join(path, "chunks.sqlite3"), check_same_thread=False
+        )
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )""")
+        # Doc-scoped searches look their rows up by this expression
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chunks_doc_id "
+            "ON chunks (json_extract(metadata, '$.doc_id'))"
+        )
+        self._conn.commit()
+
+        self._meta = self._read_meta() or {
+            "dtype": dtype,
+            "reduction": reduction,
+            "dimensions": dimensions,
+            "input_dimensions": None,
+            "stored_dimensions": None,
+            "fitted": reduction == "none",
+            "capacity": 0,
+        }
+        self._projection = self._read_array("projection.npy")
+        self._mean = self._read_array("mean.npy")
+        self._open_matrix()
+
+        rows = [row for (row,) in self._conn.execute("SELECT row FROM chunks")]
+        self._live = np.zeros(self._meta["capacity"], dtype=bool)
+        self._live[rows] = True
+        self._size = max(rows) + 1 if rows else 0
+        self._free = sorted(set(range(self._size)) - set(rows), reverse=True)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return int(self._live[: self._size].sum())
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        """Insert or replace chunks with precomputed embeddings."""
+        if not ids:
+            return
+        with self._lock:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if self._meta["input_dimensions"] is None:
+                self._start(vectors.shape[1])
+            self._write(ids, self._transform(vectors), documents, metadatas)
+
+            if (
+                self._meta["reduction"] == "pca"
+                and not self._meta["fitted"]
+                and len(self) >= max(PCA_MIN_FIT_SAMPLES, 2 * self._meta["dimensions"])
+            ):
+                self._fit_pca()
+
+    def copy_from(
+        self, source: "NumpyVectorStore", chunks: Dict[str, List[Any]]
+    ) -> None:
+        """
+        Copy chunks of another store with their stored vectors, embedding none.
+
+        The vectors of a reduced source can't be mapped back to full
+        dimension, so an empty store takes its reduction, and a store reduced
+        otherwise can't copy them.
+
+        Args:
+            source (NumpyVectorStore): The store the chunks come from
+            chunks (dict): The chunks to copy, as `get` returns them with their
+                embeddings, under the IDs and metadata they get here
+        """
+        if not chunks["ids"]:
+            return
+        with self._lock:
+            if source._projection is None:
+                self.upsert(
+                    chunks["ids"],
+                    chunks["embeddings"],
+                    chunks["documents"],
+                    chunks["metadatas"],
+                )
+                return
+            if self._meta["input_dimensions"] is None:
+                self._adopt_reduction(source)
+            elif not (
+                np.array_equal(self._projection, source._projection)
+                and np.array_equal(self._mean, source._mean)
+            ):
+                raise ValueError(
+                    f"Can't copy the vectors of {source.path}, "
+                    f"{self.path} is reduced differently"
+                )
+            self._write(
+                chunks["ids"],
+                normalize(np.asarray(chunks["embeddings"], dtype=np.float32)),
+                chunks["documents"],
+                chunks["metadatas"],
+            )
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.upsert(
+            ids,
+            self.embeddings.embed_documents(texts),
+            texts,
+            metadatas or [{} for _ in texts],
+        )
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: str = "vectors",
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+    ) -> Dict[str, List[Any]]:
+        """
+        Chunks by ID and/or metadata, in the shape Chroma returns.
+
+        Args:
+            ids (list): Only return these chunks
+            where (dict): Only return chunks matching this metadata filter
+            include (list): "documents", "metadatas" and/or "embeddings", the
+                first two by default. Embeddings are returned as stored,
+                reduced if the store is
+
+        Returns:
+            dict: The `ids`, `documents`, `metadatas` and `embeddings` of the
+                chunks
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        query = "SELECT id, row, text, metadata FROM chunks WHERE 1"
+        params: List[Any] = []
+        if ids is not None:
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            params += ids
+        if where:
+            conditions, where_params = self._where(where)
+            query += conditions
+            params += where_params
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            embeddings = (
+                self._decode(np.asarray([row for _, row, _, _ in rows])).tolist()
+                if "embeddings" in include and rows
+                else []
+            )
+        return {
+            "ids": [chunk_id for chunk_id, _, _, _ in rows],
+            "documents": (
+                [text for _, _, text, _ in rows] if "documents" in include else []
+            ),
+            "metadatas": (
+                [json.loads(metadata) for _, _, _, metadata in rows]
+                if "metadatas" in include
+                else []
+            ),
+            "embeddings": embeddings,
+        }
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        if not ids:
+            return
+        with self._lock:
+            rows = list(self._rows(ids).values())
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids]
+            )
+            self._conn.commit()
+            self._live[rows] = False
+            self._free = sorted(set(self._free) | set(rows), reverse=True)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, **kwargs)
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Most similar chunks with their cosine similarity to the query."""
+        return self.similarity_search_by_vector_with_score(
+            self.embeddings.embed_query(query), k, filter=filter
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_by_vector_with_score(
+                embedding, k, filter=kwargs.get("filter")
+            )
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Most similar chunks to an embedding, with their cosine similarity.
+
+        Args:
+            embedding (list): The query embedding
+            k (int): Number of chunks to return
+            filter (dict): Only search chunks whose metadata has these values,
+                each given as a value or as {"$in": [values]}, like in Chroma
+
+        Returns:
+            list: (chunk, score) pairs, best first
+        """
+        with self._lock:
+            if not len(self):
+                return []
+            query = self._transform(np.asarray([embedding], dtype=np.float32))[0]
+            if filter:
+                rows = self._filtered_rows(filter)
+                if not len(rows):
+                    return []
+                scores = self._score_rows(query, rows)
+            else:
+                rows = np.arange(self._size)
+                scores = self._score_rows(query)
+                scores[~self._live[: self._size]] = -np.inf
+
+            k = min(k, len(self), len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            found = {
+                row: (text, metadata)
+                for row, text, metadata in self._conn.execute(
+                    f"SELECT row, text, metadata FROM chunks "
+                    f"WHERE row IN ({','.join('?' * len(top))})",
+                    [int(rows[index]) for index in top],
+                )
+            }
+        return [
+            (
+                Document(
+                    page_content=found[row][0], metadata=json.loads(found[row][1])
+                ),
+                float(scores[index]),
+            )
+            for index, row in zip(top.tolist(), rows[top].tolist())
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Chroma's name for the same search, the scores are relevance scores."""
+        return self.similarity_search_by_vector_with_score(embedding, k, filter=filter)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities already
+        return lambda score: score
+
+    def score_texts(self, query: str, texts: List[str]) -> List[float]:
+        """The scores a search for `query` would give the texts."""
+        query_vector = self._transform(
+            np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+        )[0]
+        stored, scales = self._encode(
+            self._transform(
+                np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+            )
+        )
+        scores = stored.astype(np.float32) @ query_vector
+        if scales is not None:
+            scores *= scales
+        return scores.tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self),
+            "dtype": self._meta["dtype"],
+            "reduction": self._meta["reduction"],
+            "dimensions": self._meta["stored_dimensions"],
+            "fitted": self._meta["fitted"],
+            "bytes": sum(
+                os.path.getsize(os.path.join(self.path, name))
+                for name in os.listdir(self.path)
+            ),
+        }
+
+    def _score_rows(
+        self, query: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Scores of the given rows, or of every row, a block at a time."""
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, count)
+            # Contiguous rows are read as a view of the mapped matrix
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(self._matrix[block_rows], dtype=np.float32) @ query
+            if self._scales is not None:
+                block *= self._scales[block_rows]
+            scores[start:end] = block
+        return scores
+
+    @staticmethod
+    def _where(filter: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """SQL conditions and parameters of a Chroma-style metadata filter."""
+        query = ""
+        params: List[Any] = []
+        for key, condition in filter.items():
+            if not key.isidentifier():
+                raise ValueError(f"Unsupported metadata key: {key!r}")
+            # A literal path rather than a parameter, so SQLite can use the
+            # chunks_doc_id index
+            column = f"json_extract(metadata, '$.{key}')"
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    raise ValueError(f"Unsupported filter: {condition!r}")
+                values = list(condition["$in"])
+                query += f" AND {column} IN ({','.join('?' * len(values))})"
+                params += values
+            else:
+                query += f" AND {column} = ?"
+                params.append(condition)
+        return query, params
+
+    def _filtered_rows(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Rows of the chunks whose metadata matches a Chroma-style filter."""
+        conditions, params = self._where(filter)
+        query = "SELECT row FROM chunks WHERE 1" + conditions
+        rows = sorted(row for (row,) in self._conn.execute(query, params))
+        return np.asarray(rows, dtype=np.int64)
+
+    def _start(self, input_dimensions: int) -> None:
+        """Size the matrix for the first vectors, fitting a random projection."""
+        self._meta["input_dimensions"] = input_dimensions
+        self._meta["stored_dimensions"] = input_dimensions
+        if self._meta["reduction"] == "random":
+            dimensions = self._meta["dimensions"]
+            rng = np.random.default_rng(0)
+            self._projection = rng.standard_normal(
+                (input_dimensions, dimensions), dtype=np.float32
+            ) / np.sqrt(dimensions)
+            self._write_array("projection.npy", self._projection)
+            self._meta["stored_dimensions"] = dimensions
+            self._meta["fitted"] = True
+        self._write_meta()
+        self._open_matrix()
+
+    def _adopt_reduction(self, source: "NumpyVectorStore") -> None:
+        """Start with the dimensions and fitted reduction of another store."""
+        for key in (
+            "reduction",
+            "dimensions",
+            "input_dimensions",
+            "stored_dimensions",
+            "fitted",
+        ):
+            self._meta[key] = source._meta[key]
+        self._projection = source._projection
+        self._mean = source._mean
+        self._write_array("projection.npy", self._projection)
+        if self._mean is not None:
+            self._write_array("mean.npy", self._mean)
+        self._write_meta()
+        self._open_matrix()
+
+    def _write(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        """Store chunks with their vectors, already transformed."""
+        stored, scales = self._encode(vectors)
+        existing = self._rows(ids)
+        rows = []
+        for chunk_id in ids:
+            if chunk_id in existing:
+                rows.append(existing[chunk_id])
+            elif self._free:
+                rows.append(self._free.pop())
+            else:
+                rows.append(self._size)
+                self._size += 1
+        self._reserve(self._size)
+        self._matrix[rows] = stored
+        if scales is not None:
+            self._scales[rows] = scales
+        self._flush()
+        self._live[rows] = True
+
+        # Vectors are written before the sidecar points at them
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, row, text, metadata) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (chunk_id, row, text, json.dumps(metadata))
+                for chunk_id, row, text, metadata in zip(
+                    ids, rows, documents, metadatas
+                )
+            ],
+        )
+        self._conn.commit()
+
+    def _transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = normalize(vectors)
+        if self._projection is None:
+            return vectors
+        if self._mean is not None:
+            vectors = vectors - self._mean
+        return normalize(vectors @ self._projection)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self._meta["dtype"] == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def _fit_pca(self) -> None:
+        """Fit PCA on the stored vectors and rewrite the matrix reduced."""
+        rows = np.flatnonzero(self._live[: self._size])
+        vectors = self._decode(rows)
+        mean = vectors.mean(axis=0)
+        _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+        self._mean = mean.astype(np.float32)
+        self._projection = np.ascontiguousarray(
+            components[: self._meta["dimensions"]].T, dtype=np.float32
+        )
+        reduced = normalize((vectors - self._mean) @ self._projection)
+        stored, scales = self._encode(reduced)
+
+        self._write_array("mean.npy", self._mean)
+        self._write_array("projection.npy", self._projection)
+        self._meta["stored_dimensions"] = self._projection.shape[1]
+        self._meta["fitted"] = True
+        self._matrix = self._scales = None
+        os.remove(os.path.join(self.path, "vectors.bin"))
+        self._write_meta()
+        self._open_matrix()
+        self._matrix[rows] = stored
+        if scales is not None:
+            self._scales[rows] = scales
+        self._flush()
+
+    def _rows(self, ids: List[str]) -> Dict[str, int]:
+        rows = {}
+        for start in range(0, len(ids), 500):
+            part = ids[start : start + 500]
+            rows.update(
+                self._conn.execute(
+                    f"SELECT id, row FROM chunks WHERE id IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+            )
+        return rows
+
+    def _reserve(self, rows: int) -> None:
+        """Grow the matrix files to hold at least `rows` rows."""
+        if rows <= self._meta["capacity"]:
+            return
+        self._meta["capacity"] = max(1024, 2 * self._meta["capacity"], rows)
+        self._write_meta()
+        self._open_matrix()
+        live = np.zeros(self._meta["capacity"], dtype=bool)
+        live[: len(self._live)] = self._live
+        self._live = live
+
+    def _open_matrix(self) -> None:
+        """Map the matrix files, growing them to the capacity in the metadata."""
+        self._matrix = self._scales = None
+        capacity = self._meta["capacity"]
+        dimensions = self._meta["stored_dimensions"]
+        if not capacity or not dimensions:
+            return
+        dtype = np.dtype(self._meta["dtype"])
+        self._matrix = self._map("vectors.bin", dtype, (capacity, dimensions))
+        if self._meta["dtype"] == "int8":
+            self._scales = self._map("scales.bin", np.dtype(np.float32), (capacity,))
+
+    def _map(self, name: str, dtype: np.dtype, shape: Tuple[int, ...]) -> np.memmap:
+        path = os.path.join(self.path, name)
+        size = int(np.prod(shape)) * dtype.itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                # Extending the file fills the new rows with zeros
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _flush(self) -> None:
+        self._matrix.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.path, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self) -> None:
+        # Write then rename, so an interruption never leaves a truncated file
+        path = os.path.join(self.path, "meta.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._meta, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _read_array(self, name: str) -> Optional[np.ndarray]:
+        path = os.path.join(self.path, name)
+        return np.load(path) if os.path.exists(path) else None
+
+    def _write_array(self, name: str, array: np.ndarray) -> None:
+        np.save(os.path.join(self.path, name), array)
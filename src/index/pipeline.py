@@ -0,0 +1,68 @@
+"""
+Helpers to chain generators into a pipeline whose stages run concurrently.
+"""
+
+import queue
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(iterable: Iterable[T], maxsize: int) -> Iterator[T]:
+    """
+    Consume `iterable` in a background thread and yield its items.
+
+    The thread runs ahead of the consumer by at most `maxsize` items, so the
+    stages of a pipeline overlap while its memory stays bounded. An exception
+    raised by the stage is re-raised to the consumer, and the thread stops when
+    the consumer stops iterating.
+    """
+    items: queue.Queue = queue.Queue(maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+            return
+        put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group the items of `iterable` into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
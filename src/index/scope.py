@@ -0,0 +1,86 @@
+"""
+Scope of a query: the workspace, and optionally the docs of it, it searches.
+
+Chunks are stored in one collection per workspace, so a scoped query only
+searches the collection of its workspace, filtered by doc ID, and its
+latency doesn't grow with the docs ingested elsewhere. A query without a
+workspace searches every workspace.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .store import check_workspace_id, get_vector_store, workspace_ids
+
+
+@dataclass(frozen=True)
+class Scope:
+    workspace_id: Optional[str] = None
+    doc_ids: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if self.workspace_id is not None:
+            check_workspace_id(self.workspace_id)
+        elif self.doc_ids:
+            raise ValueError("Docs can only be searched within their workspace")
+        # Equal scopes compare equal whatever the order of their docs
+        object.__setattr__(self, "doc_ids", tuple(sorted(set(self.doc_ids))))
+
+    @classmethod
+    def of(cls, state: Mapping[str, Any]) -> "Scope":
+        """The scope of a graph state."""
+        return cls(state.get("workspace_id"), tuple(state.get("doc_ids") or ()))
+
+    def inputs(self) -> Dict[str, Any]:
+        """Graph inputs restricting retrieval to the scope."""
+        return {"workspace_id": self.workspace_id, "doc_ids": list(self.doc_ids)}
+
+    def __str__(self) -> str:
+        if self.workspace_id is None:
+            return "every workspace"
+        if not self.doc_ids:
+            return f"workspace {self.workspace_id}"
+        docs = "doc" if len(self.doc_ids) == 1 else "docs"
+        return f"{docs} {', '.join(self.doc_ids)} of workspace {self.workspace_id}"
+
+
+def parse_scope(text: str) -> Scope:
+    """
+    Parse a scope given as "all", a workspace ID or ClickUp Docs URLs.
+
+    Args:
+        text (str): "all", a workspace ID, or space-separated URLs of docs
+            or pages of the same workspace
+
+    Returns:
+        Scope: The parsed scope
+    """
+    from .indexer import parse_clickup_url
+
+    words = text.split()
+    if not words or words == ["all"]:
+        return Scope()
+    if len(words) == 1 and "app.clickup.com" not in words[0]:
+        return Scope(words[0])
+    workspaces, doc_ids = set(), []
+    for word in words:
+        workspace_id, ids = parse_clickup_url(word)
+        workspaces.add(workspace_id)
+        doc_ids.append(ids["doc_id"])
+    if len(workspaces) > 1:
+        raise ValueError("Docs of different workspaces can't be searched together")
+    return Scope(workspaces.pop(), tuple(doc_ids))
+
+
+def unindexed(scope: Scope) -> List[str]:
+    """The workspace or docs of a scope with no ingested chunks."""
+    if scope.workspace_id is None:
+        return [] if workspace_ids() else ["any workspace"]
+    if scope.workspace_id not in workspace_ids():
+        return [f"workspace {scope.workspace_id}"]
+    db = get_vector_store(scope.workspace_id)
+    return [
+        f"doc {doc_id}"
+        for doc_id in scope.doc_ids
+        if not db.get(where={"doc_id": doc_id}, include=[])["ids"]
+    ]
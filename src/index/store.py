@@ -0,0 +1,324 @@
+"""
+Lazily initialized registry of the vector stores, keyword indexes and retrievers.
+
+Every ClickUp workspace has its own vector store collection and keyword index,
+so a query scoped to a workspace, or to some of its docs, never searches the
+chunks of other workspaces. Ingestion and the graph share the same instances,
+and the heavy langchain and chromadb modules are only imported the first time
+one of them is needed.
+"""
+
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from src.constants.constants import (
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    HYBRID_RETRIEVAL,
+    OLLAMA_BASE_URL,
+    OLLAMA_NUM_CTX,
+    RETRIEVER_FETCH_K,
+    RETRIEVER_K,
+    RRF_K,
+    VECTOR_BACKEND,
+    VECTOR_DIMENSIONS,
+    VECTOR_DTYPE,
+    VECTOR_REDUCTION,
+)
+
+CHROMA_PATH = "chroma"
+BM25_DIR = os.path.join(CHROMA_PATH, "bm25")
+NUMPY_STORE_PATH = os.path.join(CHROMA_PATH, "numpy")
+EMBEDDING_MODEL = "llama3.1"
+
+COLLECTION_PREFIX = "workspace-"
+# Workspace IDs name collections and files
+WORKSPACE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+# The single index every workspace shared before per-workspace collections
+LEGACY_COLLECTION = "langchain"
+LEGACY_BM25_PATH = os.path.join(CHROMA_PATH, "bm25.sqlite3")
+
+_lock = threading.RLock()
+_embeddings = None
+_chroma_client = None
+_vector_stores: Dict[str, object] = {}
+_bm25_indexes: Dict[str, object] = {}
+_retrievers: Dict[str, object] = {}
+_migrated = False
+
+
+def check_workspace_id(workspace_id: str) -> str:
+    if not isinstance(workspace_id, str) or not WORKSPACE_ID_PATTERN.fullmatch(
+        workspace_id
+    ):
+        raise ValueError(f"Invalid workspace ID: {workspace_id!r}")
+    return workspace_id
+
+
+def get_embeddings():
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from src.llms.ollama import ThrottledOllamaEmbeddings
+
+            from .embedding_cache import CachedEmbeddings
+
+            # Same context as the chat model, Ollama reloads a model whenever
+            # a request asks for another one
+            _embeddings = ThrottledOllamaEmbeddings(
+                model=EMBEDDING_MODEL, base_url=OLLAMA_BASE_URL, num_ctx=OLLAMA_NUM_CTX
+            )
+            if EMBEDDING_CACHE_MAX_ENTRIES > 0:
+                _embeddings = CachedEmbeddings(
+                    _embeddings,
+                    model=EMBEDDING_MODEL,
+                    path=EMBEDDING_CACHE_PATH,
+                    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                )
+        return _embeddings
+
+
+def get_chroma_client():
+    global _chroma_client
+    with _lock:
+        if _chroma_client is None:
+            import chromadb
+
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        return _chroma_client
+
+
+def relevance_score(score: float) -> float:
+    """
+    Relevance of a raw dense search score, the only place they are converted.
+
+    The numpy backend scores by cosine similarity already. Chroma collections
+    keep their default L2 space and return distances, converted as LangChain
+    converts them for L2; unnormalized Ollama embeddings take them below 0,
+    and the pre-filter thresholds are calibrated on these values.
+    """
+    if VECTOR_BACKEND == "numpy":
+        return score
+    return 1.0 - score / math.sqrt(2)
+
+
+def open_vector_store(path_or_collection: str):
+    """Open a vector store of the configured backend, by directory or collection."""
+    if VECTOR_BACKEND == "numpy":
+        from .numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(
+            path_or_collection,
+            get_embeddings(),
+            dtype=VECTOR_DTYPE,
+            reduction=VECTOR_REDUCTION,
+            dimensions=VECTOR_DIMENSIONS,
+        )
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        client=get_chroma_client(),
+        collection_name=path_or_collection,
+        embedding_function=get_embeddings(),
+        relevance_score_fn=relevance_score,
+    )
+
+
+def get_vector_store(workspace_id: str):
+    """The vector store holding the chunks of a workspace, created if needed."""
+    check_workspace_id(workspace_id)
+    migrate_global_index()
+    return _workspace_vector_store(workspace_id)
+
+
+def _workspace_vector_store(workspace_id: str):
+    with _lock:
+        if workspace_id not in _vector_stores:
+            _vector_stores[workspace_id] = open_vector_store(
+                os.path.join(NUMPY_STORE_PATH, workspace_id)
+                if VECTOR_BACKEND == "numpy"
+                else f"{COLLECTION_PREFIX}{workspace_id}"
+            )
+        return _vector_stores[workspace_id]
+
+
+def workspace_ids() -> List[str]:
+    """IDs of the workspaces with a vector store, sorted."""
+    migrate_global_index()
+    if VECTOR_BACKEND == "numpy":
+        if not os.path.isdir(NUMPY_STORE_PATH):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(NUMPY_STORE_PATH)
+            if os.path.isdir(os.path.join(NUMPY_STORE_PATH, name))
+        )
+    return sorted(
+        collection.name[len(COLLECTION_PREFIX) :]
+        for collection in get_chroma_client().list_collections()
+        if collection.name.startswith(COLLECTION_PREFIX)
+    )
+
+
+def upsert_embeddings(db, ids, embeddings, documents, metadatas) -> None:
+    """Insert or replace chunks with precomputed embeddings in either backend."""
+    if VECTOR_BACKEND == "numpy":
+        db.upsert(ids, embeddings, documents, metadatas)
+    else:
+        db._collection.upsert(
+            ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+        )
+
+
+def get_bm25_index(workspace_id: str):
+    check_workspace_id(workspace_id)
+    with _lock:
+        if workspace_id not in _bm25_indexes:
+            from .bm25 import BM25Index
+
+            _bm25_indexes[workspace_id] = BM25Index(
+                os.path.join(BM25_DIR, f"{workspace_id}.sqlite3")
+            )
+        return _bm25_indexes[workspace_id]
+
+
+def get_retriever(workspace_id: str):
+    with _lock:
+        if workspace_id not in _retrievers:
+            if HYBRID_RETRIEVAL:
+                from .hybrid import HybridRetriever
+
+                _retrievers[workspace_id] = HybridRetriever(
+                    vectorstore=get_vector_store(workspace_id),
+                    bm25_index=get_bm25_index(workspace_id),
+                    k=RETRIEVER_K,
+                    fetch_k=RETRIEVER_FETCH_K,
+                    rrf_k=RRF_K,
+                )
+            else:
+                from .hybrid import VectorRetriever
+
+                _retrievers[workspace_id] = VectorRetriever(
+                    vectorstore=get_vector_store(workspace_id), k=RETRIEVER_K
+                )
+        return _retrievers[workspace_id]
+
+
+def get_retrievers(workspace_id: Optional[str] = None) -> list:
+    """The retriever of a workspace, or those of every workspace."""
+    if workspace_id is not None:
+        return [get_retriever(workspace_id)]
+    return [get_retriever(workspace_id) for workspace_id in workspace_ids()]
+
+
+def _legacy_workspace_id(metadata: dict) -> str:
+    """
+    The workspace of a chunk of the shared index. Chunks ingested before
+    ClickUp URLs were parsed without their leading slash have it in their
+    workspace ID and file path.
+    """
+    return (
+        str(metadata.get("workspace_id") or metadata.get("file_path") or "")
+        .strip("/")
+        .split("/")[0]
+    )
+
+
+def _legacy_metadata(metadata: dict, workspace_id: str) -> dict:
+    """The metadata of a chunk of the shared index as it is ingested now."""
+    metadata = {**metadata, "workspace_id": workspace_id}
+    for key in ("file_path", "id"):
+        if isinstance(metadata.get(key), str):
+            metadata[key] = metadata[key].lstrip("/")
+    return metadata
+
+
+def migrate_global_index() -> None:
+    """
+    Move the chunks of the index all workspaces shared before into the vector
+    store and keyword index of their workspace, then delete it.
+
+    Their stored embeddings are copied, so no chunk is embedded again, under
+    the IDs and metadata ingestion gives them now. A failed or interrupted
+    migration starts over on the next call.
+    """
+    global _migrated
+    with _lock:
+        if _migrated:
+            return
+        if VECTOR_BACKEND == "numpy":
+            if not os.path.exists(os.path.join(NUMPY_STORE_PATH, "chunks.sqlite3")):
+                _migrated = True
+                return
+            legacy = open_vector_store(NUMPY_STORE_PATH)
+        else:
+            if LEGACY_COLLECTION not in [
+                collection.name for collection in get_chroma_client().list_collections()
+            ]:
+                _migrated = True
+                return
+            legacy = open_vector_store(LEGACY_COLLECTION)
+
+        from langchain_core.documents import Document
+
+        from src.constants.constants import INGEST_BATCH_SIZE
+
+        stored = legacy.get(include=["metadatas"])
+        by_workspace: Dict[str, List[str]] = {}
+        skipped = 0
+        for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            workspace_id = _legacy_workspace_id(metadata)
+            if not WORKSPACE_ID_PATTERN.fullmatch(workspace_id):
+                skipped += 1
+                continue
+            by_workspace.setdefault(workspace_id, []).append(chunk_id)
+        print(
+            f"📦 Moving {len(stored['ids']) - skipped} chunks into the collections "
+            f"of {len(by_workspace)} workspaces"
+        )
+        if skipped:
+            print(f"⚠️ Dropping {skipped} chunks without a valid workspace ID")
+        for workspace_id, ids in by_workspace.items():
+            db = _workspace_vector_store(workspace_id)
+            bm25_index = get_bm25_index(workspace_id)
+            for start in range(0, len(ids), INGEST_BATCH_SIZE):
+                batch = legacy.get(
+                    ids=ids[start : start + INGEST_BATCH_SIZE],
+                    include=["embeddings", "documents", "metadatas"],
+                )
+                batch["ids"] = [chunk_id.lstrip("/") for chunk_id in batch["ids"]]
+                batch["metadatas"] = [
+                    _legacy_metadata(metadata, workspace_id)
+                    for metadata in batch["metadatas"]
+                ]
+                if VECTOR_BACKEND == "numpy":
+                    # Reduced vectors are copied as stored
+                    db.copy_from(legacy, batch)
+                else:
+                    upsert_embeddings(
+                        db,
+                        batch["ids"],
+                        [list(map(float, vector)) for vector in batch["embeddings"]],
+                        batch["documents"],
+                        batch["metadatas"],
+                    )
+                bm25_index.add(
+                    Document(page_content=text, metadata=metadata)
+                    for text, metadata in zip(batch["documents"], batch["metadatas"])
+                )
+
+        if VECTOR_BACKEND == "numpy":
+            legacy._conn.close()
+            for name in os.listdir(NUMPY_STORE_PATH):
+                path = os.path.join(NUMPY_STORE_PATH, name)
+                if os.path.isfile(path):
+                    os.remove(path)
+        else:
+            get_chroma_client().delete_collection(LEGACY_COLLECTION)
+        if os.path.exists(LEGACY_BM25_PATH):
+            os.remove(LEGACY_BM25_PATH)
+        _migrated = True
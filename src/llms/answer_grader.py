@@ -35,4 +35,6 @@ Ensure your evaluation is thorough, fair, and focused on the user's needs.""",
     input_variables=["generation", "question"],
 )
 
-answer_grader = prompt | llm | JsonOutputParser()
+answer_grader = (prompt | llm | JsonOutputParser()).with_config(
+    run_name="answer_grader"
+)
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+class LLMCache(BaseCache):
+    """
+    Persistent exact-match cache for LLM calls, stored in SQLite.
+
+    Entries are keyed by a hash of the model parameters (model, format,
+    temperature...) and a hash of the full prompt. Since retrieved document
+    text is part of the prompt, a chunk whose content changes never hits an
+    answer computed from its old version. Entries expire after `ttl_seconds`
+    and the least recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS llm_cache (
+                llm_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (llm_hash, prompt_hash)
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)"
+        )
+        self._conn.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = (_hash(llm_string), _hash(prompt))
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache "
+                "WHERE llm_hash = ? AND prompt_hash = ?",
+                key,
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE llm_hash = ? AND prompt_hash = ?", key
+                )
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_used = ? "
+                "WHERE llm_hash = ? AND prompt_hash = ?",
+                (now, *key),
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        generations = loads(row[0])
+        for generation in generations:
+            # Let callbacks tell cached responses apart from fresh ones
+            generation.generation_info = {
+                **(generation.generation_info or {}),
+                "cache_hit": True,
+            }
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(llm_hash, prompt_hash, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (_hash(llm_string), _hash(prompt), dumps(list(return_val)), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def _evict(self) -> None:
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = entries - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE rowid IN "
+                "(SELECT rowid FROM llm_cache ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
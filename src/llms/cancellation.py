@@ -0,0 +1,37 @@
+import threading
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class LLMCallCancelled(Exception):
+    pass
+
+
+class CancellationHandler(BaseCallbackHandler):
+    """
+    Abort an LLM call once `event` is set.
+
+    The call is aborted before its request is sent, or at the next streamed
+    token, which closes the stream so Ollama stops generating and frees its
+    slot. Aborted calls are not cached.
+    """
+
+    raise_error = True
+
+    def __init__(self, event: threading.Event):
+        super().__init__()
+        self.event = event
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def on_llm_new_token(self, *args: Any, **kwargs: Any) -> None:
+        self._check()
+
+    def _check(self) -> None:
+        if self.event.is_set():
+            raise LLMCallCancelled()
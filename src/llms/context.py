@@ -0,0 +1,177 @@
+"""
+Render retrieved chunks as prompt context within a token budget.
+
+Chunks of the same page are merged back into passages, dropping the text
+neighbouring chunks share because of the splitter's overlap, and each page is
+rendered as its title followed by its passages, without metadata. Pages are
+packed most relevant first until CONTEXT_TOKEN_BUDGET tokens are used, so the
+prompt fits the model's context window instead of being silently truncated.
+"""
+
+from functools import lru_cache
+from typing import Dict, List
+
+from langchain.schema.document import Document
+
+from src.constants.constants import CONTEXT_TOKEN_BUDGET
+
+# Text shared by neighbouring chunks is at most CHUNK_OVERLAP tokens, matches
+# shorter than MIN_OVERLAP_CHARS are treated as a coincidence
+MAX_OVERLAP_CHARS = 2000
+MIN_OVERLAP_CHARS = 20
+# The splitter strips the separator ("\n\n" at most) between two chunks
+MAX_SEPARATOR_CHARS = 2
+
+# A page cut to fit the budget is only kept if this many tokens remain
+MIN_PAGE_TOKENS = 64
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    import tiktoken
+
+    # The splitter's encoding, close enough to llama3.1's tokenizer for a budget
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    encoding = get_encoding()
+    ids = encoding.encode(text, disallowed_special=())
+    return text if len(ids) <= tokens else encoding.decode(ids[:tokens])
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest end of `left` that `right` starts with."""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for length in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def merge_overlapping(passages: List[str], text: str) -> bool:
+    """Join `text` to a passage it overlaps with, in place."""
+    for index, passage in enumerate(passages):
+        if text in passage:
+            return True
+        if overlap := overlap_length(passage, text):
+            passages[index] = passage + text[overlap:]
+            return True
+        if overlap := overlap_length(text, passage):
+            passages[index] = text + passage[overlap:]
+            return True
+    return False
+
+
+def merge_page_chunks(chunks: List[Document]) -> List[str]:
+    """
+    Merge the retrieved chunks of one page into passages without repeated text.
+
+    Chunks ingested with a `start_index` are merged in page order, joining
+    neighbours that overlap or only have the stripped separator between them,
+    and only dropping overlapping text that is actually repeated.
+    Older chunks are joined wherever the end of one is the start of another.
+    """
+    if all("start_index" in chunk.metadata for chunk in chunks):
+        passages: List[str] = []
+        end = 0
+        for chunk in sorted(chunks, key=lambda chunk: chunk.metadata["start_index"]):
+            start = chunk.metadata["start_index"]
+            text = chunk.page_content
+            if passages and start <= end + MAX_SEPARATOR_CHARS:
+                shared = max(0, end - start)
+                # Chunks an incremental sync left unchanged keep the offsets of
+                # an older version of the page, so the text they say is
+                # repeated is checked before it is dropped
+                if not passages[-1].endswith(text[:shared]) and not (
+                    shared >= len(text) and text in passages[-1]
+                ):
+                    shared = overlap_length(passages[-1], text)
+                separator = "" if shared else "\n\n"
+                passages[-1] += separator + text[shared:]
+            else:
+                passages.append(text)
+            end = max(end, start + len(text))
+        return passages
+
+    passages = []
+    for chunk in chunks:
+        if not merge_overlapping(passages, chunk.page_content):
+            passages.append(chunk.page_content)
+
+    # A chunk merged last may bridge two passages found before it
+    merged: List[str] = []
+    for passage in passages:
+        if not merge_overlapping(merged, passage):
+            merged.append(passage)
+    return merged
+
+
+def page_title(chunks: List[Document], passages: List[str]) -> str:
+    title = chunks[0].metadata.get("title")
+    if title:
+        return title
+    # Chunks ingested before titles were stored start with the page's "#Title"
+    for passage in passages:
+        if passage.startswith("#"):
+            return passage.split("\n", 1)[0].lstrip("#").strip()
+    return "Untitled page"
+
+
+def render_page(chunks: List[Document]) -> str:
+    passages = merge_page_chunks(chunks)
+    title = page_title(chunks, passages)
+    # The page text starts with its title, which becomes the header
+    passages = [
+        (
+            passage[len(f"#{title}") :].lstrip()
+            if passage.startswith(f"#{title}")
+            else passage
+        )
+        for passage in passages
+    ]
+    return f"[Page: {title}]\n" + "\n\n[...]\n\n".join(
+        passage for passage in passages if passage
+    )
+
+
+def build_context(documents: List[Document], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Render documents as prompt context of at most `budget` tokens.
+
+    Args:
+        documents (list): The documents, most relevant first
+        budget (int): Maximum number of tokens of the context
+
+    Returns:
+        str: The pages of the documents, most relevant first
+    """
+    pages: Dict[str, List[Document]] = {}
+    seen = set()
+    for document in documents:
+        key = document.metadata.get("id", document.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        page = document.metadata.get("file_path") or key
+        pages.setdefault(page, []).append(document)
+
+    blocks = []
+    used = 0
+    for chunks in pages.values():
+        remaining = budget - used
+        if remaining < MIN_PAGE_TOKENS:
+            break
+        block = render_page(chunks)
+        tokens = count_tokens(block)
+        if tokens > remaining:
+            block = truncate_tokens(block, remaining)
+            tokens = remaining
+        blocks.append(block)
+        # Blocks are separated by a blank line
+        used += tokens + 1
+    return "\n\n".join(blocks)
@@ -1,6 +1,8 @@
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 
+from src.constants.constants import GENERATION_TAG
+
 from .llm import llm
 
 prompt = PromptTemplate(
@@ -39,4 +41,6 @@ Return your response in the following JSON format:
     input_variables=["question", "context", "feedback"],
 )
 
-rag_chain = prompt | llm | JsonOutputParser()
+rag_chain = (prompt | llm | JsonOutputParser()).with_config(
+    run_name="rag_chain", tags=[GENERATION_TAG]
+)
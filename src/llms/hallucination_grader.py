@@ -35,4 +35,6 @@ Ensure your evaluation is thorough and objective.""",
     input_variables=["generation", "documents"],
 )
 
-hallucination_grader = prompt | llm | JsonOutputParser()
+hallucination_grader = (prompt | llm | JsonOutputParser()).with_config(
+    run_name="hallucination_grader"
+)
@@ -1,10 +1,48 @@
-from langchain_community.chat_models import ChatOllama
+from src.constants.constants import (
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_SECONDS,
+    OLLAMA_BASE_URL,
+    OLLAMA_NUM_CTX,
+    OLLAMA_TIMEOUT_SECONDS,
+)
+
+from .cache import LLMCache
+from .ollama import ThrottledChatOllama, warm_up
 
 LLM_MODEL = "llama3.1"
+
+llm_cache = (
+    LLMCache(
+        LLM_CACHE_PATH,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    )
+    if LLM_CACHE_MAX_ENTRIES > 0
+    else None
+)
+
 llm = (
-    ChatOllama(
+    ThrottledChatOllama(
         model=LLM_MODEL,
+        base_url=OLLAMA_BASE_URL,
         format="json",
         temperature=0,
+        num_ctx=OLLAMA_NUM_CTX,
+        timeout=OLLAMA_TIMEOUT_SECONDS,
+        cache=llm_cache,
     ),
 )[0]
+
+
+def warm_up_models():
+    """Load the chat and embedding models so the first query doesn't wait."""
+    from src.index.store import EMBEDDING_MODEL
+
+    loaded = {}
+    for model in dict.fromkeys((LLM_MODEL, EMBEDDING_MODEL)):
+        try:
+            loaded[model] = warm_up(model)
+        except Exception as e:
+            print(f"⚠️ Could not load {model} into Ollama: {e}")
+    return loaded
@@ -0,0 +1,196 @@
+"""
+Ollama clients sending their requests through the scheduler.
+
+Every request takes a slot of `scheduler` (see src/llms/scheduler.py).
+Embedding requests, the most frequent ones, are sent over one pooled HTTP
+session, reusing connections instead of opening one per call. Requests carry
+OLLAMA_KEEP_ALIVE so the model stays loaded between queries, and `warm_up`
+loads it at startup.
+"""
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Iterator, List, Optional, Union
+
+import requests
+from langchain_community.chat_models import ChatOllama
+from langchain_community.embeddings.ollama import OllamaEmbeddings
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from requests.adapters import HTTPAdapter
+
+from src.constants.constants import (
+    OLLAMA_BASE_URL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_NUM_CTX,
+    OLLAMA_NUM_PARALLEL,
+    OLLAMA_TIMEOUT_SECONDS,
+)
+
+from .scheduler import scheduler
+
+
+def keep_alive_value(value: str = OLLAMA_KEEP_ALIVE) -> Union[int, str]:
+    """Ollama takes a duration string ("30m") or a number of seconds (-1, 0)."""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _pooled_session() -> requests.Session:
+    # One connection per slot, plus one for the warm-up request
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_NUM_PARALLEL + 1)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+session = _pooled_session()
+
+# How ChatOllama reports an HTTP error
+STATUS_ERROR = re.compile(r"Ollama call failed with status code (\d+)")
+
+
+class OllamaRequestError(ValueError):
+    """An Ollama request failed, with the HTTP status if a response came back."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@contextmanager
+def status_errors() -> Iterator[None]:
+    """Give the HTTP errors ChatOllama raises as plain ValueErrors their status."""
+    try:
+        yield
+    except OllamaRequestError:
+        raise
+    except ValueError as e:
+        match = STATUS_ERROR.match(str(e))
+        if match is None:
+            raise
+        raise OllamaRequestError(str(e), int(match.group(1))) from e
+
+
+class ThrottledChatOllama(ChatOllama):
+    """ChatOllama holding a slot for as long as a response is generated."""
+
+    keep_alive: Optional[Union[int, str]] = keep_alive_value()
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with scheduler.slot(), status_errors():
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with scheduler.aslot():
+            with status_errors():
+                return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        with scheduler.slot(), status_errors():
+            yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with scheduler.aslot():
+            with status_errors():
+                async for chunk in super()._astream(
+                    messages, stop, run_manager, **kwargs
+                ):
+                    yield chunk
+
+
+class ThrottledOllamaEmbeddings(OllamaEmbeddings):
+    """OllamaEmbeddings holding a slot for every embedding request."""
+
+    def _process_emb_response(self, input: str) -> List[float]:
+        with scheduler.slot():
+            try:
+                response = session.post(
+                    f"{self.base_url}/api/embeddings",
+                    headers={
+                        "Content-Type": "application/json",
+                        **(self.headers or {}),
+                    },
+                    json={
+                        "model": self.model,
+                        "prompt": input,
+                        "keep_alive": keep_alive_value(),
+                        **self._default_params,
+                    },
+                    timeout=OLLAMA_TIMEOUT_SECONDS,
+                )
+            except requests.exceptions.RequestException as e:
+                raise OllamaRequestError(f"Error raised by inference endpoint: {e}")
+        if response.status_code != 200:
+            raise OllamaRequestError(
+                "Error raised by inference API HTTP code: %s, %s"
+                % (response.status_code, response.text),
+                response.status_code,
+            )
+        try:
+            return response.json()["embedding"]
+        except requests.exceptions.JSONDecodeError as e:
+            raise ValueError(
+                f"Error raised by inference API: {e}.\nResponse: {response.text}"
+            )
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed queries concurrently, Ollama takes one input per request."""
+        if len(texts) <= 1:
+            return [self.embed_query(text) for text in texts]
+        with ThreadPoolExecutor(min(len(texts), OLLAMA_NUM_PARALLEL)) as executor:
+            return list(executor.map(self.embed_query, texts))
+
+
+def warm_up(model: str, base_url: str = OLLAMA_BASE_URL) -> float:
+    """
+    Load a model into Ollama's memory ahead of the first query.
+
+    A generate request without a prompt only loads the model, which then stays
+    loaded for OLLAMA_KEEP_ALIVE. It asks for the context of the chat and
+    embedding requests, or the first of them would load the model again.
+    Returns the seconds the request took.
+    """
+    start = time.perf_counter()
+    with scheduler.slot("generation"):
+        response = session.post(
+            f"{base_url}/api/generate",
+            json={
+                "model": model,
+                "keep_alive": keep_alive_value(),
+                "options": {"num_ctx": OLLAMA_NUM_CTX},
+            },
+            timeout=OLLAMA_TIMEOUT_SECONDS,
+        )
+    response.raise_for_status()
+    return time.perf_counter() - start
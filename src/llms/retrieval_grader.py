@@ -1,3 +1,5 @@
+from typing import List
+
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 
@@ -40,4 +42,53 @@ Remember, no additional explanation is needed beyond this JSON object.""",
     input_variables=["question", "document"],
 )
 
-retrieval_grader = prompt | llm | JsonOutputParser()
+retrieval_grader = (prompt | llm | JsonOutputParser()).with_config(
+    run_name="retrieval_grader"
+)
+
+batch_prompt = PromptTemplate(
+    template="""You are an expert evaluator tasked with assessing the relevance of retrieved documents to a user's question. Your goal is to determine, for each document, whether it contains useful information for answering the question, even if it doesn't provide a complete answer.
+
+User's Question: {question}
+
+Retrieved Documents:
+{documents}
+
+Evaluation Guidelines:
+1. Carefully read the user's question and every retrieved document.
+2. Look for the following indicators of relevance:
+   a) Keywords or phrases from the question appearing in the document
+   b) Concepts or ideas related to the question's topic
+   c) Information that could contribute to forming an answer, even if partial
+   d) Context that helps understand the question's subject matter
+3. Consider a document relevant if it provides any useful information, even if it's not a perfect match.
+4. Be somewhat lenient in your evaluation; the primary goal is to filter out clearly irrelevant documents.
+5. If in doubt, lean towards marking the document as relevant.
+6. Grade each document independently of the others.
+
+Scoring:
+- Score 'yes' if the document is relevant or potentially useful.
+- Score 'no' if the document is clearly unrelated or contains no useful information.
+
+Provide your evaluation as a JSON object with exactly one verdict per document index:
+{{
+    "verdicts": [
+        {{"index": 0, "score": "yes" or "no"}},
+        {{"index": 1, "score": "yes" or "no"}}
+    ]
+}}
+
+Remember, no additional explanation is needed beyond this JSON object.""",
+    input_variables=["question", "documents"],
+)
+
+batch_retrieval_grader = (batch_prompt | llm | JsonOutputParser()).with_config(
+    run_name="batch_retrieval_grader"
+)
+
+
+def format_documents(documents: List[str]) -> str:
+    return "\n\n".join(
+        f"<document index={index}>\n{document}\n</document>"
+        for index, document in enumerate(documents)
+    )
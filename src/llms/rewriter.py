@@ -1,5 +1,5 @@
 from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 
 from .llm import llm
 
@@ -19,4 +19,31 @@ Rewritten question:""",
     input_variables=["question"],
 )
 
-question_rewriter = re_write_prompt | llm | StrOutputParser()
+question_rewriter = (re_write_prompt | llm | StrOutputParser()).with_config(
+    run_name="question_rewriter"
+)
+
+multi_query_prompt = PromptTemplate(
+    template="""You are an expert question optimizer for vectorstore retrieval. A search with the user's question found no relevant documents. Your task is to write {count} alternative search queries that could retrieve the information the question asks for. Follow these guidelines:
+
+1. Keep the core intent of the original question in every query.
+2. Make the queries differ from each other: use synonyms, expand acronyms and domain-specific terms, or name the kind of document that would hold the answer.
+3. Break down complex questions into simpler, more focused queries if necessary.
+4. Do not repeat the original question or any query already tried.
+
+Original question: {question}
+
+Queries already tried: {tried}
+
+Provide the queries as a JSON object with the following structure:
+{{
+    "queries": ["first query", "second query"]
+}}
+
+Remember, no additional explanation is needed beyond this JSON object.""",
+    input_variables=["question", "count", "tried"],
+)
+
+multi_query_rewriter = (multi_query_prompt | llm | JsonOutputParser()).with_config(
+    run_name="multi_query_rewriter"
+)
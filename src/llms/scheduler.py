@@ -0,0 +1,184 @@
+"""
+Scheduler of the requests sent to Ollama.
+
+Ollama processes OLLAMA_NUM_PARALLEL requests per model at once and queues the
+rest in arrival order. The scheduler keeps at most that many requests in
+flight and hands a freed slot to the waiting request of the highest priority
+class, so a user-facing generation never queues behind ingestion embeddings
+or a burst of grading calls. Cache hits never reach Ollama and don't take a
+slot.
+
+The class of a request is the one set by `ollama_priority` in the calling
+context, "query" by default.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.constants.constants import OLLAMA_NUM_PARALLEL
+
+# Priority classes, most urgent first
+PRIORITIES = ("generation", "query", "ingestion")
+
+# Upper bounds of the queue wait histogram buckets, in seconds
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+current_priority: ContextVar[str] = ContextVar("ollama_priority", default="query")
+
+
+@contextmanager
+def ollama_priority(priority: str) -> Iterator[None]:
+    """Send the Ollama requests made in this context with `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {PRIORITIES}, got {priority!r}")
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class OllamaScheduler:
+    """
+    Admit at most `capacity` requests at once, most urgent class first.
+
+    Requests of the same class are admitted in arrival order. When
+    `prioritize` is off every request is admitted in arrival order.
+    """
+
+    def __init__(self, capacity: int, prioritize: bool = True):
+        self.capacity = capacity
+        self.prioritize = prioritize
+        self._lock = threading.Lock()
+        self._running = 0
+        # Waiters call their function, which returns False if it can't take
+        # the slot handed over, by rank, then arrival order
+        self._waiting: List[Tuple[int, int, Callable[[], bool], str]] = []
+        self._order = itertools.count()
+        self._waits = {
+            priority: {"count": 0, "sum": 0.0, "buckets": [0] * len(WAIT_BUCKETS)}
+            for priority in PRIORITIES
+        }
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None) -> Iterator[None]:
+        """Hold a slot for the duration of the block."""
+        self.acquire(priority or current_priority.get())
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[str] = None):
+        """Hold a slot for the duration of the block, waiting on the event loop."""
+        priority = priority or current_priority.get()
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def hand_over() -> None:
+            # A waiter cancelled after the slot was handed over passes it on
+            if future.cancelled():
+                self.release()
+            else:
+                future.set_result(None)
+
+        def wake() -> bool:
+            try:
+                loop.call_soon_threadsafe(hand_over)
+            except RuntimeError:
+                # The event loop of the waiter is closed
+                return False
+            return True
+
+        if not self._enqueue(priority, wake):
+            try:
+                await future
+            except asyncio.CancelledError:
+                if not self._dequeue(wake) and not future.cancelled():
+                    self.release()
+                raise
+        self._record_wait(priority, time.perf_counter() - start)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, priority: str) -> None:
+        start = time.perf_counter()
+        event = threading.Event()
+
+        def wake() -> bool:
+            event.set()
+            return True
+
+        if not self._enqueue(priority, wake):
+            # The releasing request hands its slot over by setting the event
+            event.wait()
+        self._record_wait(priority, time.perf_counter() - start)
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiting:
+                _, _, wake, _ = heapq.heappop(self._waiting)
+                if wake():
+                    return
+            self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = {priority: 0 for priority in PRIORITIES}
+            for _, _, _, priority in self._waiting:
+                waiting[priority] += 1
+            return {
+                "capacity": self.capacity,
+                "running": self._running,
+                "waiting": waiting,
+                "queue_wait": {
+                    priority: {
+                        "count": waits["count"],
+                        "sum": waits["sum"],
+                        "buckets": list(waits["buckets"]),
+                    }
+                    for priority, waits in self._waits.items()
+                },
+            }
+
+    def _enqueue(self, priority: str, wake: Callable[[], bool]) -> bool:
+        """Take a free slot and return True, or queue the waiter's function."""
+        with self._lock:
+            if self._running < self.capacity and not self._waiting:
+                self._running += 1
+                return True
+            rank = PRIORITIES.index(priority) if self.prioritize else 0
+            heapq.heappush(self._waiting, (rank, next(self._order), wake, priority))
+            return False
+
+    def _dequeue(self, wake: Callable[[], bool]) -> bool:
+        """Remove a queued waiter, False if a slot was handed to it already."""
+        with self._lock:
+            for index, (_, _, queued, _) in enumerate(self._waiting):
+                if queued is wake:
+                    self._waiting.pop(index)
+                    heapq.heapify(self._waiting)
+                    return True
+            return False
+
+    def _record_wait(self, priority: str, seconds: float) -> None:
+        with self._lock:
+            waits = self._waits[priority]
+            waits["count"] += 1
+            waits["sum"] += seconds
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    waits["buckets"][index] += 1
+
+
+scheduler = OllamaScheduler(OLLAMA_NUM_PARALLEL)
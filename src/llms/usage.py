@@ -0,0 +1,79 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Generator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Count LLM calls, cache hits and the tokens reported by Ollama."""
+
+    def __init__(self):
+        super().__init__()
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        prompt_tokens, completion_tokens, cache_hits = extract_usage(response)
+        with self._lock:
+            self.llm_calls += 1
+            self.cache_hits += cache_hits
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+def extract_usage(response: LLMResult):
+    """
+    Read Ollama's token counts from an LLM result.
+
+    Args:
+        response (LLMResult): The result passed to `on_llm_end`
+
+    Returns:
+        tuple: (prompt tokens, completion tokens, cache hits), cached
+            generations count as hits and add no tokens
+    """
+    prompt_tokens = completion_tokens = cache_hits = 0
+    for generations in response.generations:
+        for generation in generations:
+            info = generation.generation_info or {}
+            if info.get("cache_hit"):
+                cache_hits += 1
+                continue
+            prompt_tokens += info.get("prompt_eval_count") or 0
+            completion_tokens += info.get("eval_count") or 0
+    return prompt_tokens, completion_tokens, cache_hits
+
+
+usage_callback_var: ContextVar[Optional[UsageCallbackHandler]] = ContextVar(
+    "usage_callback", default=None
+)
+register_configure_hook(usage_callback_var, inheritable=True)
+
+
+@contextmanager
+def get_usage_callback() -> Generator[UsageCallbackHandler, None, None]:
+    """
+    Count the usage of every LLM call made inside the context.
+
+    Example:
+        >>> with get_usage_callback() as usage:
+        ...     rag_chain.invoke(inputs)
+        >>> usage.total_tokens
+    """
+    handler = UsageCallbackHandler()
+    token = usage_callback_var.set(handler)
+    try:
+        yield handler
+    finally:
+        usage_callback_var.reset(token)